@@ -0,0 +1,361 @@
+"""
+Lossless compressed archive of (time, ADC) logs.
+The ADC counts are large (about 8.3e6) but change slowly from one sample to the
+next, and the time steps by a near-constant period, so both columns become small
+integers once differenced: the ADC column is stored as the differences between
+consecutive samples, the time column as the differences of its intervals (delta
+of delta, 0 while the period doesn't change). The differences are zigzag encoded
+(0, -1, 1, -2, ... -> 0, 1, 2, 3, ...) and packed as variable-length integers
+(LEB128: 7 bits per byte, the high bit set on every byte but the last), encoded
+and decoded with NumPy over whole chunks.
+
+A file is a HEADER_DTYPE header, the chunks of up to chunk_size samples, then
+an index of INDEX_DTYPE records (offset, size, CRC-32, first and last values of
+each chunk). Each chunk is decoded on its own, so any range of samples is read
+without decoding the chunks before it.
+"""
+import zlib
+
+import numpy as np
+
+MAGIC = b"OFTKDVAR"
+VERSION = 1
+EXTENSION = ".tqz"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u2"),
+    ("header_size", "<u2"),
+    ("chunk_size", "<u4"),
+    ("n_samples", "<u8"),
+    ("n_chunks", "<u8"),
+    ("index_offset", "<u8"),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),
+    ("n_samples", "<u4"),
+    ("time_bytes", "<u4"),  # Size of the time stream, the ADC stream follows it
+    ("adc_bytes", "<u4"),
+    ("crc", "<u4"),  # CRC-32 of both streams
+    ("first_time", "<i8"),
+    ("last_time", "<i8"),
+    ("first_adc", "<i8"),
+])
+
+CHUNK_SIZE = 1 << 16
+# A 64-bit value takes at most 10 bytes of 7 bits
+MAX_VARINT_BYTES = 10
+
+
+def zigzag_encode(values):
+    """
+    Maps signed integers to unsigned ones, small magnitudes to small values.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def zigzag_decode(values):
+    values = np.asarray(values, dtype=np.uint64)
+    return ((values >> np.uint64(1)) ^ (np.uint64(0) - (values & np.uint64(1)))).view(np.int64)
+
+
+def encode_varint(values):
+    """
+    Packs unsigned integers as LEB128 variable-length integers.
+    Returns a uint8 array.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, MAX_VARINT_BYTES):
+        longer = values >= np.uint64(1 << (7 * k))
+        if not longer.any():
+            break
+        n_bytes += longer
+    ends = np.cumsum(n_bytes)
+    packed = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    # Byte k of every value is written in pass k, only the values that have one
+    # are kept for the next pass
+    positions = ends - n_bytes
+    remaining = n_bytes
+    while len(values):
+        more = remaining > 1
+        packed[positions] = (values & np.uint64(0x7F)).astype(np.uint8) | (more.view(np.uint8) << 7)
+        values = values[more] >> np.uint64(7)
+        positions = positions[more] + 1
+        remaining = remaining[more] - 1
+    return packed
+
+
+def decode_varint(packed, count=None):
+    """
+    Unpacks LEB128 variable-length integers from a uint8 array or bytes.
+    Raises ValueError if the data is truncated or doesn't hold count values.
+    """
+    packed = np.frombuffer(packed, dtype=np.uint8) if isinstance(packed, bytes) else packed
+    if len(packed) and packed[-1] & 0x80:
+        raise ValueError("Truncated variable-length integer.")
+    ends = np.flatnonzero(packed < 0x80)
+    if count is not None and len(ends) != count:
+        raise ValueError(f"Expected {count} values, found {len(ends)}.")
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    if len(lengths) and lengths.max() >= MAX_VARINT_BYTES:
+        raise ValueError("Variable-length integer longer than 64 bits.")
+    values = (packed[starts] & 0x7F).astype(np.uint64)
+    pending = np.flatnonzero(lengths)
+    k = 1
+    while len(pending):
+        values[pending] |= (packed[starts[pending] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+        pending = pending[lengths[pending] > k]
+        k += 1
+    return values
+
+
+def as_int64(values, name):
+    """
+    Converts a column to int64, raises ValueError if it has non-integer values
+    (e.g. the float times of a .dat file that would not survive the round trip).
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "iub":
+        return values.astype(np.int64, copy=False)
+    converted = values.astype(np.int64)
+    if not np.array_equal(converted, values):
+        raise ValueError(f"The {name} column has non-integer values.")
+    return converted
+
+
+def encode_chunk(tim_vals, adc_vals):
+    """
+    Encodes a chunk of int64 times and ADC values.
+    Returns the time and ADC streams (uint8 arrays). The first time and ADC value
+    are not in the streams, they are kept in the index.
+    """
+    intervals = np.diff(tim_vals)
+    time_stream = encode_varint(zigzag_encode(np.diff(intervals, prepend=0)))
+    adc_stream = encode_varint(zigzag_encode(np.diff(adc_vals)))
+    return time_stream, adc_stream
+
+
+def decode_chunk(time_stream, adc_stream, n_samples, first_time, first_adc):
+    """
+    Inverse of encode_chunk, returns the int64 time and ADC arrays.
+    """
+    tim_vals = np.empty(n_samples, dtype=np.int64)
+    adc_vals = np.empty(n_samples, dtype=np.int64)
+    tim_vals[0] = first_time
+    adc_vals[0] = first_adc
+    if n_samples > 1:
+        intervals = np.cumsum(zigzag_decode(decode_varint(time_stream, n_samples - 1)))
+        np.cumsum(intervals, out=tim_vals[1:])
+        tim_vals[1:] += first_time
+        np.cumsum(zigzag_decode(decode_varint(adc_stream, n_samples - 1)), out=adc_vals[1:])
+        adc_vals[1:] += first_adc
+    return tim_vals, adc_vals
+
+
+class ArchiveWriter:
+    """
+    Writes an archive from consecutive blocks of samples of any size. The samples
+    are encoded chunk by chunk, only the chunk being filled is kept in memory.
+    """
+    def __init__(self, filename, chunk_size=CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive.")
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.n_samples = 0
+        self._index = []
+        self._tim_pending = []
+        self._adc_pending = []
+        self._n_pending = 0
+        self._file = open(filename, "wb")
+        # Written again by close() with the number of samples and the index offset
+        self._file.write(self._header(0).tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _header(self, index_offset):
+        header = np.zeros((), dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["header_size"] = HEADER_SIZE
+        header["chunk_size"] = self.chunk_size
+        header["n_samples"] = self.n_samples
+        header["n_chunks"] = len(self._index)
+        header["index_offset"] = index_offset
+        return header
+
+    def write(self, tim_vals, adc_vals):
+        tim_vals = as_int64(tim_vals, "time")
+        adc_vals = as_int64(adc_vals, "ADC")
+        if len(tim_vals) != len(adc_vals):
+            raise ValueError("The time and ADC columns must have the same length.")
+        self._tim_pending.append(tim_vals)
+        self._adc_pending.append(adc_vals)
+        self._n_pending += len(tim_vals)
+        if self._n_pending >= self.chunk_size:
+            self._flush(final=False)
+
+    def _flush(self, final):
+        tim_vals = np.concatenate(self._tim_pending)
+        adc_vals = np.concatenate(self._adc_pending)
+        n_full = len(tim_vals) if final else len(tim_vals) - len(tim_vals) % self.chunk_size
+        for start in range(0, n_full, self.chunk_size):
+            self._write_chunk(
+                tim_vals[start:start + self.chunk_size], adc_vals[start:start + self.chunk_size]
+            )
+        self._tim_pending = [tim_vals[n_full:]]
+        self._adc_pending = [adc_vals[n_full:]]
+        self._n_pending = len(tim_vals) - n_full
+
+    def _write_chunk(self, tim_vals, adc_vals):
+        time_stream, adc_stream = encode_chunk(tim_vals, adc_vals)
+        record = np.zeros((), dtype=INDEX_DTYPE)
+        record["offset"] = self._file.tell()
+        record["n_samples"] = len(tim_vals)
+        record["time_bytes"] = len(time_stream)
+        record["adc_bytes"] = len(adc_stream)
+        record["crc"] = zlib.crc32(adc_stream, zlib.crc32(time_stream))
+        record["first_time"] = tim_vals[0]
+        record["last_time"] = tim_vals[-1]
+        record["first_adc"] = adc_vals[0]
+        self._file.write(time_stream.tobytes())
+        self._file.write(adc_stream.tobytes())
+        self._index.append(record)
+        self.n_samples += len(tim_vals)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._n_pending:
+                self._flush(final=True)
+            index_offset = self._file.tell()
+            self._file.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+            self._file.seek(0)
+            self._file.write(self._header(index_offset).tobytes())
+        finally:
+            self._file.close()
+
+
+def write_archive(filename, tim_vals, adc_vals, chunk_size=CHUNK_SIZE):
+    """
+    Writes the time and ADC columns (arrays or memory maps) to an archive.
+    """
+    with ArchiveWriter(filename, chunk_size) as writer:
+        for start in range(0, len(tim_vals), chunk_size):
+            writer.write(tim_vals[start:start + chunk_size], adc_vals[start:start + chunk_size])
+
+
+class Archive:
+    """
+    Archive opened for reading. The header and the index are read at once, the
+    chunks when they are needed.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        raw = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)
+        if len(raw) != 1 or raw["magic"][0] != MAGIC:
+            raise ValueError(f"{filename} is not a torque log archive.")
+        if raw["version"][0] > VERSION:
+            raise ValueError(f"{filename} has an unsupported version {raw['version'][0]}.")
+        self.header = {name: raw[name][0].item() for name in HEADER_DTYPE.names}
+        if not self.header["index_offset"]:
+            raise ValueError(f"{filename} was not closed.")
+        self.index = np.fromfile(
+            filename, dtype=INDEX_DTYPE, count=self.header["n_chunks"],
+            offset=self.header["index_offset"]
+        )
+        if len(self.index) != self.header["n_chunks"]:
+            raise ValueError(f"{filename} is truncated.")
+        # Index of the first sample of each chunk, and of the end
+        self.starts = np.concatenate(([0], np.cumsum(self.index["n_samples"], dtype=np.int64)))
+
+    def __len__(self):
+        return self.header["n_samples"]
+
+    @property
+    def n_chunks(self):
+        return len(self.index)
+
+    def read_chunk(self, chunk):
+        """
+        Returns the time and ADC arrays of one chunk.
+        Raises ValueError if the chunk is corrupted.
+        """
+        record = self.index[chunk]
+        time_bytes = int(record["time_bytes"])
+        data = np.fromfile(
+            self.filename, dtype=np.uint8, count=time_bytes + int(record["adc_bytes"]),
+            offset=int(record["offset"])
+        )
+        if zlib.crc32(data) != record["crc"]:
+            raise ValueError(f"Chunk {chunk} of {self.filename} is corrupted.")
+        return decode_chunk(
+            data[:time_bytes], data[time_bytes:], int(record["n_samples"]),
+            int(record["first_time"]), int(record["first_adc"])
+        )
+
+    def iter_chunks(self):
+        """
+        Yields the time and ADC arrays chunk by chunk.
+        """
+        for chunk in range(self.n_chunks):
+            yield self.read_chunk(chunk)
+
+    def read(self, start=0, stop=None):
+        """
+        Returns the time and ADC arrays of the samples start to stop, decoding only
+        the chunks that hold them.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        tim_vals = np.empty(max(stop - start, 0), dtype=np.int64)
+        adc_vals = np.empty_like(tim_vals)
+        if not len(tim_vals):
+            return tim_vals, adc_vals
+        first = np.searchsorted(self.starts, start, side="right") - 1
+        last = np.searchsorted(self.starts, stop, side="left")
+        for chunk in range(first, last):
+            chunk_start = self.starts[chunk]
+            tim_chunk, adc_chunk = self.read_chunk(chunk)
+            lo = max(start - chunk_start, 0)
+            hi = min(stop - chunk_start, len(tim_chunk))
+            out = slice(chunk_start + lo - start, chunk_start + hi - start)
+            tim_vals[out] = tim_chunk[lo:hi]
+            adc_vals[out] = adc_chunk[lo:hi]
+        return tim_vals, adc_vals
+
+
+def read_archive(filename):
+    """
+    Returns the time and ADC arrays of a whole archive.
+    """
+    return Archive(filename).read()
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from binlog import read_text_log
+
+    parser = argparse.ArgumentParser(description="Converts text logs to compressed archives.")
+    parser.add_argument("files", nargs="+", help=".dat or save_data text logs")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    for src in args.files:
+        dst = os.path.splitext(src)[0] + EXTENSION
+        tim_vals, adc_vals, _ = read_text_log(src)
+        write_archive(dst, tim_vals, adc_vals, args.chunk_size)
+        ratio = os.path.getsize(src) / os.path.getsize(dst)
+        print(f"{src} -> {dst} ({ratio:.1f}x smaller)")
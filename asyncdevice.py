@@ -0,0 +1,256 @@
+"""
+asyncio client of one device.
+The DLL calls block and the device must be used from the thread that opened it,
+so AsyncDevice makes every call on its own single-thread executor, and the
+coroutines await the results without blocking the event loop. At most max_pending
+calls wait for the device thread, further callers wait in the event loop.
+While streaming, the device thread polls the live value (StreamingAcquisition) and
+a task of the event loop hands the new samples to every stream() iterator through
+a bounded queue, dropping the oldest chunk of a consumer that falls behind.
+"""
+import asyncio
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from calibration import CalibrationCache
+from datalog import download_data_log
+from device import get_usb_dll
+from instrument import instrument, save_profile
+from logstore import sync_data_log
+from streaming import StreamConsumer, StreamingAcquisition
+
+
+class AsyncDevice:
+    """
+    One device driven from asyncio coroutines:
+        async with AsyncDevice("479586") as device:
+            timestamp, adc = await device.read_sample()
+            tim_vals, adc_vals = await device.download_log()
+    """
+    def __init__(self, serial, usb_dll=None, channel=2, max_pending=64,
+                 calibration_cache=None):
+        """
+        usb_dll: USB_DLL class of the backend, get_usb_dll() if None.
+        max_pending: Maximum number of calls waiting for the device thread.
+        calibration_cache: CalibrationCache the calibration is read from at connection.
+        """
+        self.serial = serial
+        self.usb_dll = usb_dll
+        self.channel = channel
+        self.calibration_cache = calibration_cache or CalibrationCache()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"IHH-{serial}")
+        self.dev = None
+        self.handle = None
+        self.calibration = None
+        self.acquisition = None
+        # Stream chunks dropped because the queue of a consumer was full
+        self.dropped_chunks = 0
+        self._pending = asyncio.Semaphore(max_pending)
+        self._consumer = None
+        self._publisher = None
+        self._queues = set()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def streaming(self):
+        return self.acquisition is not None and self.acquisition.running
+
+    async def connect(self):
+        """
+        Opens the connection and reads the calibration (see CalibrationCache).
+        Raises ConnectionError if the device can't be opened, ValueError if the
+        calibration can't be read.
+        """
+        await self._submit(self._open)
+        try:
+            self.calibration = await self.call(
+                self.calibration_cache.get, self.serial, self.channel
+            )
+        except ValueError:
+            await self.call(lambda dev, handle: dev.Close_Device_Connection(handle))
+            self.dev = None
+            raise
+
+    def _open(self):
+        """
+        Opens the connection from the device thread, which loads the DLL the
+        first time.
+        """
+        usb_dll = self.usb_dll or get_usb_dll()
+        # Every call is recorded if OPENFUTEK_PROFILE is set, see instrument.py
+        dev = instrument(usb_dll())
+        dev.Open_Device_Connection(self.serial)
+        if dev.DeviceStatus != 0:
+            raise ConnectionError(
+                f"Device {self.serial} not opened, status {dev.DeviceStatus}."
+            )
+        self.dev = dev
+        self.handle = dev.DeviceHandle
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Runs func(dev, handle, *args, **kwargs) on the device thread and returns
+        its result. Raises RuntimeError while streaming, since the device thread
+        is busy polling the live value until stop_streaming.
+        """
+        if self.streaming:
+            raise RuntimeError(f"Device {self.serial} is streaming.")
+        return await self._submit(lambda: func(self.dev, self.handle, *args, **kwargs))
+
+    async def _submit(self, func):
+        async with self._pending:
+            return await asyncio.wrap_future(self.executor.submit(func))
+
+    async def read_sample(self):
+        """
+        Returns the timestamp (time.perf_counter) and the ADC value of a new live
+        sample. While streaming, returns the latest streamed sample instead.
+        Raises ConnectionError if the request fails.
+        """
+        if self.streaming:
+            buffer = self.acquisition.buffer
+            while not buffer.written and self.streaming:
+                await asyncio.sleep(0.001)
+            if buffer.written:
+                timestamps, values = buffer.snapshot(1)
+                return float(timestamps[0]), int(values[0])
+        return await self.call(_read_sample, self.channel)
+
+    async def download_log(self, progress=None, store=None, **kwargs):
+        """
+        Downloads the data log on the device thread, only the samples that are not
+        in store yet if a logstore.LogStore is given.
+        progress is called in the event loop as progress(samples_read, total, rate).
+        kwargs are passed to download_data_log. Cancelling the coroutine stops
+        the download.
+        Returns the time and ADC arrays, raises datalog.DataLogError on failure.
+        """
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
+        thread_progress = None
+        if progress is not None:
+            def thread_progress(count, total, rate):
+                loop.call_soon_threadsafe(progress, count, total, rate)
+
+        def run(dev, handle):
+            if store is None:
+                return download_data_log(
+                    dev, handle, progress=thread_progress, cancel=cancel, **kwargs
+                )
+            return sync_data_log(
+                dev, handle, self.serial, store, progress=thread_progress,
+                cancel=cancel, **kwargs
+            )
+        try:
+            return await self.call(run)
+        except asyncio.CancelledError:
+            # The download already running on the device thread stops at its next block
+            cancel.set()
+            raise
+
+    def start_streaming(self, poll_interval=0.02, **kwargs):
+        """
+        Starts polling the live value on the device thread. kwargs are passed to
+        StreamingAcquisition. The new samples are handed to the stream()
+        iterators every poll_interval seconds.
+        """
+        if self.streaming:
+            return self.acquisition
+        self.acquisition = StreamingAcquisition(
+            self.dev, self.handle, channel=self.channel, **kwargs
+        )
+        self._consumer = StreamConsumer(self.acquisition.buffer)
+        self.acquisition.start(executor=self.executor)
+        self._publisher = asyncio.get_running_loop().create_task(
+            self._publish_samples(poll_interval)
+        )
+        return self.acquisition
+
+    async def stop_streaming(self):
+        """
+        Stops the acquisition and ends the stream() iterators after their last
+        samples.
+        """
+        if not self.streaming:
+            return
+        self.acquisition.stop(wait=False)
+        # Runs on the device thread once the polling loop has returned
+        await self._submit(self.acquisition.stop)
+        self._publisher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._publisher
+        self._publish()
+        for queue in self._queues:
+            self._put(queue, None)
+
+    async def stream(self, queue_size=16, **kwargs):
+        """
+        Async iterator over the live samples, as chunks of (timestamps, ADC values)
+        arrays shared by all the iterators. Starts streaming if needed (kwargs are
+        passed to start_streaming) and ends when stop_streaming is called.
+        If the consumer falls queue_size chunks behind, the oldest one is dropped.
+        """
+        if not self.streaming:
+            self.start_streaming(**kwargs)
+        queue = asyncio.Queue(queue_size)
+        self._queues.add(queue)
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self._queues.discard(queue)
+
+    async def _publish_samples(self, poll_interval):
+        while True:
+            await asyncio.sleep(poll_interval)
+            self._publish()
+
+    def _publish(self):
+        timestamps, values = self._consumer.read()
+        if len(values):
+            for queue in self._queues:
+                self._put(queue, (timestamps, values))
+
+    def _put(self, queue, chunk):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped_chunks += 1
+        queue.put_nowait(chunk)
+
+    async def close(self):
+        """
+        Stops the streaming, closes the connection and the device thread.
+        """
+        await self.stop_streaming()
+        if self.dev is not None:
+            await self.call(lambda dev, handle: dev.Close_Device_Connection(handle))
+            save_profile(self.dev)
+            self.dev = None
+        self.executor.shutdown(wait=False)
+
+
+def _read_sample(dev, handle, channel):
+    """
+    Requests the live value, returns it with the time halfway through the request.
+    """
+    sent = time.perf_counter()
+    response = dev.Normal_Data_Request(handle, channel)
+    received = time.perf_counter()
+    try:
+        value = int(response)
+    except (TypeError, ValueError):  # "Error"
+        raise ConnectionError(
+            f"Normal_Data_Request failed, status {dev.DeviceStatus}."
+        ) from None
+    return (sent + received) / 2, value
@@ -0,0 +1,296 @@
+"""
+Batch analysis of saved torque logs.
+Walks a folder tree, summarizes every log (number of samples, duration, sampling
+period, peak, valley, mean, RMS, standard deviation and outliers) in a pool of
+processes and writes one summary table. Text logs (.dat), binary logs (.tqb),
+stream logs (.tqs) and archives (.tqz) are read. The summaries are cached with
+the size and the modification time of each file, so running the analysis again
+only reads the new and modified files.
+The index, time, ADC .dat files and the archives have no torque column: their
+values are converted with the cached calibration of --serial, or summarized as
+ADC counts.
+
+Run from the repository root:
+    python batch.py path/to/logs --output summary.csv
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+import archive
+import binlog
+import streamlog
+from calibration import CalibrationCache
+from timing import TimingAnalyzer
+
+EXTENSIONS = (".dat", binlog.EXTENSION, streamlog.EXTENSION, archive.EXTENSION)
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".openfutek", "batch_cache.json")
+# Columns of the summary table
+COLUMNS = (
+    "path", "n_samples", "duration", "period", "jitter", "missing", "duplicates", "unit",
+    "peak", "valley", "mean", "rms", "std", "outliers", "error",
+)
+# Samples further than this many robust standard deviations (from the median
+# absolute deviation) from the median are outliers
+OUTLIER_THRESHOLD = 5.0
+
+
+def load_log(path, calibration=None):
+    """
+    Reads a log of any format.
+    Returns the times (ms), the values and their unit: the torque in N.cm, or the
+    ADC counts of a text log without torque column if calibration is None.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == binlog.EXTENSION:
+        log = binlog.read_binlog(path)
+        return np.asarray(log.time, dtype=np.float64), np.asarray(log.torque), "N.cm"
+    if extension == streamlog.EXTENSION:
+        _, times, _, tq_vals = streamlog.read_stream_log(path)
+        return times * 1000, tq_vals, "N.cm"
+    if extension == archive.EXTENSION:
+        tim_vals, adc_vals = archive.read_archive(path)
+        tq_vals = None
+    else:
+        tim_vals, adc_vals, tq_vals = binlog.read_text_log(path)
+    if tq_vals is not None:
+        return tim_vals.astype(np.float64), tq_vals, "N.cm"
+    if calibration is not None:
+        return tim_vals.astype(np.float64), calibration.convert(adc_vals), "N.cm"
+    return tim_vals.astype(np.float64), adc_vals, "ADC"
+
+
+def summarize(tim_vals, values):
+    """
+    Returns the statistics of a log as a dict: number of samples, duration (s),
+    sampling period and jitter (ms) and the samples missing and duplicated (see
+    timing.TimingAnalyzer), peak, valley, mean, RMS, standard deviation and number
+    of outliers.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_samples = len(values)
+    if not n_samples:
+        return {"n_samples": 0}
+    median = np.median(values)
+    # 1.4826 * MAD estimates the standard deviation of normally distributed values
+    spread = 1.4826 * np.median(np.abs(values - median))
+    outliers = int(np.count_nonzero(np.abs(values - median) > OUTLIER_THRESHOLD * spread)) \
+        if spread > 0 else 0
+    analyzer = TimingAnalyzer()
+    analyzer.update(tim_vals)
+    try:
+        timing = analyzer.result()
+        timing = {"period": timing.period, "jitter": timing.jitter,
+                  "missing": timing.missing, "duplicates": timing.duplicates}
+    except ValueError:  # Less than two different times
+        timing = {}
+    return {
+        "n_samples": n_samples,
+        "duration": float(tim_vals[-1] - tim_vals[0]) / 1000,
+        **timing,
+        "peak": float(values.max()),
+        "valley": float(values.min()),
+        "mean": float(values.mean()),
+        "rms": float(np.sqrt(np.mean(np.square(values)))),
+        "std": float(values.std()),
+        "outliers": outliers,
+    }
+
+
+def analyze_file(path, calibration=None):
+    """
+    Summary of one log, with its path and unit. A file that can't be read gets
+    an error instead of the statistics, whatever the exception, so that one
+    damaged log doesn't stop the analysis of the folder.
+    """
+    try:
+        tim_vals, values, unit = load_log(path, calibration)
+        return {"path": path, "unit": unit, **summarize(tim_vals, values)}
+    except Exception as error:
+        return {"path": path, "error": f"{type(error).__name__}: {error}"}
+
+
+def find_logs(folder, extensions=EXTENSIONS, exclude=()):
+    """
+    Returns the paths of the logs in the folder tree, sorted.
+    exclude: Paths of files to leave out, e.g. the summary written in the tree.
+    """
+    excluded = {os.path.realpath(path) for path in exclude}
+    paths = []
+    for root, _, filenames in os.walk(folder):
+        paths.extend(
+            os.path.join(root, filename) for filename in filenames
+            if os.path.splitext(filename)[1].lower() in extensions
+        )
+    return sorted(path for path in paths if os.path.realpath(path) not in excluded)
+
+
+class SummaryCache:
+    """
+    Summaries of the logs already analyzed, persisted as JSON. An entry is used
+    while the size and modification time of the file, and the calibration used,
+    are unchanged.
+    """
+    def __init__(self, path=DEFAULT_CACHE):
+        """
+        path: JSON file of the cache, None keeps the cache in memory only.
+        """
+        self.path = path
+        self._entries = {}
+        self.load()
+
+    @staticmethod
+    def signature(stat, calibration=None):
+        registers = calibration.registers if calibration is not None else None
+        return [stat.st_size, stat.st_mtime_ns, registers]
+
+    def get(self, path, signature):
+        entry = self._entries.get(os.path.abspath(path))
+        if entry is None or entry["signature"] != signature:
+            return None
+        return dict(entry["summary"], path=path)
+
+    def put(self, path, signature, summary):
+        self._entries[os.path.abspath(path)] = {"signature": signature, "summary": summary}
+
+    def load(self):
+        """
+        Reads the cache file. A missing or corrupted file gives an empty cache.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as cache_file:
+                self._entries = json.load(cache_file)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def save(self):
+        """
+        Writes the cache file, replacing it atomically.
+        """
+        if self.path is None:
+            return
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(self._entries, cache_file)
+        os.replace(temp_path, self.path)
+
+
+def analyze_folder(
+    folder, workers=None, cache=None, calibration=None, progress=None, exclude=()
+):
+    """
+    Summarizes every log of the folder tree.
+    Inputs:
+    workers: Number of processes, os.cpu_count() if None. 1 analyzes the files in
+             this process.
+    cache: SummaryCache of the summaries already computed, updated and saved.
+    calibration: Calibration of the text logs without torque column.
+    progress: Called as progress(files_done, n_files, files_per_second).
+    exclude: Paths of files not analyzed, see find_logs.
+    Output: List of the summaries (dicts with the keys of COLUMNS), sorted by path.
+    """
+    paths = find_logs(folder, exclude=exclude)
+    rows = {}
+    pending = []
+    signatures = {}
+    for path in paths:
+        try:
+            signatures[path] = SummaryCache.signature(os.stat(path), calibration)
+        except OSError as error:
+            rows[path] = {"path": path, "error": str(error)}
+            continue
+        cached = cache.get(path, signatures[path]) if cache is not None else None
+        if cached is not None:
+            rows[path] = cached
+        else:
+            pending.append(path)
+
+    start = time.perf_counter()
+    n_cached = len(rows)
+    if progress is not None:
+        progress(n_cached, len(paths), 0.0)
+    workers = workers or os.cpu_count() or 1
+    analyze = partial(analyze_file, calibration=calibration)
+    executor = ProcessPoolExecutor(workers) if workers > 1 and len(pending) > 1 else None
+    try:
+        if executor is not None:
+            # Groups of files per task, so small files don't cost one round trip
+            # to a worker each, while still giving every worker several tasks
+            chunksize = max(1, min(16, len(pending) // (4 * workers)))
+            results = executor.map(analyze, pending, chunksize=chunksize)
+        else:
+            results = map(analyze, pending)
+        for done, row in enumerate(results, 1):
+            rows[row["path"]] = row
+            if cache is not None and "error" not in row:
+                cache.put(row["path"], signatures[row["path"]], row)
+            if progress is not None:
+                progress(n_cached + done, len(paths), done / (time.perf_counter() - start))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            cache.save()
+    return [rows[path] for path in paths]
+
+
+def write_summary(rows, filename):
+    """
+    Writes the summaries as a table, tab-separated for .tsv and .dat files and
+    comma-separated otherwise.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    delimiter = "\t" if extension in (".tsv", ".dat") else ","
+    with open(filename, "w", newline="") as table:
+        writer = csv.DictWriter(table, COLUMNS, delimiter=delimiter, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("folder")
+    parser.add_argument("--output", default="summary.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--serial", help="Converts the ADC-only logs with the cached "
+                                         "calibration of this device")
+    parser.add_argument("--cache", default=DEFAULT_CACHE)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    calibration = None
+    if args.serial is not None:
+        calibration = CalibrationCache().find(args.serial)
+        if calibration is None:
+            parser.error(f"No cached calibration for {args.serial}, connect to it once.")
+    cache = None if args.no_cache else SummaryCache(args.cache)
+
+    def print_progress(files_done, n_files, rate):
+        print(f"\r{files_done}/{n_files} files, {rate:.0f} files/s", end="", flush=True)
+
+    # A previous summary written in the folder, e.g. --output summary.dat, is
+    # not a log
+    rows = analyze_folder(
+        args.folder, args.workers, cache, calibration, print_progress,
+        exclude=[args.output],
+    )
+    print()
+    write_summary(rows, args.output)
+    n_errors = sum("error" in row for row in rows)
+    print(f"{len(rows)} logs summarized in {args.output}, {n_errors} could not be read")
+
+
+if __name__ == "__main__":
+    main()
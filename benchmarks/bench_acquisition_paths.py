@@ -0,0 +1,73 @@
+"""
+Performance harness for every acquisition path, run against a simulated IHH500
+replaying a recorded .dat log with a configurable USB latency and jitter.
+Run from the repository root:
+    python -m benchmarks.bench_acquisition_paths --latency 1.0 --jitter 0.2
+"""
+import argparse
+import time
+
+import numpy as np
+
+import simulator
+from datalog import DataLogReader, FastDataLogReader, download_data_log
+
+
+def time_calls(func, n_calls):
+    """
+    Calls func n_calls times and returns the latency of each call, in seconds.
+    """
+    latencies = np.empty(n_calls)
+    for i in range(n_calls):
+        start = time.perf_counter()
+        func()
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+def report(name, latencies):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{name:28s} {len(latencies) / latencies.sum():9.0f} calls/s  "
+          f"p50 {p50:6.3f} ms  p99 {p99:6.3f} ms")
+
+
+def report_total(name, n_samples, elapsed):
+    print(f"{name:28s} {n_samples / elapsed:9.0f} samples/s  total {elapsed:7.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--file", default=simulator.SAMPLE_LOG, help="log replayed by the device")
+    parser.add_argument("--latency", type=float, default=1.0, help="USB round trip, ms")
+    parser.add_argument("--jitter", type=float, default=0.2, help="mean extra delay, ms")
+    parser.add_argument("--calls", type=int, default=200, help="calls per single request path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    device = simulator.add_device(simulator.SimulatedDevice.from_dat_file(
+        args.file, latency=args.latency * 1E-3, jitter=args.jitter * 1E-3, seed=args.seed
+    ))
+    dev = simulator.USB_DLL()
+    start = time.perf_counter()
+    dev.Open_Device_Connection(device.serial)
+    handle = dev.DeviceHandle
+    print(f"Replaying {device.n_samples} samples, latency {args.latency} ms, "
+          f"jitter {args.jitter} ms")
+    print(f"{'Open_Device_Connection':28s} {(time.perf_counter() - start) * 1000:9.3f} ms")
+
+    report("Normal_Data_Request", time_calls(lambda: dev.Normal_Data_Request(handle, 2), args.calls))
+    report("Get_Internal_Register", time_calls(lambda: dev.Get_Internal_Register(handle, 0x02), args.calls))
+    report("Get_Rotation_Values", time_calls(lambda: dev.Get_Rotation_Values(handle), args.calls))
+
+    for name, reader in (("Download (DataLogReader)", DataLogReader),
+                         ("Download (FastDataLogReader, experimental)", FastDataLogReader)):
+        start = time.perf_counter()
+        tim_vals, _ = download_data_log(dev, handle, reader=reader(dev, handle))
+        report_total(name, len(tim_vals), time.perf_counter() - start)
+
+    dev.Close_Device_Connection(handle)
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+AdaptiveAcquisition on a simulated IHH500 whose limits change mid-run, compared
+with fixed polling intervals: back to back (StreamingAcquisition), 100 ms
+(viacli.GetSingleData) and 500 ms (the QTimer of the old GUI).
+Phases of PHASE_DURATION seconds, the device failing the requests that follow the
+previous one by less than min_interval:
+    1 ms round trip, min_interval 3 ms
+    1 ms round trip, min_interval 1.5 ms
+    4 ms round trip, no min_interval (slower link)
+For each phase: the valid samples per second, the failed requests and the highest
+rate the device sustains. Ends with the heartbeats of a paused acquisition and the
+detection of an unplugged device, then the same through a DeviceSession, whose
+heartbeats reconnect the device once it is plugged back.
+Run from the repository root:
+    python -m benchmarks.bench_adaptive_polling
+"""
+import time
+
+import simulator
+from scheduler import AdaptiveAcquisition
+from session import DeviceSession
+from streaming import StreamingAcquisition
+
+SERIAL = "479586"
+PHASE_DURATION = 4.0
+# (latency, min_interval) of each phase, in seconds
+PHASES = ((1E-3, 3E-3), (1E-3, 1.5E-3), (4E-3, 0.0))
+
+
+def run_phases(device, acquisition):
+    """
+    Returns (valid samples, failed requests) per phase.
+    """
+    results = []
+    acquisition.start()
+    for latency, min_interval in PHASES:
+        device.latency, device.min_interval = latency, min_interval
+        samples, dropped = acquisition.buffer.written, acquisition.dropped
+        time.sleep(PHASE_DURATION)
+        results.append((acquisition.buffer.written - samples, acquisition.dropped - dropped))
+    acquisition.stop()
+    return results
+
+
+def main():
+    simulator.clear_devices()
+    device = simulator.SimulatedDevice(SERIAL, jitter=1E-4)
+    simulator.add_device(device)
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(SERIAL)
+    handle = dev.DeviceHandle
+
+    methods = {
+        "back to back": StreamingAcquisition(dev, handle),
+        "fixed 100 ms": StreamingAcquisition(dev, handle, interval=0.1),
+        "fixed 500 ms": StreamingAcquisition(dev, handle, interval=0.5),
+        "adaptive": AdaptiveAcquisition(dev, handle),
+    }
+    sustainable = [1 / max(latency + 1E-4, min_interval) for latency, min_interval in PHASES]
+    print(" " * 14 + "".join(f"  phase {i + 1} ({rate:4.0f} Hz max)"
+                             for i, rate in enumerate(sustainable)))
+    for name, acquisition in methods.items():
+        results = run_phases(device, acquisition)
+        print(f"{name:14s}" + "".join(
+            f"  {samples / PHASE_DURATION:6.0f} Hz {failed / max(samples + failed, 1):6.1%}"
+            for samples, failed in results
+        ))
+    stats = methods["adaptive"].stats()
+    print(f"\nAdaptive: final interval {stats['interval']:.2f} ms, average latency "
+          f"{stats['latency_average']:.2f} ms, {stats['backoffs']} back-offs, "
+          f"{len(methods['adaptive'].scheduler.history)} interval changes")
+
+    acquisition = AdaptiveAcquisition(dev, handle, heartbeat_interval=0.25)
+    acquisition.start()
+    acquisition.pause()
+    time.sleep(1.0)
+    written = acquisition.buffer.written
+    print(f"Paused 1 s: {acquisition.heartbeats} heartbeats, alive: {acquisition.alive}")
+    simulator.remove_device(SERIAL)
+    time.sleep(0.5)
+    print(f"Unplugged: alive: {acquisition.alive}, "
+          f"{acquisition.buffer.written - written} samples while paused")
+    acquisition.stop()
+
+    simulator.add_device(device)
+    session = DeviceSession(simulator.USB_DLL(), SERIAL)
+    session.open()
+    acquisition = AdaptiveAcquisition(None, None, heartbeat_interval=0.25, session=session)
+    acquisition.pause()
+    acquisition.start()
+    time.sleep(0.5)
+    device.unplug(1.0)
+    unplugged = time.perf_counter()
+    time.sleep(0.5)
+    print(f"Session, unplugged for 1 s: alive: {acquisition.alive}")
+    while not acquisition.alive:
+        time.sleep(0.01)
+    print(f"Session, alive again {time.perf_counter() - unplugged:.2f} s after unplugging, "
+          f"recovery {session.stats()['recovery_max']:.2f} s")
+    acquisition.resume()
+    written = acquisition.buffer.written
+    time.sleep(0.5)
+    print(f"Resumed: {acquisition.buffer.written - written} samples in 0.5 s")
+    acquisition.stop()
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Size and speed of the compressed archive against the text written by np.savetxt,
+gzip of that text and gzip of the raw int64 columns, on the repository's sample
+.dat and on a generated 10^6 sample log. Speeds are in MB/s of int64 (time, ADC)
+samples, 16 bytes each.
+Run from the repository root:
+    python -m benchmarks.bench_archive
+"""
+import gzip
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import archive
+from binlog import read_text_log
+from simulator import synthetic_log
+
+SAMPLE_LOG = "Master Flash HI Porous RP 5,0x13,0 01 torque.dat"
+
+
+def best_time(func, repeat=5):
+    """
+    Shortest of repeat runs (s), and the result of the last one.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def savetxt_bytes(tim_vals, adc_vals):
+    # Same columns as the .dat files, as written with the default np.savetxt format
+    text = io.BytesIO()
+    np.savetxt(text, np.column_stack((np.arange(len(tim_vals)), tim_vals, adc_vals)))
+    return text.getvalue()
+
+
+def compare(name, tim_vals, adc_vals):
+    raw_size = 16 * len(tim_vals)
+    raw = np.column_stack((tim_vals, adc_vals)).astype(np.int64).tobytes()
+    text = savetxt_bytes(tim_vals, adc_vals)
+    rows = []
+
+    write_s, _ = best_time(lambda: savetxt_bytes(tim_vals, adc_vals))
+    read_s, _ = best_time(lambda: np.loadtxt(io.BytesIO(text)))
+    rows.append(("savetxt", len(text), write_s, read_s))
+
+    for label, data in (("gzip text", text), ("gzip int64", raw)):
+        write_s, packed = best_time(lambda: gzip.compress(data, compresslevel=6))
+        read_s, _ = best_time(lambda: gzip.decompress(packed))
+        rows.append((label, len(packed), write_s, read_s))
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "log" + archive.EXTENSION)
+        write_s, _ = best_time(lambda: archive.write_archive(path, tim_vals, adc_vals))
+        read_s, (tim_back, adc_back) = best_time(lambda: archive.read_archive(path))
+        size = os.path.getsize(path)
+        log = archive.Archive(path)
+        middle = len(log) // 2
+        random_s, _ = best_time(lambda: log.read(middle, middle + 1000))
+    assert np.array_equal(tim_back, tim_vals) and np.array_equal(adc_back, adc_vals)
+    rows.append(("archive", size, write_s, read_s))
+
+    print(f"\n{name}: {len(tim_vals)} samples, {raw_size / 1E6:.2f} MB as int64")
+    print(f"{'':12s} {'size (kB)':>10s} {'bytes/sample':>13s} {'ratio':>7s} "
+          f"{'write MB/s':>11s} {'read MB/s':>10s}")
+    for label, size, write_s, read_s in rows:
+        print(f"{label:12s} {size / 1E3:10.1f} {size / len(tim_vals):13.2f} "
+              f"{len(text) / size:7.1f} {raw_size / write_s / 1E6:11.0f} "
+              f"{raw_size / read_s / 1E6:10.0f}")
+    print(f"Random access to 1000 samples in the middle: {random_s * 1E3:.2f} ms")
+
+
+def main():
+    tim_vals, adc_vals, _ = read_text_log(SAMPLE_LOG)
+    compare(SAMPLE_LOG, tim_vals, adc_vals)
+    tim_vals, adc_vals = synthetic_log(10 ** 6)
+    compare("synthetic_log", tim_vals, adc_vals)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Event loop latency while coroutines use a simulated device, with the blocking DLL
+calls made in the event loop (as viacli does) and through AsyncDevice: many
+concurrent read_sample calls, a data log download, and streaming to several
+consumers (plus one too slow to keep up).
+The latency is how late a coroutine sleeping 1 ms wakes up.
+Run from the repository root:
+    python -m benchmarks.bench_async
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import simulator
+from asyncdevice import AsyncDevice
+from calibration import CalibrationCache
+from datalog import download_data_log
+
+SERIAL = "479586"
+TICK = 1E-3
+
+
+async def monitor_lag(lags, stop):
+    """
+    Appends the wake-up delay of a 1 ms sleep until stop is set.
+    """
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def measure(workload):
+    """
+    Runs workload() while monitoring the event loop. Returns its result, its
+    duration and the lag percentiles (ms).
+    """
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lags, stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    result = await workload()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    lags = np.array(lags) * 1000
+    return result, elapsed, np.percentile(lags, [50, 99, 100])
+
+
+def plug_device(n_samples=5000):
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples)
+    device = simulator.SimulatedDevice(SERIAL, tim_vals, adc_vals, latency=5E-4, jitter=1E-4)
+    simulator.add_device(device)
+    return device
+
+
+async def blocking_reads(n_coroutines, n_reads):
+    """
+    The viacli way: every coroutine calls the DLL directly.
+    """
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(SERIAL)
+
+    async def reader():
+        for _ in range(n_reads):
+            int(dev.Normal_Data_Request(dev.DeviceHandle, 2))
+            await asyncio.sleep(0)
+    await asyncio.gather(*(reader() for _ in range(n_coroutines)))
+    dev.Close_Device_Connection(dev.DeviceHandle)
+    return n_coroutines * n_reads
+
+
+async def async_reads(device, n_coroutines, n_reads):
+    async def reader():
+        for _ in range(n_reads):
+            await device.read_sample()
+    await asyncio.gather(*(reader() for _ in range(n_coroutines)))
+    return n_coroutines * n_reads
+
+
+async def blocking_download():
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(SERIAL)
+    tim_vals, _ = download_data_log(dev, dev.DeviceHandle)
+    dev.Close_Device_Connection(dev.DeviceHandle)
+    return len(tim_vals)
+
+
+async def async_download(device):
+    tim_vals, _ = await device.download_log()
+    return len(tim_vals)
+
+
+async def async_stream(device, n_consumers, seconds=1.0):
+    """
+    n_consumers iterate over the stream for seconds, plus one consumer too slow
+    to keep up. Returns the samples received by the first fast consumer.
+    """
+    received = [0] * (n_consumers + 1)
+
+    async def consumer(index, delay, queue_size):
+        async for _, values in device.stream(queue_size, poll_interval=0.01):
+            received[index] += len(values)
+            if delay:
+                await asyncio.sleep(delay)
+
+    tasks = [asyncio.create_task(consumer(i, 0.0, 16)) for i in range(n_consumers)]
+    tasks.append(asyncio.create_task(consumer(n_consumers, 0.1, 4)))
+    await asyncio.sleep(seconds)
+    await device.stop_streaming()
+    await asyncio.gather(*tasks)
+    return received[0]
+
+
+def report(name, measured, unit="samples"):
+    result, elapsed, lag = measured
+    print(f"{name:40s} {result or 0:7d} {unit:8s} {elapsed * 1000:8.0f} ms   "
+          f"lag p50 {lag[0]:6.2f}  p99 {lag[1]:7.2f}  max {lag[2]:7.2f} ms")
+
+
+async def main(n_coroutines=50, n_reads=10):
+    plug_device()
+    with tempfile.TemporaryDirectory() as folder:
+        cache = CalibrationCache(os.path.join(folder, "calibration_cache.json"))
+        report("idle", await measure(lambda: asyncio.sleep(0.5)), "")
+        report(f"blocking reads, {n_coroutines} coroutines",
+               await measure(lambda: blocking_reads(n_coroutines, n_reads)))
+        report("blocking download", await measure(blocking_download))
+        async with AsyncDevice(SERIAL, simulator.USB_DLL, calibration_cache=cache) as device:
+            report(f"AsyncDevice reads, {n_coroutines} coroutines",
+                   await measure(lambda: async_reads(device, n_coroutines, n_reads)))
+            report("AsyncDevice download", await measure(lambda: async_download(device)))
+            for n_consumers in (1, 10, 100):
+                report(f"AsyncDevice stream, {n_consumers} consumers",
+                       await measure(lambda: async_stream(device, n_consumers)))
+            print(f"Chunks dropped for the slow consumers: {device.dropped_chunks}")
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
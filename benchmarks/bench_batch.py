@@ -0,0 +1,76 @@
+"""
+Batch analysis of a folder of text logs: the notebook loop (np.loadtxt and the
+statistics, one file after the other) compared with batch.analyze_folder on 1 to
+os.cpu_count() processes, and with a second run answered from the cache.
+Writes N_FILES logs of N_SAMPLES samples to a temporary folder. Run from the
+repository root:
+    python -m benchmarks.bench_batch
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import batch
+from simulator import synthetic_log
+
+N_FILES = 400
+N_SAMPLES = 5000
+
+
+def write_logs(folder):
+    for index in range(N_FILES):
+        tim_vals, adc_vals = synthetic_log(N_SAMPLES, seed=index)
+        subfolder = os.path.join(folder, f"bench {index // 100}")
+        os.makedirs(subfolder, exist_ok=True)
+        np.savetxt(
+            os.path.join(subfolder, f"log {index} torque.dat"),
+            np.column_stack((np.arange(N_SAMPLES), tim_vals, adc_vals)),
+        )
+
+
+def notebook_loop(folder):
+    rows = []
+    for path in batch.find_logs(folder):
+        data = np.loadtxt(path)
+        values = data[:, 2]
+        rows.append((path, values.max(), values.min(), values.mean(),
+                     np.sqrt(np.mean(values ** 2)), values.std()))
+    return rows
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    n_cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as folder:
+        logs = os.path.join(folder, "logs")
+        write_logs(logs)
+        print(f"{N_FILES} logs of {N_SAMPLES} samples, {n_cpus} CPUs")
+        print(f"{'method':28s} {'time (s)':>9s} {'files/s':>8s}")
+        _, elapsed = timed(notebook_loop, logs)
+        print(f"{'notebook loop':28s} {elapsed:9.2f} {N_FILES / elapsed:8.0f}")
+        baseline = None
+        # At least 2 processes, so the pool itself is measured on a single CPU
+        workers = 1
+        while workers <= max(n_cpus, 2):
+            rows, elapsed = timed(batch.analyze_folder, logs, workers)
+            assert len(rows) == N_FILES and not any("error" in row for row in rows)
+            baseline = baseline or elapsed
+            name = f"analyze_folder, {workers} process{'es' if workers > 1 else ''}"
+            print(f"{name:28s} {elapsed:9.2f} {N_FILES / elapsed:8.0f}  "
+                  f"speedup {baseline / elapsed:.1f}")
+            workers *= 2
+        cache = batch.SummaryCache(os.path.join(folder, "cache.json"))
+        batch.analyze_folder(logs, n_cpus, cache)
+        _, elapsed = timed(batch.analyze_folder, logs, n_cpus, batch.SummaryCache(cache.path))
+        print(f"{'second run, cached':28s} {elapsed:9.2f} {N_FILES / elapsed:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Write/read speed and file size of the binary log format against np.savetxt and
+np.loadtxt, with the format used by save_data.
+Run from the repository root:
+    python -m benchmarks.bench_binlog
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import binlog
+from conversion import DA_convert
+from simulator import synthetic_log
+
+CALIBRATION = {
+    "offset_d": 8388608,
+    "fullscale_d": 12582912,
+    "reverse_fullscale_d": 4194304,
+    "fullscale_load_a": 500.0,
+}
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(n_samples=10**6):
+    tim_vals, adc_vals = synthetic_log(n_samples)
+    tq_vals = DA_convert(adc_vals, **CALIBRATION)
+    with tempfile.TemporaryDirectory() as folder:
+        text_path = os.path.join(folder, "log.dat")
+        bin_path = os.path.join(folder, "log" + binlog.EXTENSION)
+
+        # Same call as MainWindow.save_data
+        write_text_s, _ = timed(lambda: np.savetxt(
+            text_path, np.column_stack((tim_vals, adc_vals, tq_vals)),
+            fmt=["%i", "%i", "%f"], header="Time(ms)\tADC Count\tTorque (N.cm)",
+            delimiter="\t"
+        ))
+        write_bin_s, _ = timed(lambda: binlog.write_binlog(
+            bin_path, tim_vals, adc_vals, tq_vals, serial="479586", **CALIBRATION
+        ))
+        read_text_s, _ = timed(lambda: np.loadtxt(text_path))
+        open_bin_s, log = timed(lambda: binlog.read_binlog(bin_path))
+        # Touching every value forces the pages to be read
+        read_bin_s, _ = timed(lambda: (log.time.sum(), log.adc.sum(), log.torque.sum()))
+
+        text_size = os.path.getsize(text_path)
+        bin_size = os.path.getsize(bin_path)
+        del log
+
+    print(f"Samples: {n_samples:.0e}")
+    print(f"{'':12s} {'write (s)':>10s} {'read (s)':>10s} {'size (MB)':>10s} {'bytes/sample':>13s}")
+    print(f"{'savetxt':12s} {write_text_s:10.3f} {read_text_s:10.3f} "
+          f"{text_size / 1E6:10.2f} {text_size / n_samples:13.1f}")
+    print(f"{'binlog':12s} {write_bin_s:10.3f} {open_bin_s + read_bin_s:10.3f} "
+          f"{bin_size / 1E6:10.2f} {bin_size / n_samples:13.1f}")
+    print(f"Opening the binary log (memmap, no copy): {open_bin_s * 1E3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
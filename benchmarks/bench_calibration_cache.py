@@ -0,0 +1,80 @@
+"""
+USB round trips spent reading the calibration, with and without CalibrationCache,
+for a first connection, a reconnection and a recalibrated sensor, each followed by
+several downloads.
+Run from the repository root:
+    python -m benchmarks.bench_calibration_cache
+"""
+import os
+import tempfile
+
+import simulator
+from calibration import CalibrationCache
+
+
+def legacy_calibration(dev, handle):
+    """
+    Register reads done by get_logged_data before the cache, at every download.
+    """
+    return (
+        int(dev.Get_Internal_Register(handle, 0x02)),
+        int(dev.Get_Internal_Register(handle, 0x03)),
+        int(dev.Get_Internal_Register(handle, 0x04)),
+        float(dev.Get_Internal_Register(handle, 0x05)) * 1E-3,
+    )
+
+
+def legacy_session(device, downloads):
+    """
+    Returns the calibration round trips of one connection without the cache.
+    """
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(device.serial)
+    before = device.round_trips
+    for _ in range(downloads):
+        legacy_calibration(dev, dev.DeviceHandle)
+    round_trips = device.round_trips - before
+    dev.Close_Device_Connection(dev.DeviceHandle)
+    return round_trips
+
+
+def cached_session(device, downloads, path):
+    """
+    Returns the calibration round trips of one connection with the cache, and the
+    calibration. The cache is read again from path, as after restarting the
+    application. The calibration is read once at connection and reused by every
+    download.
+    """
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(device.serial)
+    before = device.round_trips
+    calibration = CalibrationCache(path).get(dev, dev.DeviceHandle, device.serial)
+    round_trips = device.round_trips - before
+    dev.Close_Device_Connection(dev.DeviceHandle)
+    return round_trips, calibration
+
+
+def main(downloads=3):
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(100)
+    device = simulator.SimulatedDevice("479586", tim_vals, adc_vals, latency=0.0, jitter=0.0)
+    simulator.add_device(device)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "calibration_cache.json")
+        print(f"Calibration round trips for one connection and {downloads} downloads")
+        print(f"{'':20s} {'legacy':>8s} {'cached':>8s}")
+        for label in ("first connection", "reconnection"):
+            cached, _ = cached_session(device, downloads, path)
+            print(f"{label:20s} {legacy_session(device, downloads):8d} {cached:8d}")
+
+        # Recalibrating the sensor changes its calibration date and registers
+        device.calibration_date = (2, 1, 2021)
+        device.registers[0x05] += 1000
+        cached, calibration = cached_session(device, downloads, path)
+        print(f"{'recalibrated':20s} {legacy_session(device, downloads):8d} {cached:8d}")
+        print(f"Fullscale load after recalibration: {calibration.fullscale_load_a}")
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
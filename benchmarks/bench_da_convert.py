@@ -0,0 +1,69 @@
+"""
+Compares the vectorized DA_convert with the sample-by-sample loop it replaced.
+Run from the repository root:
+    python -m benchmarks.bench_da_convert
+"""
+import time
+
+import numpy as np
+
+from conversion import DA_convert, _DA_convert_loop, loading_point_convert
+
+# Calibration registers in the range read from the IHH500 (0x02 to 0x05)
+OFFSET_D = 8388608
+FULLSCALE_D = 12582912
+REVERSE_FULLSCALE_D = 4194304
+FULLSCALE_LOAD_A = 500.0
+
+
+def make_samples(n_samples, seed=0):
+    """
+    Random ADC counts spread around the offset, on both sides of the zero.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.integers(REVERSE_FULLSCALE_D, FULLSCALE_D, n_samples, dtype=np.int32)
+
+
+def timeit(func, repeat=3):
+    """
+    Returns the best wall time of repeat calls to func, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n_samples=10**7):
+    adc = make_samples(n_samples)
+    calib = (OFFSET_D, FULLSCALE_D, REVERSE_FULLSCALE_D, FULLSCALE_LOAD_A)
+
+    # The loop takes several seconds on 10^7 samples, so it only runs once
+    loop_s = timeit(lambda: _DA_convert_loop(adc, *calib), repeat=1)
+    vec_s = timeit(lambda: DA_convert(adc, *calib))
+    out64 = np.empty(n_samples, dtype=np.float64)
+    out_s = timeit(lambda: DA_convert(adc, *calib, out=out64))
+    out32 = np.empty(n_samples, dtype=np.float32)
+    out32_s = timeit(lambda: DA_convert(adc, *calib, out=out32))
+
+    points_d = [REVERSE_FULLSCALE_D, 6291456, OFFSET_D, 10485760, FULLSCALE_D]
+    loads_a = [-FULLSCALE_LOAD_A, -250.0, 0.0, 250.0, FULLSCALE_LOAD_A]
+    lp_s = timeit(lambda: loading_point_convert(adc, points_d, loads_a, out=out64))
+
+    # Both implementations must agree before the times mean anything
+    np.testing.assert_allclose(
+        DA_convert(adc[:100000], *calib), _DA_convert_loop(adc[:100000], *calib)
+    )
+
+    print(f"Samples: {n_samples:.0e}")
+    print(f"Python loop:                {loop_s:8.3f} s")
+    print(f"Vectorized (new array):     {vec_s:8.3f} s  ({loop_s / vec_s:.0f}x)")
+    print(f"Vectorized (out= float64):  {out_s:8.3f} s  ({loop_s / out_s:.0f}x)")
+    print(f"Vectorized (out= float32):  {out32_s:8.3f} s  ({loop_s / out32_s:.0f}x)")
+    print(f"Loading points (5 points):  {lp_s:8.3f} s  ({loop_s / lp_s:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Throughput of the data log download against a simulated device with a fixed USB
+round trip latency. DataLogReader, the default reader, is compared with the loop
+get_logged_data used to run. FastDataLogReader is experimental: its figures
+depend on page semantics that only the simulator implements, so they are shown
+apart and don't say anything about a real device.
+Run from the repository root:
+    python -m benchmarks.bench_datalog_download
+"""
+import time
+
+import simulator
+from datalog import DataLogReader, FastDataLogReader, download_data_log, VALID_MARGIN
+
+
+def legacy_download(dev, handle):
+    """
+    Sample-by-sample download with growing lists, as get_logged_data used to do.
+    """
+    adc_vals = []
+    tim_vals = []
+    dev.Get_Data_Logging(handle, 0)
+    time_sample_1 = dev.DataLogging_Value2
+    dev.Get_Data_Logging(handle, 1)
+    t_delta_base = dev.DataLogging_Value2 - time_sample_1
+    sample_count = 0
+    while True:
+        dev.Get_Data_Logging(handle, sample_count)
+        torq_sample = dev.DataLogging_Value1
+        time_sample = dev.DataLogging_Value2
+        if sample_count >= 2:
+            delta_t = time_sample - tim_vals[-1]
+            if not t_delta_base / VALID_MARGIN <= delta_t <= t_delta_base * VALID_MARGIN:
+                break
+        tim_vals.append(time_sample)
+        adc_vals.append(torq_sample)
+        sample_count += 1
+    return tim_vals, adc_vals
+
+
+def run(name, func, device):
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(device.serial)
+    device.round_trips = 0
+    start = time.perf_counter()
+    tim_vals, _ = func(dev, dev.DeviceHandle)
+    elapsed = time.perf_counter() - start
+    print(f"{name:28s} {len(tim_vals):7d} samples  {elapsed:7.3f} s  "
+          f"{len(tim_vals) / elapsed:9.0f} samples/s  {device.round_trips:6d} round trips")
+    dev.Close_Device_Connection(dev.DeviceHandle)
+    return elapsed
+
+
+def main(n_samples=2000, latency=1E-3):
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples)
+    device = simulator.add_device(
+        simulator.SimulatedDevice("479586", tim_vals, adc_vals, latency=latency)
+    )
+    print(f"Simulated latency: {latency * 1000:.1f} ms per round trip")
+    legacy = run("Legacy loop", legacy_download, device)
+    blocks = run("DataLogReader (default)", lambda dev, handle: download_data_log(
+        dev, handle, reader=DataLogReader(dev, handle)), device)
+    print(f"DataLogReader: {legacy / blocks:.2f}x the legacy loop")
+    print("\nExperimental, simulated pages only:")
+    run("FastDataLogReader", lambda dev, handle: download_data_log(
+        dev, handle, reader=FastDataLogReader(dev, handle)), device)
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Throughput of each dsp stage, in samples per second, on saved-log sized blocks
+(dsp.BLOCK_SIZE) and on live sized blocks (100 samples, one plot frame), compared
+with a per-sample Python loop. Ends with the peak, valley and statistics of the
+sample log, filtered.
+Run from the repository root:
+    python -m benchmarks.bench_dsp
+"""
+import time
+
+import numpy as np
+
+import dsp
+from binlog import read_text_log
+from simulator import SAMPLE_LOG
+
+N_SAMPLES = 4 * 10 ** 6
+
+
+def signal(n_samples):
+    rng = np.random.default_rng(0)
+    values = 50 * np.sin(np.arange(n_samples) / 5000) + rng.normal(0, 1, n_samples)
+    values[::1000] += 40  # spikes
+    return values
+
+
+def stages():
+    return {
+        "MovingAverage(32)": lambda: dsp.MovingAverage(32),
+        "MedianDespike(5)": lambda: dsp.MedianDespike(5, threshold=10),
+        "LowPass(10 Hz, order 2)": lambda: dsp.LowPass(10, 1000, order=2),
+        "PeakValleyHold": dsp.PeakValleyHold,
+        "RunningStats": dsp.RunningStats,
+        "all five": lambda: dsp.Pipeline(
+            dsp.MedianDespike(5, threshold=10), dsp.LowPass(10, 1000, order=2),
+            dsp.MovingAverage(32), dsp.PeakValleyHold(), dsp.RunningStats(),
+        ),
+    }
+
+
+def throughput(make_stage, values, block_size):
+    stage = make_stage()
+    start = time.perf_counter()
+    dsp.apply(stage, values, block_size)
+    return len(values) / (time.perf_counter() - start)
+
+
+def python_low_pass(values, alpha):
+    """
+    Reference: the first-order low-pass as a per-sample loop.
+    """
+    output = np.empty(len(values))
+    previous = values[0]
+    for index, value in enumerate(values):
+        previous += alpha * (value - previous)
+        output[index] = previous
+    return output
+
+
+def main():
+    values = signal(N_SAMPLES)
+    print(f"{'stage':26s} {'64k blocks':>14s} {'100 blocks':>14s}  (samples/s)")
+    for name, make_stage in stages().items():
+        large = throughput(make_stage, values, dsp.BLOCK_SIZE)
+        small = throughput(make_stage, values[:N_SAMPLES // 10], 100)
+        print(f"{name:26s} {large:14.3g} {small:14.3g}")
+    alpha = dsp.LowPass(10, 1000).alpha
+    start = time.perf_counter()
+    python_low_pass(values[:10 ** 6], alpha)
+    rate = 10 ** 6 / (time.perf_counter() - start)
+    print(f"{'LowPass, Python loop':26s} {rate:14.3g}")
+
+    tim_vals, adc_vals, _ = read_text_log(SAMPLE_LOG)
+    tq_vals = adc_vals.astype(np.float64)
+    hold, stats = dsp.PeakValleyHold(), dsp.RunningStats()
+    pipeline = dsp.Pipeline(dsp.MedianDespike(5), hold, stats)
+    dsp.apply(pipeline, tq_vals)
+    print(f"\n{SAMPLE_LOG}, ADC values after a 5-sample median:")
+    print(f"peak {hold.peak:.0f} at {tim_vals[hold.peak_index]} ms, "
+          f"valley {hold.valley:.0f} at {tim_vals[hold.valley_index]} ms")
+    print(", ".join(f"{key} {value:.1f}" for key, value in stats.summary().items()))
+
+
+if __name__ == "__main__":
+    main()
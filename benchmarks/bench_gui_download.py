@@ -0,0 +1,110 @@
+"""
+End-to-end data log retrieval time in the GUI, before and after moving it off the
+main thread to the device thread, against a simulated device. Also measures the longest time the Qt event
+loop was blocked, i.e. how long the window was frozen.
+Runs headless:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_gui_download
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("OPENFUTEK_BACKEND", "sim")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtWidgets import QApplication
+
+import simulator
+from benchmarks.bench_datalog_download import legacy_download
+
+
+class StallMeter:
+    """
+    Measures the longest gap between ticks of a 5 ms QTimer.
+    """
+    def __init__(self):
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.tick)
+        self.longest = 0.0
+        self.last = None
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start(5)
+
+    def tick(self):
+        now = time.perf_counter()
+        self.longest = max(self.longest, now - self.last)
+        self.last = now
+
+    def stop(self):
+        self.tick()
+        self.timer.stop()
+        return self.longest
+
+
+def legacy_retrieval(mw):
+    """
+    Download on the main thread with a status update per sample, as
+    get_logged_data used to do.
+    """
+    dev, handle = mw.usb, mw.session.handle
+    original = dev.Get_Data_Logging
+
+    def get_data_logging(handle, counter):
+        mw.update_status_txt(f"Sample {counter}")
+        return original(handle, counter)
+
+    dev.Get_Data_Logging = get_data_logging
+    try:
+        legacy_download(dev, handle)
+    finally:
+        del dev.Get_Data_Logging
+
+
+def main(n_samples=1000, latency=1E-3, jitter=2E-4):
+    import main_minimal
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples)
+    # Per-sample reads, the path used by devices without FastDataLogging
+    simulator.add_device(simulator.SimulatedDevice(
+        "479586", tim_vals, adc_vals, latency=latency, jitter=jitter, fast_logging=False
+    ))
+
+    mw = main_minimal.MainWindow()
+    mw.ihh_serial_line.setText("479586")
+    mw.connect_ihh()
+
+    # The legacy download runs on the main thread, without the heartbeats
+    mw.stop_acquisition()
+    meter = StallMeter()
+    meter.start()
+    start = time.perf_counter()
+    legacy_retrieval(mw)
+    before = time.perf_counter() - start
+    app.processEvents()
+    before_stall = meter.stop()
+
+    meter = StallMeter()
+    loop = QEventLoop()
+    meter.start()
+    start = time.perf_counter()
+    mw.get_logged_data()
+    mw.download_worker.finished.connect(loop.quit)
+    mw.download_worker.failed.connect(loop.quit)
+    loop.exec_()
+    after = time.perf_counter() - start
+    after_stall = meter.stop()
+
+    print(f"Samples: {len(mw.tim_vals)}, latency {latency * 1000:.1f} ms")
+    print(f"Main thread, per-sample status: {before:7.3f} s, window frozen for {before_stall:7.3f} s")
+    print(f"Device thread, 20 Hz progress:  {after:7.3f} s, window frozen for {after_stall:7.3f} s")
+    mw.disconnect_ihh()
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
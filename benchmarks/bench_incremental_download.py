@@ -0,0 +1,98 @@
+"""
+Round trips and time of downloading the data log again with logstore.sync_data_log,
+compared with a full download_data_log, after the operator logs more samples, when
+nothing changed, after the connection is lost mid-transfer and when the log was
+replaced by a new recording.
+Run from the repository root:
+    python -m benchmarks.bench_incremental_download
+"""
+import tempfile
+import time
+
+import numpy as np
+
+import simulator
+from datalog import DataLogConnectionError, download_data_log
+from logstore import LogStore, sync_data_log
+
+
+def connect(serial):
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(serial)
+    return dev, dev.DeviceHandle
+
+
+def measure(device, func):
+    """
+    Returns the result of func(), its round trips and its duration.
+    """
+    before = device.round_trips
+    start = time.perf_counter()
+    result = func()
+    return result, device.round_trips - before, time.perf_counter() - start
+
+
+def main(n_samples=2000, n_new=100, latency=2E-4, jitter=0.0, fast_logging=False):
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples + n_new)
+    device = simulator.SimulatedDevice(
+        "479586", tim_vals[:n_samples], adc_vals[:n_samples], latency=latency,
+        jitter=jitter, fast_logging=fast_logging
+    )
+    simulator.add_device(device)
+    serial = device.serial
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = LogStore(folder)
+        dev, handle = connect(serial)
+        print(f"{'':28s} {'samples':>8s} {'round trips':>12s} {'time (s)':>9s}")
+
+        def report(label, result, round_trips, elapsed):
+            print(f"{label:28s} {len(result[0]):8d} {round_trips:12d} {elapsed:9.3f}")
+
+        report("first sync", *measure(device, lambda: sync_data_log(dev, handle, serial, store)))
+        device.record(tim_vals[n_samples:], adc_vals[n_samples:])
+        report("full download", *measure(device, lambda: download_data_log(dev, handle)))
+        result, round_trips, elapsed = measure(
+            device, lambda: sync_data_log(dev, handle, serial, store)
+        )
+        report(f"sync after {n_new} new samples", result, round_trips, elapsed)
+        assert np.array_equal(result[0], tim_vals) and np.array_equal(result[1], adc_vals)
+        report("sync, nothing new", *measure(device, lambda: sync_data_log(dev, handle, serial, store)))
+
+        # The device is unplugged halfway through a download from scratch
+        store.clear(serial)
+
+        def unplug(count, total, rate):
+            if count >= len(tim_vals) // 2:
+                simulator.remove_device(serial)
+        before = device.round_trips
+        try:
+            sync_data_log(dev, handle, serial, store, progress=unplug)
+        except DataLogConnectionError as error:
+            print(f"{'connection lost':28s} {len(store.load(serial)[0]):8d} "
+                  f"{device.round_trips - before:12d}  {error}")
+        else:
+            print(f"{'connection lost':28s} the download ended before the device was unplugged")
+        simulator.add_device(device)
+        dev, handle = connect(serial)
+        result, round_trips, elapsed = measure(
+            device, lambda: sync_data_log(dev, handle, serial, store)
+        )
+        report("resumed after reconnecting", result, round_trips, elapsed)
+        assert np.array_equal(result[0], tim_vals) and np.array_equal(result[1], adc_vals)
+
+        # A new recording replaces the log: the probes detect it
+        new_tim, new_adc = simulator.synthetic_log(n_samples, seed=1)
+        device.tim_vals, device.adc_vals = new_tim, new_adc
+        result, round_trips, elapsed = measure(
+            device, lambda: sync_data_log(dev, handle, serial, store)
+        )
+        report("sync after a new recording", result, round_trips, elapsed)
+        assert np.array_equal(result[1], new_adc)
+        dev.Close_Device_Connection(handle)
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Overhead of InstrumentedDevice per method call and property read, with and without
+the DeviceStatus tracking and the trace, then the report and the Chrome trace of an
+instrumented data log download.
+Run from the repository root:
+    python -m benchmarks.bench_instrumentation
+"""
+import os
+import statistics
+import tempfile
+import time
+
+import simulator
+from datalog import download_data_log
+from instrument import InstrumentedDevice
+
+MODES = {
+    "counts and latency": {"track_status": False, "trace": False},
+    "+ DeviceStatus": {"track_status": True, "trace": False},
+    "+ DeviceStatus + trace": {"track_status": True, "trace": True},
+}
+
+
+def open_device(n_samples=100):
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples)
+    device = simulator.SimulatedDevice("479586", tim_vals, adc_vals, latency=0.0, jitter=0.0)
+    simulator.add_device(device)
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(device.serial)
+    return dev
+
+
+def time_calls(dev, n_calls, repeats=7):
+    """
+    Returns the median time (us) of one Normal_Data_Request and of one property read.
+    """
+    handle = dev.DeviceHandle
+    call_times, read_times = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            dev.Normal_Data_Request(handle, 2)
+        call_times.append((time.perf_counter() - start) / n_calls * 1E6)
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            dev.DataLogging_Value1
+        read_times.append((time.perf_counter() - start) / n_calls * 1E6)
+    return statistics.median(call_times), statistics.median(read_times)
+
+
+def main(n_calls=100000):
+    dev = open_device()
+    plain_call, plain_read = time_calls(dev, n_calls)
+    print(f"{'':24s} {'call':>8s} {'overhead':>9s} {'read':>8s} {'overhead':>9s}  (us)")
+    print(f"{'not instrumented':24s} {plain_call:8.2f} {'':9s} {plain_read:8.2f}")
+    for name, kwargs in MODES.items():
+        call, read = time_calls(InstrumentedDevice(dev, **kwargs), n_calls)
+        print(f"{name:24s} {call:8.2f} {call - plain_call:9.2f} "
+              f"{read:8.2f} {read - plain_read:9.2f}")
+    dev.Close_Device_Connection(dev.DeviceHandle)
+
+    # Download through the instrumented device, with USB latency
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(2000)
+    device = simulator.SimulatedDevice("479586", tim_vals, adc_vals, latency=2E-4, jitter=5E-5)
+    simulator.add_device(device)
+    dev = InstrumentedDevice(simulator.USB_DLL())
+    dev.Open_Device_Connection(device.serial)
+    download_data_log(dev, dev.DeviceHandle)
+    dev.Get_Data_Logging(dev.DeviceHandle, device.memory_size)  # Invalid Parameter
+    dev.Close_Device_Connection(dev.DeviceHandle)
+    print("\nDownload of 2000 samples\n" + dev.report())
+    print("\nGet_Data_Logging latency histogram")
+    for upper_us, count in dev.stats("Get_Data_Logging").histogram():
+        print(f"  < {upper_us:8.1f} us {count:6d}")
+    with tempfile.TemporaryDirectory() as folder:
+        prefix = os.path.join(folder, "profile")
+        dev.save(prefix)
+        n_events = len(dev.chrome_trace()["traceEvents"])
+        size = os.path.getsize(prefix + ".json")
+        print(f"\nChrome trace: {n_events} events, {size / 1024:.0f} KiB")
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Frame time and CPU use of LivePlot with 10^6+ points, compared with drawing every
+point, and the live acquisition rate while each of them plots the stream.
+Runs offscreen. Run from the repository root:
+    python -m benchmarks.bench_live_plot
+"""
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QVBoxLayout, QWidget
+
+import simulator
+from conversion import DA_convert
+from liveplot import LivePlot
+from streaming import StreamConsumer, StreamingAcquisition
+
+
+class FullPlot(LivePlot):
+    """
+    Reference: draws every sample and renders the whole figure at each frame.
+    """
+    def refresh(self, force=False):
+        start = time.perf_counter()
+        n_samples = self.series.n_samples
+        x_vals, y_vals = self.series.x[:n_samples], self.series.y[:n_samples]
+        self.line.set_animated(False)
+        self.line.set_data(x_vals, y_vals)
+        self._rescale(x_vals, y_vals)
+        self.canvas.draw()
+        self.frame_times.append(time.perf_counter() - start)
+        return True
+
+
+def make_plot(plot_class):
+    window = QWidget()
+    layout = QVBoxLayout(window)
+    plot = plot_class(layout)
+    window.resize(800, 400)
+    window.show()
+    QApplication.processEvents()
+    return window, plot
+
+
+def torque_signal(n_samples, start=0, period_s=1E-3):
+    """
+    Time (s) and torque of a noisy signal, like a long capture at 1 kHz.
+    """
+    index = np.arange(start, start + n_samples)
+    rng = np.random.default_rng(abs(start))
+    return index * period_s, 50 * np.sin(index / 5000) + rng.normal(0, 1, n_samples)
+
+
+def frame_benchmark(plot_class, n_points, n_frames=50, new_per_frame=1000):
+    """
+    Preloads n_points samples, then appends new_per_frame samples before each
+    frame. Returns the plot statistics and the CPU load while drawing.
+    """
+    window, plot = make_plot(plot_class)
+    plot.append(*torque_signal(n_points))
+    plot.refresh(force=True)
+    plot.frame_times.clear()
+    cpu_start = time.process_time()
+    for frame in range(n_frames):
+        plot.append(*torque_signal(new_per_frame, n_points + frame * new_per_frame))
+        plot.refresh(force=True)
+    cpu = time.process_time() - cpu_start
+    window.close()
+    frame_times = np.array(plot.frame_times) * 1000
+    return {
+        "frame_p50": float(np.percentile(frame_times, 50)),
+        "frame_max": float(frame_times.max()),
+        "cpu_per_frame": cpu / n_frames * 1000,
+        "load_at_max_fps": min(cpu / n_frames * plot_class.MAX_FPS, 1.0) * 100,
+    }
+
+
+def acquisition_benchmark(plot_class, seconds=2.0, preload=10 ** 6, latency=2E-4):
+    """
+    Streams from a simulated device while plot_class plots the stream at up to
+    MAX_FPS. Returns the acquisition rate in samples/s, or without plotting if
+    plot_class is None.
+    """
+    simulator.clear_devices()
+    device = simulator.SimulatedDevice(latency=latency)
+    simulator.add_device(device)
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(device.serial)
+    acquisition = StreamingAcquisition(dev, dev.DeviceHandle, channel=2, capacity=1 << 18)
+    consumer = StreamConsumer(acquisition.buffer)
+    window, plot = make_plot(plot_class or LivePlot)
+    # 10^6 earlier samples are already on the plot
+    plot.append(*torque_signal(preload, -preload))
+    registers = device.registers
+    acquisition.start()
+    live_start = time.perf_counter()
+    end = live_start + seconds
+    while time.perf_counter() < end:
+        timestamps, adc_vals = consumer.read()
+        if plot_class is not None:
+            plot.append(timestamps - live_start, DA_convert(
+                adc_vals, registers[0x02], registers[0x03], registers[0x04],
+                registers[0x05] * 1E-3
+            ))
+            plot.refresh()
+        QApplication.processEvents()
+        time.sleep(1 / LivePlot.MAX_FPS)
+    acquisition.stop()
+    window.close()
+    dev.Close_Device_Connection(dev.DeviceHandle)
+    simulator.clear_devices()
+    return acquisition.stats()["rate"]
+
+
+def main(point_counts=(10 ** 6, 4 * 10 ** 6)):
+    app = QApplication.instance() or QApplication([])
+    print(f"{'plot':10s} {'points':>9s} {'frame p50':>10s} {'frame max':>10s} "
+          f"{'CPU/frame':>10s} {'CPU at 10 FPS':>14s}")
+    for n_points in point_counts:
+        for name, plot_class in (("full", FullPlot), ("LivePlot", LivePlot)):
+            n_frames = 10 if plot_class is FullPlot else 50
+            stats = frame_benchmark(plot_class, n_points, n_frames)
+            print(f"{name:10s} {n_points:9d} {stats['frame_p50']:8.1f}ms "
+                  f"{stats['frame_max']:8.1f}ms {stats['cpu_per_frame']:8.1f}ms "
+                  f"{stats['load_at_max_fps']:13.0f}%")
+
+    print("\nLive acquisition rate with 10^6 points on the plot")
+    for name, plot_class in (("no plot", None), ("full", FullPlot), ("LivePlot", LivePlot)):
+        rate = acquisition_benchmark(plot_class)
+        print(f"{name:10s} {rate:9.0f} samples/s")
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
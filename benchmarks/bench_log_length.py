@@ -0,0 +1,86 @@
+"""
+Round trips of probe_log_length against the linear scan to the end of the log, on
+simulated logging memories whose end is followed by zeros, by stale samples of
+older recordings or by the wrapped-around start of the same recording. The probed
+lengths are checked by tests/test_datalog.py.
+Run from the repository root:
+    python -m benchmarks.bench_log_length
+"""
+import numpy as np
+
+import simulator
+from benchmarks.bench_datalog_download import legacy_download
+from datalog import DataLogReader, download_data_log, probe_log_length
+
+
+def layouts(n_samples, memory_size, recorded=False):
+    """
+    Yields (name, device) pairs, each device holding a log of n_samples samples
+    at 20 ms, and the recorded SAMPLE_LOG if recorded is True.
+    """
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples)
+    device = simulator.SimulatedDevice("1", tim_vals, adc_vals, memory_size=memory_size)
+    yield "zeros", device
+
+    device = simulator.SimulatedDevice("2", tim_vals, adc_vals, memory_size=memory_size)
+    device.fill_memory(*simulator.synthetic_log(memory_size, period_ms=10, seed=1))
+    yield "stale, 10 ms period", device
+
+    device = simulator.SimulatedDevice("3", tim_vals, adc_vals, memory_size=memory_size)
+    stale_tim, stale_adc = simulator.synthetic_log(memory_size, seed=2)
+    device.fill_memory(stale_tim + 60000, stale_adc)
+    yield "stale, started 60 s later", device
+
+    # A recording longer than the memory continued at address 0, overwriting its
+    # own start: the log read from 0 is its end, followed by older samples
+    recording_tim, recording_adc = simulator.synthetic_log(memory_size + n_samples, seed=3)
+    device = simulator.SimulatedDevice(
+        "4", recording_tim[memory_size:], recording_adc[memory_size:],
+        memory_size=memory_size
+    )
+    device.fill_memory(recording_tim[:memory_size], recording_adc[:memory_size])
+    yield "wrapped", device
+
+    if recorded:
+        device = simulator.SimulatedDevice.from_dat_file(serial="5", memory_size=memory_size)
+        yield "recorded .dat, jittery", device
+
+
+def main(n_samples=(2, 3, 100, 1000, 5000), memory_size=8192):
+    print(f"{'layout':26s} {'log':>6s} {'probed':>6s} {'linear':>6s} "
+          f"{'probe trips':>11s} {'download':>8s} {'legacy':>8s}")
+    failures = 0
+    for n in n_samples:
+        for name, device in layouts(n, memory_size, recorded=n == n_samples[-1]):
+            simulator.clear_devices()
+            simulator.add_device(device)
+            dev = simulator.USB_DLL()
+            dev.Open_Device_Connection(device.serial)
+            handle = dev.DeviceHandle
+
+            before = device.round_trips
+            probed = probe_log_length(dev, handle)
+            probe_trips = device.round_trips - before
+
+            before = device.round_trips
+            tim_vals, adc_vals = download_data_log(dev, handle, reader=DataLogReader(dev, handle))
+            download_trips = device.round_trips - before
+
+            before = device.round_trips
+            linear = len(legacy_download(dev, handle)[0])
+            legacy_trips = device.round_trips - before
+
+            ok = probed == linear == device.n_samples and np.array_equal(
+                tim_vals, device.tim_vals
+            )
+            failures += not ok
+            print(f"{name:26s} {device.n_samples:6d} {probed:6d} {linear:6d} "
+                  f"{probe_trips:11d} {download_trips:8d} {legacy_trips:8d}"
+                  f"{'' if ok else '  MISMATCH'}")
+            dev.Close_Device_Connection(handle)
+    simulator.clear_devices()
+    print("All lengths match." if not failures else f"{failures} mismatches.")
+
+
+if __name__ == "__main__":
+    main()
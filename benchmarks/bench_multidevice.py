@@ -0,0 +1,65 @@
+"""
+Aggregate throughput of DeviceManager with N simulated devices, for log downloads
+and live streaming, compared with downloading the logs one device after the other.
+Run from the repository root:
+    python -m benchmarks.bench_multidevice
+"""
+import time
+
+import simulator
+from datalog import download_data_log
+from multidevice import DeviceManager
+
+
+def plug_devices(n_devices, n_samples, latency, jitter):
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples)
+    for index in range(n_devices):
+        simulator.add_device(simulator.SimulatedDevice(
+            str(500000 + index), tim_vals, adc_vals, latency=latency, jitter=jitter,
+            seed=index, fast_logging=False
+        ))
+
+
+def sequential_downloads(serials):
+    """
+    One app per device, run one after the other.
+    """
+    samples = 0
+    for serial in serials:
+        dev = simulator.USB_DLL()
+        dev.Open_Device_Connection(serial)
+        tim_vals, _ = download_data_log(dev, dev.DeviceHandle)
+        samples += len(tim_vals)
+        dev.Close_Device_Connection(dev.DeviceHandle)
+    return samples
+
+
+def main(device_counts=(1, 2, 4, 8), n_samples=500, latency=1E-3, jitter=2E-4,
+         stream_seconds=1.0):
+    print(f"{'devices':>7s} {'sequential':>12s} {'concurrent':>12s} {'streaming':>12s}  (samples/s)")
+    for n_devices in device_counts:
+        plug_devices(n_devices, n_samples, latency, jitter)
+        manager = DeviceManager(simulator.USB_DLL)
+        serials = manager.open()
+
+        start = time.perf_counter()
+        samples = sequential_downloads(serials)
+        sequential_rate = samples / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        logs = manager.download_logs()
+        elapsed = time.perf_counter() - start
+        concurrent_rate = sum(len(tim_vals) for tim_vals, _ in logs.values()) / elapsed
+
+        manager.start_streaming(capacity=1 << 16)
+        time.sleep(stream_seconds)
+        manager.stop_streaming()
+        stream_rate = manager.stats()["stream_rate"]
+        manager.close()
+        print(f"{n_devices:7d} {sequential_rate:12.0f} {concurrent_rate:12.0f} {stream_rate:12.0f}")
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Recovery of a DeviceSession from injected faults on a simulated IHH500.
+The device is unplugged in the middle of a data log download and plugged back
+after OUTAGES seconds, with both readers. For each outage: the time the session
+took to reconnect, the total download time against an undisturbed download, and
+whether the log matches the device memory. Without the session, the same drop
+ends the download with DataLogConnectionError.
+Then live reads sent through DeviceSession.call while the device drops every
+READ_DROP_EVERY round trips: the reads replayed and those the caller saw failing.
+Ends with a device that never comes back, given up after the session timeout.
+Run from the repository root:
+    python -m benchmarks.bench_reconnect
+"""
+import time
+
+import numpy as np
+
+import datalog
+import simulator
+from datalog import DataLogConnectionError, download_data_log
+from session import DeviceSession, ReconnectError
+
+SERIAL = "479586"
+N_SAMPLES = 20000
+# Duration of the injected outages (s)
+OUTAGES = (0.05, 0.2, 1.0, 3.0)
+N_READS = 2000
+READ_DROP_EVERY = 250
+
+
+def plug(fast_logging):
+    # The session reads with the experimental fast reader only when opted in
+    datalog.FAST_LOGGING = fast_logging
+    simulator.clear_devices()
+    tim_vals, adc_vals = simulator.synthetic_log(N_SAMPLES, seed=1)
+    device = simulator.SimulatedDevice(
+        SERIAL, tim_vals, adc_vals, latency=2E-5, fast_logging=fast_logging
+    )
+    return simulator.add_device(device)
+
+
+def download(fast_logging, outage):
+    """
+    Returns (recovery time, download time, log matches) with outage seconds
+    without the device halfway through, no drop if outage is None.
+    """
+    device = plug(fast_logging)
+    session = DeviceSession(simulator.USB_DLL(), SERIAL)
+    session.open()
+    if outage is not None:
+        # Halfway through: one round trip per page or per sample
+        pages = N_SAMPLES // session.dev.fast_page_size if fast_logging else N_SAMPLES
+        device.drop_after(pages // 2, outage)
+    start = time.perf_counter()
+    tim_vals, adc_vals = session.download_log()
+    elapsed = time.perf_counter() - start
+    matches = np.array_equal(tim_vals, device.tim_vals) and \
+        np.array_equal(adc_vals, device.adc_vals)
+    return session.stats()["recovery_max"], elapsed, matches
+
+
+def main():
+    for fast_logging in (True, False):
+        name = "FastDataLogging (experimental)" if fast_logging else "Get_Data_Logging"
+        _, clean, _ = download(fast_logging, None)
+        print(f"{name}, {N_SAMPLES} samples, {clean:.2f} s without drop")
+        print("   outage   recovered in   download   log intact")
+        for outage in OUTAGES:
+            recovery, elapsed, matches = download(fast_logging, outage)
+            print(f"  {outage:5.2f} s   {recovery:10.2f} s   {elapsed:6.2f} s   {matches}")
+
+    device = plug(True)
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(SERIAL)
+    device.drop_after(N_SAMPLES // dev.fast_page_size // 2, 0.05)
+    try:
+        download_data_log(dev, dev.DeviceHandle)
+        print("\nWithout session: download complete")
+    except DataLogConnectionError as error:
+        print(f"\nWithout session: {error}")
+
+    device = plug(True)
+    session = DeviceSession(simulator.USB_DLL(), SERIAL)
+    session.open()
+    failed = 0
+    start = time.perf_counter()
+    for i in range(N_READS):
+        if i % READ_DROP_EVERY == READ_DROP_EVERY // 2:
+            device.drop_after(1, 0.05)
+        if session.call("Normal_Data_Request", 2) == "Error":
+            failed += 1
+    elapsed = time.perf_counter() - start
+    stats = session.stats()
+    print(f"{N_READS} reads in {elapsed:.2f} s: {stats['drops']} drops, "
+          f"{stats['replayed']} reads replayed, {failed} failed, recovery "
+          f"{stats['recovery_mean']:.3f} s on average, {stats['recovery_max']:.3f} s at most")
+
+    device.unplug()
+    session.timeout = 2.0
+    start = time.perf_counter()
+    try:
+        session.call("Normal_Data_Request", 2)
+    except ReconnectError as error:
+        print(f"Unplugged for good, gave up after {time.perf_counter() - start:.2f} s: {error}")
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
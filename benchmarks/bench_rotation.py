@@ -0,0 +1,88 @@
+"""
+Torque and rotation sampled together by RotationAcquisition, compared with
+reading each channel separately (a torque request and a Get_Rotation_Values per
+sample, each with its own timestamp), on a simulated IHH500 with a 1 ms round
+trip and a shaft turning at 300 rpm.
+For each method: the rate of complete samples (torque, speed and angle), the USB
+packets sent per sample and the error of the angle at the timestamp of the
+torque, known exactly from the simulated shaft.
+Run from the repository root:
+    python -m benchmarks.bench_rotation
+"""
+import time
+
+import numpy as np
+
+import simulator
+from rotation import RotationAcquisition
+
+SERIAL = "479586"
+RPM = 300.0
+DURATION = 3.0
+
+
+def angle_error(device, timestamps, angles):
+    """
+    Mean and maximum absolute error of the angles (degrees) at the timestamps.
+    """
+    expected = (RPM * 6 * (timestamps - device.opened_at)) % 360
+    error = np.abs((angles - expected + 180) % 360 - 180)
+    return float(error.mean()), float(error.max())
+
+
+def read_separately(dev, handle):
+    """
+    One torque request and one Get_Rotation_Values per sample, the angle being
+    used as read.
+    """
+    clock = time.perf_counter
+    timestamps, angles = [], []
+    end = clock() + DURATION
+    while clock() < end:
+        sent = clock()
+        int(dev.Normal_Data_Request(handle, 2))
+        received = clock()
+        dev.Get_Rotation_Values(handle)
+        float(dev.RPMValue)
+        timestamps.append((sent + received) / 2)
+        angles.append(float(dev.AngleValue))
+    return np.array(timestamps), np.array(angles)
+
+
+def main():
+    simulator.clear_devices()
+    device = simulator.SimulatedDevice(SERIAL, latency=1E-3, jitter=2E-4)
+    device.rpm = RPM
+    simulator.add_device(device)
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(SERIAL)
+    handle = dev.DeviceHandle
+
+    print(f"{'method':28s} {'samples/s':>10s} {'packets/sample':>15s} "
+          f"{'angle error mean/max (deg)':>27s}")
+    packets = dev.PacketSent
+    timestamps, angles = read_separately(dev, handle)
+    packets = (dev.PacketSent - packets) / len(timestamps)
+    mean, worst = angle_error(device, timestamps, angles)
+    print(f"{'separately':28s} {len(timestamps) / DURATION:10.0f} {packets:15.2f} "
+          f"{mean:13.2f} / {worst:.2f}")
+
+    for rotation_every in (1, 4, 10):
+        acquisition = RotationAcquisition(dev, handle, rotation_every=rotation_every)
+        packets = dev.PacketSent
+        acquisition.start()
+        time.sleep(DURATION)
+        acquisition.stop()
+        stats = acquisition.stats()
+        timestamps, samples = acquisition.buffer.snapshot()
+        packets = (dev.PacketSent - packets) / len(timestamps)
+        mean, worst = angle_error(device, timestamps, samples["angle"])
+        name = f"RotationAcquisition, every {rotation_every}"
+        print(f"{name:28s} {stats['rate']:10.0f} {packets:15.2f} "
+              f"{mean:13.2f} / {worst:.2f}")
+    dev.Close_Device_Connection(handle)
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
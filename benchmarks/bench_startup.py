@@ -0,0 +1,93 @@
+"""
+Startup time of the GUI and the CLI, each measured in a fresh interpreter, with the
+eager imports and uic.loadUi used before and with the lazy loading and the
+precompiled form. Runs headless with the offscreen Qt platform and the simulator
+backend, so the time the futek backend spends starting the .NET runtime (now
+deferred to the first connection) is not included.
+Run from the repository root:
+    python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+UI_PATH = os.path.join(REPO, "gui", "torque_bench_minimal.ui")
+
+# Each script prints the time from its first line to the window shown (or the
+# module imported), the interpreter startup is measured separately
+TIMER = "import time; start = time.perf_counter()\n"
+REPORT = "print(time.perf_counter() - start)\n"
+
+SCRIPTS = {
+    "interpreter": TIMER + REPORT,
+    "GUI, eager (before)": TIMER + f"""
+from PyQt5 import uic
+from PyQt5.QtWidgets import QApplication, QMainWindow
+import numpy, binlog, calibration, datalog, liveplot, logstore, streaming
+from device import load_usb_dll
+load_usb_dll()
+app = QApplication([])
+window = QMainWindow()
+uic.loadUi({UI_PATH!r}, window)
+window.show()
+app.processEvents()
+""" + REPORT,
+    # The compiled form is deleted first, so this run compiles it again
+    "GUI, lazy, form compiled": f"""
+import os, uicache
+path = uicache.compiled_path({UI_PATH!r})
+if os.path.exists(path):
+    os.remove(path)
+""" + TIMER + """
+import main_minimal
+from PyQt5.QtWidgets import QApplication
+app = QApplication([])
+window = main_minimal.MainWindow()
+window.show()
+app.processEvents()
+""" + REPORT,
+    "GUI, lazy, form cached": TIMER + """
+import main_minimal
+from PyQt5.QtWidgets import QApplication
+app = QApplication([])
+window = main_minimal.MainWindow()
+window.show()
+app.processEvents()
+""" + REPORT,
+    "CLI, eager (before)": TIMER + """
+import viacli
+from device import load_usb_dll
+load_usb_dll()
+""" + REPORT,
+    "CLI, lazy": TIMER + "import viacli\n" + REPORT,
+}
+
+
+def run(script):
+    """
+    Runs script in a new interpreter, returns the time it printed and the total
+    time of the process.
+    """
+    env = dict(os.environ, OPENFUTEK_BACKEND="sim", QT_QPA_PLATFORM="offscreen")
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=REPO, env=env, check=True,
+        capture_output=True, text=True
+    ).stdout
+    return float(output.split()[-1]), time.perf_counter() - start
+
+
+def main(runs=5):
+    print(f"{'':28s} {'in script':>10s} {'process':>10s}  (median of {runs} runs, ms)")
+    for name, script in SCRIPTS.items():
+        results = [run(script) for _ in range(runs)]
+        in_script = statistics.median(result[0] for result in results) * 1000
+        process = statistics.median(result[1] for result in results) * 1000
+        print(f"{name:28s} {in_script:10.0f} {process:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
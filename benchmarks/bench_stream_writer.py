@@ -0,0 +1,118 @@
+"""
+StreamWriter throughput for both formats, and the memory used while recording a
+24-hour acquisition at 1 kHz (86.4 million samples, fed in 100 ms batches as fast
+as the writer takes them) compared with keeping the samples in memory and saving
+them at the end as save_data does.
+Writes about 1.4 GB to a temporary folder. Run from the repository root:
+    python -m benchmarks.bench_stream_writer
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from calibration import Calibration
+from streamlog import StreamWriter, read_stream_log, recover
+
+CALIBRATION = Calibration(
+    "479586", "1", "2024-01-01", offset_d=8388608, fullscale_d=8000000,
+    reverse_fullscale_d=8000000, fullscale_load_a=100.0, unit_code="N.cm",
+    decimal_point="2",
+)
+
+
+def rss_mb():
+    """
+    Resident memory of the process (MB), Linux only.
+    """
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def batches(n_samples, batch_size=100, rate=1000.0):
+    """
+    Live-like batches of (timestamps, ADC values).
+    """
+    rng = np.random.default_rng(0)
+    adc_template = 8388608 + rng.integers(-300000, 300000, batch_size)
+    for start in range(0, n_samples, batch_size):
+        count = min(batch_size, n_samples - start)
+        timestamps = (start + np.arange(count)) / rate
+        yield timestamps, adc_template[:count]
+
+
+def throughput(folder, filename, n_samples=10 ** 6):
+    path = os.path.join(folder, filename)
+    start = time.perf_counter()
+    with StreamWriter(path, CALIBRATION) as writer:
+        for timestamps, adc_vals in batches(n_samples, 1000):
+            writer.write(timestamps, adc_vals)
+    elapsed = time.perf_counter() - start
+    return n_samples / elapsed, os.path.getsize(path) / n_samples
+
+
+def savetxt_throughput(folder, n_samples=10 ** 6):
+    """
+    save_data: all the samples in memory, written at once with np.savetxt.
+    """
+    tim_vals = np.arange(n_samples)
+    adc_vals = 8388608 + np.arange(n_samples) % 1000
+    tq_vals = CALIBRATION.convert(adc_vals)
+    start = time.perf_counter()
+    np.savetxt(
+        os.path.join(folder, "savetxt.dat"), np.column_stack((tim_vals, adc_vals, tq_vals)),
+        fmt=["%i", "%i", "%f"], header="Time(ms)\tADC Count\tTorque (N.cm)", delimiter="\t"
+    )
+    return n_samples / (time.perf_counter() - start)
+
+
+def long_run(folder, hours=24, rate=1000, report_every_hours=4):
+    path = os.path.join(folder, "long.tqs")
+    n_samples = int(hours * 3600 * rate)
+    report_every = int(report_every_hours * 3600 * rate)
+    base_rss = rss_mb()
+    print(f"\n{hours} h at {rate} Hz: {n_samples} samples, RSS before: {base_rss:.0f} MB")
+    print(f"{'hour':>5s} {'RSS MB':>8s} {'in memory MB':>13s}")
+    start = time.perf_counter()
+    written = 0
+    with StreamWriter(path, CALIBRATION) as writer:
+        for timestamps, adc_vals in batches(n_samples, 100, rate):
+            writer.write(timestamps, adc_vals)
+            written += len(adc_vals)
+            if written % report_every == 0:
+                # save_data keeps the time, ADC and torque columns (3 x 8 bytes)
+                print(f"{written / rate / 3600:5.0f} {rss_mb():8.0f} "
+                      f"{written * 24 / 2 ** 20:13.0f}")
+    elapsed = time.perf_counter() - start
+    print(f"Written in {elapsed:.0f} s ({n_samples / elapsed:.0f} samples/s), "
+          f"{writer.n_fsync} fsync, file {os.path.getsize(path) / 2 ** 30:.2f} GiB")
+
+    # A crash two thirds of the way: no trailer and the last chunk is torn
+    with open(path, "r+b") as log_file:
+        log_file.truncate(os.path.getsize(path) * 2 // 3)
+    start = time.perf_counter()
+    recovered = recover(path)
+    print(f"Recovered {recovered} of {n_samples} samples after a simulated crash "
+          f"in {time.perf_counter() - start:.1f} s")
+    os.remove(path)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'writer':22s} {'samples/s':>10s} {'bytes/sample':>13s}")
+        print(f"{'np.savetxt (before)':22s} {savetxt_throughput(folder):10.0f}")
+        for name, filename in (("StreamWriter text", "stream.dat"),
+                               ("StreamWriter binary", "stream.tqs")):
+            rate, size = throughput(folder, filename)
+            print(f"{name:22s} {rate:10.0f} {size:13.1f}")
+        _, times, adc_vals, _ = read_stream_log(os.path.join(folder, "stream.tqs"))
+        assert len(times) == 10 ** 6
+        long_run(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Sample rate of the streaming acquisition against the fixed 100 ms polling loop of
+viacli.GetSingleData, on a simulated device.
+Run from the repository root:
+    python -m benchmarks.bench_streaming
+"""
+import time
+
+import simulator
+from streaming import StreamConsumer, StreamingAcquisition
+
+
+def sleep_polling(dev, handle, seconds):
+    """
+    Polling with time.sleep(0.1) between requests, as GetSingleData does.
+    Returns the number of samples.
+    """
+    samples = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        dev.Normal_Data_Request(handle, 2)
+        samples += 1
+        time.sleep(0.1)
+    return samples
+
+
+def main(seconds=3.0, latency=1E-3, jitter=2E-4):
+    device = simulator.add_device(simulator.SimulatedDevice.from_dat_file(
+        latency=latency, jitter=jitter
+    ))
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(device.serial)
+    handle = dev.DeviceHandle
+
+    samples = sleep_polling(dev, handle, seconds)
+    print(f"Polling with sleep(0.1):  {samples / seconds:8.1f} Hz")
+
+    acquisition = StreamingAcquisition(dev, handle, capacity=1 << 16)
+    consumer = StreamConsumer(acquisition.buffer)
+    acquisition.start()
+    # A consumer reading every 50 ms, like a GUI refresh, must not slow the producer
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        consumer.read()
+        time.sleep(0.05)
+    acquisition.stop()
+    stats = acquisition.stats()
+    print(f"StreamingAcquisition:     {stats['rate']:8.1f} Hz  "
+          f"dropped {stats['dropped']}  missed by consumer {consumer.dropped}")
+    print(f"Latency (ms): p50 {stats['latency_p50']:.3f}  p90 {stats['latency_p90']:.3f}  "
+          f"p99 {stats['latency_p99']:.3f}  max {stats['latency_max']:.3f}")
+    simulator.clear_devices()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Sustained samples per second through the telemetry server with 1, 10 and 100
+subscribers, and with 10 subscribers plus one that reads too slowly.
+The server runs in its own process with a simulated device answering without
+latency, so the acquisition is as fast as the polling loop. The subscribers run
+in this process.
+Run from the repository root:
+    python -m benchmarks.bench_telemetry
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from telemetry import TelemetryClient
+
+REPO = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+PORT = 5599
+
+SERVER = f"""
+import asyncio, simulator, telemetry
+tim_vals, adc_vals = simulator.synthetic_log(100)
+simulator.add_device(simulator.SimulatedDevice(
+    "479586", tim_vals, adc_vals, latency=0.0, jitter=0.0
+))
+asyncio.run(telemetry.serve("479586", port={PORT}, stats_interval=3600))
+"""
+
+
+async def subscriber(results, index, seconds, delay=0.0):
+    """
+    Counts the samples received during seconds, and the samples missed
+    according to the sequence numbers.
+    """
+    received = missed = 0
+    first_sequence = next_sequence = None
+    sock = None
+    if delay:
+        # A small receive buffer, otherwise the kernel buffers seconds of samples
+        # on localhost before the server has to drop any
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 16)
+        sock.connect(("127.0.0.1", PORT))
+        sock.setblocking(False)
+    async with TelemetryClient(port=PORT, sock=sock) as client:
+        end = time.perf_counter() + seconds
+        async for first, timestamps, values in client:
+            if first_sequence is None:
+                first_sequence = first
+            elif first > next_sequence:
+                missed += first - next_sequence
+            next_sequence = first + len(values)
+            received += len(values)
+            if time.perf_counter() > end:
+                break
+            if delay:
+                await asyncio.sleep(delay)
+    results[index] = (received, missed, next_sequence - first_sequence)
+
+
+async def run_clients(n_clients, seconds=3.0, n_slow=0):
+    results = {}
+    tasks = [subscriber(results, i, seconds) for i in range(n_clients)]
+    # The slow clients read one frame every 20 ms, half the frame rate
+    tasks += [subscriber(results, n_clients + i, seconds, 0.02) for i in range(n_slow)]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    fast = [results[i] for i in range(n_clients)]
+    slow = [results[n_clients + i] for i in range(n_slow)]
+    return elapsed, fast, slow
+
+
+async def wait_for_server(timeout=10.0):
+    end = time.perf_counter() + timeout
+    while True:
+        try:
+            async with TelemetryClient(port=PORT):
+                return
+        except OSError:
+            if time.perf_counter() > end:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def main():
+    print(f"{'subscribers':16s} {'acquired/s':>11s} {'per client/s':>13s} "
+          f"{'total/s':>10s} {'missed':>8s}")
+    for n_clients, n_slow, seconds in ((1, 0, 3), (10, 0, 3), (100, 0, 3), (10, 1, 10)):
+        elapsed, fast, slow = await run_clients(n_clients, seconds, n_slow)
+        acquired = max(span for _, _, span in fast) / elapsed
+        per_client = min(received for received, _, _ in fast) / elapsed
+        total = sum(received for received, _, _ in fast + slow) / elapsed
+        missed = sum(missed for _, missed, _ in fast)
+        name = f"{n_clients}" + (f" + {n_slow} slow" if n_slow else "")
+        print(f"{name:16s} {acquired:11.0f} {per_client:13.0f} {total:10.0f} {missed:8d}")
+        for received, missed, _ in slow:
+            print(f"{'  slow client':16s} {'':11s} {received / elapsed:13.0f} {'':10s} {missed:8d}")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as home:
+        # The calibration cache of the server goes to a temporary home
+        env = dict(os.environ, OPENFUTEK_BACKEND="sim", HOME=home, USERPROFILE=home)
+        server = subprocess.Popen([sys.executable, "-c", SERVER], cwd=REPO, env=env)
+        try:
+            asyncio.run(wait_for_server())
+            asyncio.run(main())
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,96 @@
+"""
+Chunked text log reader against np.loadtxt, on generated 10^6 sample logs in both
+layouts: the .dat files (index, time, ADC in np.savetxt's default scientific
+notation) and the save_data files. iter_text_log parses with np.loadtxt block by
+block, so it is compared for its peak memory and its speed is only expected to
+stay close. The gain is reading a time range through the sidecar index.
+Run from the repository root:
+    python -m benchmarks.bench_textlog
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import textlog
+from conversion import DA_convert
+from simulator import synthetic_log
+
+N_SAMPLES = 10 ** 6
+CALIBRATION = (8388608, 12582912, 4194304, 500.0)
+
+
+def best_time(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_memory(func):
+    """
+    Peak memory allocated by NumPy and Python during func, in MB.
+    """
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1E6
+
+
+def chunked_sum(path):
+    # Consumes the chunks as a streaming analysis would
+    return sum(float(tim_vals.sum()) for tim_vals, _, _ in textlog.iter_text_log(path))
+
+
+def compare(name, path):
+    layout = textlog.detect_layout(path)
+    size = os.path.getsize(path)
+    loadtxt_s, data = best_time(lambda: np.loadtxt(path, ndmin=2))
+    tim_vals = data[:, layout.time_column]
+    chunked_s, total = best_time(lambda: chunked_sum(path))
+    assert total == float(tim_vals.sum())
+
+    print(f"\n{name}: {len(tim_vals)} samples, {size / 1E6:.0f} MB")
+    print(f"np.loadtxt     {loadtxt_s:7.3f} s  {size / loadtxt_s / 1E6:6.0f} MB/s  "
+          f"peak {peak_memory(lambda: np.loadtxt(path, ndmin=2)):5.0f} MB")
+    print(f"iter_text_log  {chunked_s:7.3f} s  {size / chunked_s / 1E6:6.0f} MB/s  "
+          f"peak {peak_memory(lambda: chunked_sum(path)):5.0f} MB  "
+          f"({loadtxt_s / chunked_s:.1f}x)")
+
+    # One minute in the middle of the log
+    start_time = float(np.median(tim_vals))
+    stop_time = start_time + 60000
+    index_s, _ = best_time(lambda: textlog.build_index(path), repeat=1)
+    range_s, (range_times, _, _) = best_time(
+        lambda: textlog.read_range(path, start_time, stop_time)
+    )
+    assert np.array_equal(
+        range_times, tim_vals[(tim_vals >= start_time) & (tim_vals < stop_time)]
+    )
+    print(f"Building the index: {index_s:.3f} s, then reading 1 minute "
+          f"({len(range_times)} samples): {range_s * 1E3:.1f} ms "
+          f"({loadtxt_s / range_s:.0f}x np.loadtxt of the whole log)")
+
+
+def main():
+    tim_vals, adc_vals = synthetic_log(N_SAMPLES)
+    tq_vals = DA_convert(adc_vals, *CALIBRATION)
+    with tempfile.TemporaryDirectory() as folder:
+        dat_path = os.path.join(folder, "log.dat")
+        np.savetxt(dat_path, np.column_stack((np.arange(N_SAMPLES), tim_vals, adc_vals)))
+        compare(".dat layout", dat_path)
+        save_path = os.path.join(folder, "saved.dat")
+        # Same call as MainWindow.save_data
+        np.savetxt(save_path, np.column_stack((tim_vals, adc_vals, tq_vals)),
+                   fmt=["%i", "%i", "%f"], header="Time(ms)\tADC Count\tTorque (N.cm)",
+                   delimiter="\t")
+        compare("save_data layout", save_path)
+
+
+if __name__ == "__main__":
+    main()
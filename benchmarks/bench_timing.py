@@ -0,0 +1,72 @@
+"""
+Timing repair of a 10^8 sample log (23 days at 20 ms), generated chunk by chunk so
+it never exists in memory at once: a millisecond device clock running 0.06 % slow
+with 0.3 ms of jitter, 1 sample in 10^4 lost and 1 in 10^5 duplicated. Measures
+the throughput of TimingAnalyzer and of the linear and cubic Resampler, the peak
+memory, and the accuracy of the estimated period.
+Run from the repository root:
+    python -m benchmarks.bench_timing
+"""
+import resource
+import time
+
+import numpy as np
+
+from timing import CHUNK_SIZE, TimingAnalyzer, iter_resampled
+
+N_SAMPLES = 10 ** 8
+TRUE_PERIOD = 20.012
+
+
+def chunks(n_samples=N_SAMPLES, chunk_size=CHUNK_SIZE):
+    """
+    Yields (times, ADC values) chunks of the simulated log, the same at every call.
+    """
+    rng = np.random.default_rng(0)
+    for start in range(0, n_samples, chunk_size):
+        index = np.arange(start, min(start + chunk_size, n_samples))
+        times = np.floor(index * TRUE_PERIOD + rng.normal(0, 0.3, len(index)))
+        values = 8388608 + 300000 * np.sin(times / 3000)
+        kept = rng.random(len(index)) > 1E-4
+        duplicated = rng.random(len(index)) < 1E-5
+        repeat = np.where(duplicated, 2, 1)[kept]
+        yield np.repeat(times[kept], repeat), np.repeat(values[kept], repeat)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    start = time.perf_counter()
+    n_input = sum(len(times) for times, _ in chunks())
+    generation = time.perf_counter() - start
+    print(f"{n_input} samples generated in {generation:.1f} s, "
+          f"peak RSS {peak_rss_mb():.0f} MB")
+
+    start = time.perf_counter()
+    analyzer = TimingAnalyzer()
+    for times, _ in chunks():
+        analyzer.update(times)
+    report = analyzer.result()
+    elapsed = time.perf_counter() - start - generation
+    print(f"\nTimingAnalyzer: {n_input / elapsed / 1E6:.0f} M samples/s")
+    print(f"period {report.period:.6f} ms (true {TRUE_PERIOD}), "
+          f"jitter {report.jitter:.2f} ms, {report.missing} missing "
+          f"in {len(report.gap_indices)} gaps, {report.duplicates} duplicates")
+
+    for method in ("linear", "cubic"):
+        start = time.perf_counter()
+        n_output = 0
+        worst = 0.0
+        for grid, values in iter_resampled(chunks(), report.period, method=method):
+            n_output += len(grid)
+            worst = max(worst, float(np.nanmax(np.abs(values - 8388608))))
+        elapsed = time.perf_counter() - start - generation
+        print(f"Resampler {method}: {n_output} points, {n_input / elapsed / 1E6:.0f} M samples/s")
+    print(f"\nPeak RSS {peak_rss_mb():.0f} MB, the arrays of the whole log would take "
+          f"{N_SAMPLES * 16 / 2 ** 20:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Regression benchmarks of the acquisition and post-processing hot paths, run
+without a device: the DLL is replaced by the simulator, with no latency so only
+the Python side is measured.
+Each case is timed several times and its best time is appended, with the commit
+and the machine, to a JSON history. A case slower than the latest result of
+another commit on the same machine by more than --threshold fails the run (exit
+status 1), so the suite can gate a change:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --threshold 0.1 --only da_convert savetxt
+The GUI cases need PyQt5 and are skipped without it, they run headless.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import simulator
+import textlog
+from benchmarks.bench_da_convert import (
+    FULLSCALE_D, FULLSCALE_LOAD_A, OFFSET_D, REVERSE_FULLSCALE_D, make_samples
+)
+from benchmarks.bench_datalog_download import legacy_download
+from conversion import DA_convert
+from datalog import DataLogReader, download_data_log
+
+DEFAULT_HISTORY = os.path.join(os.path.expanduser("~"), ".openfutek", "bench_history.json")
+# Relative slowdown above which a case is a regression
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 5
+CALIBRATION = (OFFSET_D, FULLSCALE_D, REVERSE_FULLSCALE_D, FULLSCALE_LOAD_A)
+# Samples of the data log downloaded from the simulator
+N_LOGGED = 5000
+# Samples of the saved files, about half an hour at 20 ms
+N_SAVED = 10 ** 5
+N_STATUS_UPDATES = 10 ** 4
+SERIAL = "479586"
+
+
+class Skip(Exception):
+    """
+    Raised by the setup of a case that can't run here.
+    """
+
+
+def setup_da_convert():
+    adc = make_samples(10 ** 6)
+    return lambda: DA_convert(adc, *CALIBRATION)
+
+
+def setup_da_convert_out():
+    adc = make_samples(10 ** 6)
+    out = np.empty(len(adc), dtype=np.float32)
+    return lambda: DA_convert(adc, *CALIBRATION, out=out)
+
+
+def _simulated_device():
+    tim_vals, adc_vals = simulator.synthetic_log(N_LOGGED)
+    simulator.clear_devices()
+    simulator.add_device(simulator.SimulatedDevice(SERIAL, tim_vals, adc_vals))
+    dev = simulator.USB_DLL()
+    dev.Open_Device_Connection(SERIAL)
+    return dev, dev.DeviceHandle
+
+
+def setup_download_legacy():
+    dev, handle = _simulated_device()
+    return lambda: legacy_download(dev, handle)
+
+
+def setup_download_blocks():
+    # The default reader, the experimental FastDataLogReader is not measured
+    dev, handle = _simulated_device()
+    return lambda: download_data_log(dev, handle, reader=DataLogReader(dev, handle))
+
+
+def _saved_columns():
+    tim_vals, adc_vals = simulator.synthetic_log(N_SAVED)
+    return np.column_stack((tim_vals, adc_vals, DA_convert(adc_vals, *CALIBRATION)))
+
+
+def _savetxt(stream, cols):
+    # Same call as MainWindow.save_data
+    np.savetxt(stream, cols, fmt=["%i", "%i", "%f"],
+               header="Time(ms)\tADC Count\tTorque (N.cm)", delimiter="\t")
+
+
+def setup_savetxt():
+    cols = _saved_columns()
+    return lambda: _savetxt(io.BytesIO(), cols)
+
+
+def setup_loadtxt():
+    stream = io.BytesIO()
+    _savetxt(stream, _saved_columns())
+    text = stream.getvalue()
+    return lambda: np.loadtxt(io.BytesIO(text))
+
+
+def setup_read_range():
+    # One minute in the middle of a saved file, through its sidecar index
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "log.dat")
+    cols = _saved_columns()
+    with open(path, "wb") as log_file:
+        _savetxt(log_file, cols)
+    textlog.build_index(path)
+    start_time = cols[N_SAVED // 2, 0]
+    return lambda: textlog.read_range(path, start_time, start_time + 60000)
+
+
+def _qt_label():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication, QLabel
+    except ImportError:
+        raise Skip("PyQt5 is not installed")
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    label = QLabel()
+    label.show()
+    return app, label
+
+
+def setup_status_update():
+    # One MainWindow.update_status_txt per sample, as the download used to do
+    app, label = _qt_label()
+
+    def run():
+        for counter in range(N_STATUS_UPDATES):
+            label.setText(f"Sample {counter}")
+        app.processEvents()
+    return run
+
+
+def setup_status_update_repaint():
+    # The same updates, each one painted before the next
+    app, label = _qt_label()
+
+    def run():
+        for counter in range(N_STATUS_UPDATES // 10):
+            label.setText(f"Sample {counter}")
+            app.processEvents()
+    return run
+
+
+# Name: setup returning the function to time
+CASES = {
+    "da_convert": setup_da_convert,
+    "da_convert_out": setup_da_convert_out,
+    "download_legacy": setup_download_legacy,
+    "download_blocks": setup_download_blocks,
+    "savetxt": setup_savetxt,
+    "loadtxt": setup_loadtxt,
+    "read_range": setup_read_range,
+    "status_update": setup_status_update,
+    "status_update_repaint": setup_status_update_repaint,
+}
+
+
+def best_time(func, repeat=DEFAULT_REPEAT):
+    """
+    Shortest of repeat calls to func, in seconds, after a warm-up call.
+    """
+    func()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_cases(names, repeat=DEFAULT_REPEAT):
+    """
+    Returns the best time of each case (s), and the reason each skipped case
+    didn't run.
+    """
+    results = {}
+    skipped = {}
+    for name in names:
+        try:
+            func = CASES[name]()
+        except Skip as reason:
+            skipped[name] = str(reason)
+            continue
+        results[name] = best_time(func, repeat)
+    simulator.clear_devices()
+    return results, skipped
+
+
+def current_commit():
+    """
+    Returns the hash of HEAD, with a "+" if the tree has uncommitted changes, or
+    None outside a git checkout.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True,
+            check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + "+" if dirty else commit
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as history_file:
+        return json.load(history_file)
+
+
+def save_history(path, history):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Replaced at once, so an interrupted run doesn't lose the history
+    temporary = path + ".tmp"
+    with open(temporary, "w") as history_file:
+        json.dump(history, history_file, indent=1)
+    os.replace(temporary, path)
+
+
+def baseline(history, machine, commit, name):
+    """
+    Latest entry of the history with a result for name, measured on machine at
+    another commit, or None.
+    """
+    for entry in reversed(history):
+        if (entry["machine"] == machine and entry["commit"] != commit
+                and name in entry["results"]):
+            return entry
+    return None
+
+
+def find_regressions(results, history, machine, commit, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares the results with the baseline of each case.
+    Returns rows of (name, time, baseline time, baseline commit, regressed), the
+    baseline is None for the cases measured for the first time.
+    """
+    rows = []
+    for name, seconds in results.items():
+        entry = baseline(history, machine, commit, name)
+        if entry is None:
+            rows.append((name, seconds, None, None, False))
+            continue
+        reference = entry["results"][name]
+        rows.append((name, seconds, reference, entry["commit"],
+                     seconds > reference * (1 + threshold)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), default=list(CASES),
+                        help="cases to run, all by default")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown that fails the run (0.25: 25%%)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true",
+                        help="compares without adding the results to the history")
+    args = parser.parse_args()
+
+    machine = platform.node()
+    commit = current_commit()
+    history = load_history(args.history)
+    results, skipped = run_cases(args.only, args.repeat)
+    rows = find_regressions(results, history, machine, commit, args.threshold)
+
+    print(f"Commit {commit}, machine {machine}, threshold {args.threshold:.0%}")
+    print(f"{'case':24s} {'time (ms)':>10s} {'baseline':>10s} {'change':>8s}")
+    for name, seconds, reference, reference_commit, regressed in rows:
+        if reference is None:
+            print(f"{name:24s} {seconds * 1E3:10.3f} {'-':>10s} {'new':>8s}")
+            continue
+        print(f"{name:24s} {seconds * 1E3:10.3f} {reference * 1E3:10.3f} "
+              f"{seconds / reference - 1:+8.1%}"
+              f"{'  REGRESSION vs ' + reference_commit[:10] if regressed else ''}")
+    for name, reason in skipped.items():
+        print(f"{name:24s} skipped: {reason}")
+
+    if not args.no_save:
+        history.append({
+            "commit": commit,
+            "machine": machine,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "results": results,
+        })
+        save_history(args.history, history)
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
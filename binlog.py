@@ -0,0 +1,195 @@
+"""
+Compact binary log format, an alternative to the tab-separated text written by
+save_data.
+A file is a 64-byte header followed by three columns stored one after the other:
+    time    uint32  elapsed time in ms
+    adc     int32   ADC count
+    torque  float32 converted value
+The header carries the calibration registers needed to convert the ADC counts
+again, so the file is self-contained. Readers map the columns with np.memmap, so
+opening a log copies nothing until the values are actually used.
+"""
+import numpy as np
+
+from conversion import DA_convert
+
+MAGIC = b"OFTKBLOG"
+VERSION = 1
+# Extension used by save_data to choose the binary format
+EXTENSION = ".tqb"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u2"),
+    ("header_size", "<u2"),
+    ("sampling_period", "<f4"),  # ms
+    ("n_samples", "<u8"),
+    ("offset_d", "<i4"),
+    ("fullscale_d", "<i4"),
+    ("reverse_fullscale_d", "<i4"),
+    ("reserved", "<u4"),
+    ("fullscale_load_a", "<f8"),
+    ("serial", "S16"),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+COLUMNS = (("time", np.dtype("<u4")), ("adc", np.dtype("<i4")), ("torque", np.dtype("<f4")))
+
+
+class BinLog:
+    """
+    Binary log opened by read_binlog. The time, adc and torque attributes are
+    read-only memory-mapped arrays, calibration is a dict of the header fields.
+    """
+    def __init__(self, filename, header, time, adc, torque):
+        self.filename = filename
+        self.header = header
+        self.time = time
+        self.adc = adc
+        self.torque = torque
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def calibration(self):
+        """
+        Calibration registers, as keyword arguments of DA_convert.
+        """
+        return {
+            "offset_d": self.header["offset_d"],
+            "fullscale_d": self.header["fullscale_d"],
+            "reverse_fullscale_d": self.header["reverse_fullscale_d"],
+            "fullscale_load_a": self.header["fullscale_load_a"],
+        }
+
+
+def write_binlog(
+    filename, tim_vals, adc_vals, tq_vals=None, offset_d=0, fullscale_d=0,
+    reverse_fullscale_d=0, fullscale_load_a=0.0, serial="", sampling_period=None
+):
+    """
+    Writes a binary log.
+    tq_vals is computed with DA_convert from the calibration registers if None.
+    sampling_period (ms) is estimated from the median time interval if None.
+    """
+    tim_vals = np.asarray(tim_vals)
+    adc_vals = np.asarray(adc_vals)
+    n_samples = len(tim_vals)
+    if len(adc_vals) != n_samples:
+        raise ValueError("The time and ADC columns must have the same length.")
+    if tq_vals is None:
+        tq_vals = DA_convert(
+            adc_vals, offset_d, fullscale_d, reverse_fullscale_d, fullscale_load_a,
+            dtype=np.float32
+        )
+    if sampling_period is None:
+        sampling_period = float(np.median(np.diff(tim_vals))) if n_samples > 1 else 0.0
+
+    header = np.zeros((), dtype=HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["header_size"] = HEADER_SIZE
+    header["sampling_period"] = sampling_period
+    header["n_samples"] = n_samples
+    header["offset_d"] = offset_d
+    header["fullscale_d"] = fullscale_d
+    header["reverse_fullscale_d"] = reverse_fullscale_d
+    header["fullscale_load_a"] = fullscale_load_a
+    header["serial"] = str(serial).encode("ascii")[:16]
+
+    with open(filename, "wb") as log_file:
+        log_file.write(header.tobytes())
+        for (name, dtype), values in zip(COLUMNS, (tim_vals, adc_vals, tq_vals)):
+            log_file.write(np.asarray(values, dtype=dtype).tobytes())
+
+
+def read_header(filename):
+    """
+    Returns the header of a binary log as a dict.
+    """
+    raw = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)
+    if len(raw) != 1 or raw["magic"][0] != MAGIC:
+        raise ValueError(f"{filename} is not a binary torque log.")
+    if raw["version"][0] > VERSION:
+        raise ValueError(f"{filename} has an unsupported version {raw['version'][0]}.")
+    header = {name: raw[name][0].item() for name in HEADER_DTYPE.names}
+    header["serial"] = header["serial"].decode("ascii")
+    return header
+
+
+def read_binlog(filename):
+    """
+    Opens a binary log without copying its columns into memory.
+    """
+    header = read_header(filename)
+    n_samples = header["n_samples"]
+    columns = {}
+    offset = header["header_size"]
+    for name, dtype in COLUMNS:
+        if n_samples:
+            columns[name] = np.memmap(
+                filename, dtype=dtype, mode="r", offset=offset, shape=(n_samples,)
+            )
+        else:
+            # np.memmap can't map an empty region
+            columns[name] = np.empty(0, dtype=dtype)
+        offset += n_samples * dtype.itemsize
+    return BinLog(filename, header, columns["time"], columns["adc"], columns["torque"])
+
+
+def read_text_log(filename):
+    """
+    Reads a text log. Files with a "#" header were written by save_data (time,
+    ADC, torque), the others are the index, time, ADC .dat files.
+    Returns the time, ADC and torque arrays, torque is None if the file has none.
+    """
+    with open(filename) as log_file:
+        has_header = log_file.readline().startswith("#")
+    data = np.loadtxt(filename, ndmin=2)
+    if has_header:
+        return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2]
+    return data[:, 1].astype(np.int64), data[:, 2].astype(np.int64), None
+
+
+def convert_text_log(src, dst, **calibration):
+    """
+    Converts a text log (.dat or save_data output) to a binary log.
+    calibration: keyword arguments of write_binlog (offset_d, fullscale_d, ...).
+    The torque column of the text file is kept if it has one. Otherwise it is
+    computed from the calibration registers, or set to NaN if they are not given.
+    """
+    tim_vals, adc_vals, tq_vals = read_text_log(src)
+    if tq_vals is None and not calibration.get("fullscale_load_a"):
+        tq_vals = np.full(len(tim_vals), np.nan, dtype=np.float32)
+    write_binlog(dst, tim_vals, adc_vals, tq_vals, **calibration)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Converts text logs to binary logs.")
+    parser.add_argument("files", nargs="+", help=".dat or save_data text logs")
+    parser.add_argument("--offset", type=int, help="register 0x02")
+    parser.add_argument("--fullscale", type=int, help="register 0x03")
+    parser.add_argument("--reverse-fullscale", type=int, help="register 0x04")
+    parser.add_argument("--fullscale-load", type=float, help="register 0x05, with decimals")
+    parser.add_argument("--serial", default="")
+    args = parser.parse_args()
+    registers = (args.offset, args.fullscale, args.reverse_fullscale, args.fullscale_load)
+    if any(register is not None for register in registers) \
+            and any(register is None for register in registers):
+        parser.error("--offset, --fullscale, --reverse-fullscale and --fullscale-load "
+                     "must be given together.")
+
+    calibration = {"serial": args.serial}
+    if args.fullscale_load is not None:
+        calibration.update(
+            offset_d=args.offset, fullscale_d=args.fullscale,
+            reverse_fullscale_d=args.reverse_fullscale,
+            fullscale_load_a=args.fullscale_load,
+        )
+    for src in args.files:
+        dst = os.path.splitext(src)[0] + EXTENSION
+        convert_text_log(src, dst, **calibration)
+        print(f"{src} -> {dst}")
@@ -0,0 +1,206 @@
+"""
+Cache of the calibration registers of each sensor.
+Reading the calibration costs one USB round trip per register. The cache keeps it
+on disk, keyed by the device serial number and the sensor identification number,
+so reconnecting to a known sensor reads no register at all. An entry is only
+trusted while the calibration date stored in the device is unchanged, which is
+checked once per connection.
+"""
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+
+from conversion import DA_convert
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".openfutek", "calibration_cache.json")
+
+
+@dataclass
+class Calibration:
+    """
+    Calibration of one sensor, with the registers used by DA_convert.
+    """
+    serial: str
+    sensor_id: str
+    calibration_date: str  # "YYYY-MM-DD", as read from the device
+    offset_d: int
+    fullscale_d: int
+    reverse_fullscale_d: int
+    fullscale_load_a: float
+    unit_code: str
+    decimal_point: str
+
+    @property
+    def registers(self):
+        """
+        Calibration registers, as keyword arguments of DA_convert and write_binlog.
+        """
+        return {
+            "offset_d": self.offset_d,
+            "fullscale_d": self.fullscale_d,
+            "reverse_fullscale_d": self.reverse_fullscale_d,
+            "fullscale_load_a": self.fullscale_load_a,
+        }
+
+    def convert(self, adc_vals, **kwargs):
+        """
+        Converts ADC values with DA_convert. kwargs: out and dtype.
+        """
+        return DA_convert(adc_vals, **self.registers, **kwargs)
+
+
+def read_identity(dev, handle, channel=2):
+    """
+    Reads the sensor identification number and the calibration date, the values
+    that tell whether a cached calibration is still valid.
+    Raises ValueError if one of them can't be read.
+    """
+    sensor_id = dev.Get_Sensor_Identification_Number(handle, channel)
+    if sensor_id == "Error":
+        raise ValueError("Unable to read the sensor identification number.")
+    day = int(dev.Get_Calibration_Day(handle, channel))
+    month = int(dev.Get_Calibration_Month(handle, channel))
+    year = int(dev.Get_Calibration_Year(handle, channel))
+    return str(sensor_id), f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def read_calibration(dev, handle, serial, sensor_id, calibration_date, channel=2):
+    """
+    Reads the calibration registers from the device. Raises ValueError if one of
+    them can't be read, so that a failed read is never cached.
+    """
+    # These values may be obtained directly from these functions or from the
+    # Get_Internal_Register function
+    offset_d = int(dev.Get_Internal_Register(handle, 0x02))
+    fullscale_d = int(dev.Get_Internal_Register(handle, 0x03))
+    # There is no function to get the fullscale offset value directly
+    reverse_fullscale_d = int(dev.Get_Internal_Register(handle, 0x04))
+    # This value comes without the decimal point
+    fullscale_load_a = float(dev.Get_Internal_Register(handle, 0x05)) * 1E-3
+    return Calibration(
+        serial=str(serial),
+        sensor_id=sensor_id,
+        calibration_date=calibration_date,
+        offset_d=offset_d,
+        fullscale_d=fullscale_d,
+        reverse_fullscale_d=reverse_fullscale_d,
+        fullscale_load_a=fullscale_load_a,
+        unit_code=_read_code(dev.Get_Unit_Code(handle, channel)),
+        decimal_point=_read_code(dev.Get_Decimal_Point(handle, channel)),
+    )
+
+
+def _read_code(response):
+    """
+    Returns the integer code answered by Get_Unit_Code or Get_Decimal_Point as a
+    string. Raises ValueError if the command failed ("Error").
+    """
+    return str(int(response))
+
+
+def _valid(calibration):
+    """
+    False for the entries with a failed unit code or decimal point, which older
+    versions of the cache stored.
+    """
+    try:
+        _read_code(calibration.unit_code)
+        _read_code(calibration.decimal_point)
+    except ValueError:
+        return False
+    return True
+
+
+class CalibrationCache:
+    """
+    Calibrations indexed by serial number and sensor identification number,
+    persisted as JSON. Can be shared by several threads.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        path: JSON file of the cache, None keeps the cache in memory only.
+        """
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def key(serial, sensor_id):
+        return f"{serial}:{sensor_id}"
+
+    def get(self, dev, handle, serial, channel=2):
+        """
+        Returns the calibration of the connected sensor. The registers are only
+        read from the device if the sensor is unknown or its calibration date
+        changed since it was cached.
+        """
+        sensor_id, calibration_date = read_identity(dev, handle, channel)
+        key = self.key(serial, sensor_id)
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and cached.calibration_date == calibration_date:
+            return cached
+        calibration = read_calibration(
+            dev, handle, serial, sensor_id, calibration_date, channel
+        )
+        with self._lock:
+            self._entries[key] = calibration
+        self.save()
+        return calibration
+
+    def find(self, serial):
+        """
+        Returns the cached calibration of serial with the latest calibration
+        date, without reading the device, or None if serial is unknown.
+        """
+        prefix = f"{serial}:"
+        with self._lock:
+            matches = [entry for key, entry in self._entries.items() if key.startswith(prefix)]
+        return max(matches, key=lambda entry: entry.calibration_date, default=None)
+
+    def invalidate(self, serial=None):
+        """
+        Drops the entries of a serial number, or all of them if serial is None.
+        """
+        with self._lock:
+            if serial is None:
+                self._entries.clear()
+            else:
+                prefix = f"{serial}:"
+                for key in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[key]
+        self.save()
+
+    def load(self):
+        """
+        Reads the cache file. A missing or corrupted file gives an empty cache.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+            loaded = {key: Calibration(**entry) for key, entry in entries.items()}
+        except (OSError, ValueError, TypeError):
+            return
+        loaded = {key: entry for key, entry in loaded.items() if _valid(entry)}
+        with self._lock:
+            self._entries = loaded
+
+    def save(self):
+        """
+        Writes the cache file, replacing it atomically.
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            entries = {key: asdict(entry) for key, entry in self._entries.items()}
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(entries, cache_file, indent=1)
+        os.replace(temp_path, self.path)
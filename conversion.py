@@ -0,0 +1,166 @@
+"""
+Conversion of the ADC counts read from the IHH500 into calibrated load values.
+Every function here works on whole NumPy arrays at once, so converting a long log
+is a handful of vectorized passes instead of a Python loop over the samples.
+"""
+import numpy as np
+
+# Number of samples converted per pass. Working on blocks
+# keeps the temporary arrays small enough to stay in the CPU cache.
+CHUNK_SIZE = 1 << 16
+
+
+def DA_convert(
+    track_d_val, offset_d, fullscale_d, reverse_fullscale_d, fullscale_load_a,
+    out=None, dtype=np.float64
+):
+    """
+    Converts a digital value (or array) to a float value.
+    variables with _d are digital, integer in the ADC range (16-bit usually)
+    variables with _a are analog, float.
+    Inputs:
+    track_d_val: Measurement, named "Tracking ADC Value" by FUTEK's software.
+                 Corresponds to the measured ADC value, integer.
+    offset_d: Offset of the ADC circuit, corresponds to the zero of analog range.
+    fullscale_d: ADC value corresponding to fullscale_load_a
+    reverse_fullscale_d: ADC value corresponding to a negative fullscale_load_a
+    fullscale_load_a: Calibrated limit of the measurement scale.
+    out: Optional preallocated array that receives the result. Must have the same
+         shape as track_d_val, and be contiguous if it has several dimensions.
+    dtype: np.float32 or np.float64, used when out is not given.
+
+    Output: Converted analog value in the same units as fullscale_load_a.
+
+    The conversion formula is:
+    output = fullscale_load_a * (track_d_val-offset_d) / (fs-offset_d)
+    where:
+        fs = fullscale_d if track_d_val-offset > 0
+        fs = reverse_fullscale_d if track_d_val-offset < 0
+
+    """
+    track_d_val = np.asarray(track_d_val)
+    if out is None:
+        out = np.empty(track_d_val.shape, dtype=dtype)
+    else:
+        _check_out(out, track_d_val.shape)
+    # The two slopes are computed once, so each sample costs a subtraction and a
+    # multiplication instead of a division. Splitting the value as
+    # val * scale_neg + max(val, 0) * (scale_pos - scale_neg)
+    # picks the right slope for each sample without any branch.
+    scale_pos = fullscale_load_a / (fullscale_d - offset_d)
+    scale_neg = fullscale_load_a / (offset_d - reverse_fullscale_d)
+    scale_diff = scale_pos - scale_neg
+
+    flat_in = track_d_val.reshape(-1)
+    flat_out = out.reshape(-1)
+    scratch = np.empty(min(CHUNK_SIZE, flat_in.size), dtype=out.dtype)
+    for start in range(0, flat_in.size, CHUNK_SIZE):
+        dest = flat_out[start:start + CHUNK_SIZE]
+        positive = scratch[:dest.size]
+        np.subtract(flat_in[start:start + CHUNK_SIZE], offset_d, out=dest,
+                    casting="unsafe")
+        np.maximum(dest, 0, out=positive)
+        dest *= scale_neg
+        positive *= scale_diff
+        dest += positive
+    return out
+
+
+def loading_point_convert(track_d_val, points_d, loads_a, out=None, dtype=np.float64):
+    """
+    Converts ADC values to load using the multi-point calibration stored in the
+    device (see "Calibration Overview.pdf").
+    Inputs:
+    track_d_val: Measured ADC values, integer.
+    points_d: ADC value of each loading point (Get_Loading_Point).
+    loads_a: Load applied at each loading point (Get_Load_of_Loading_Point).
+    out: Optional preallocated array that receives the result, contiguous if it
+         has several dimensions.
+    dtype: np.float32 or np.float64, used when out is not given.
+
+    Output: Load interpolated linearly between the two nearest loading points.
+    Values beyond the first or last point are extrapolated with the slope of the
+    closest segment, like the fullscale/reverse fullscale conversion does.
+    """
+    track_d_val = np.asarray(track_d_val)
+    points_d, loads_a = _sorted_points(points_d, loads_a)
+    if out is None:
+        out = np.empty(track_d_val.shape, dtype=dtype)
+    else:
+        _check_out(out, track_d_val.shape)
+
+    # Slope and intercept of every segment, indexed by the lower loading point
+    slopes = np.diff(loads_a) / np.diff(points_d)
+    intercepts = loads_a[:-1] - slopes * points_d[:-1]
+    # Inner breakpoints only, so searchsorted gives the segment index directly
+    inner = points_d[1:-1]
+
+    flat_in = track_d_val.reshape(-1)
+    flat_out = out.reshape(-1)
+    for start in range(0, flat_in.size, CHUNK_SIZE):
+        block = flat_in[start:start + CHUNK_SIZE]
+        segment = np.searchsorted(inner, block, side="right")
+        dest = flat_out[start:start + CHUNK_SIZE]
+        np.multiply(block, slopes[segment], out=dest, casting="unsafe")
+        dest += intercepts[segment]
+    return out
+
+
+def read_loading_points(dev, handle, channel=2, load_scale=1E-3):
+    """
+    Reads the multi-point calibration from the device.
+    The loads come without the decimal point, like the fullscale load register,
+    so they are multiplied by load_scale.
+    Returns two arrays: the ADC value and the load of each loading point.
+    """
+    n_points = int(dev.Get_Number_of_Loading_Points(handle, channel))
+    points_d = np.empty(n_points, dtype=np.float64)
+    loads_a = np.empty(n_points, dtype=np.float64)
+    for point in range(n_points):
+        points_d[point] = int(dev.Get_Loading_Point(handle, point, channel))
+        loads_a[point] = float(dev.Get_Load_of_Loading_Point(handle, point, channel))
+    return points_d, loads_a * load_scale
+
+
+def _check_out(out, shape):
+    """
+    Raises ValueError if out can't receive the result in place: flattening a
+    non-contiguous array of several dimensions makes a copy, which would be
+    filled instead of out. A strided 1D array, e.g. a field of a structured
+    array, flattens to a view.
+    """
+    if out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+    if out.ndim > 1 and not out.flags.c_contiguous:
+        raise ValueError("out must be C-contiguous")
+
+
+def _sorted_points(points_d, loads_a):
+    """
+    Sorts the loading points by ADC value and drops repeated ADC values (the zero
+    point is stored once for each loading direction).
+    """
+    points_d = np.asarray(points_d, dtype=np.float64)
+    loads_a = np.asarray(loads_a, dtype=np.float64)
+    points_d, unique_idx = np.unique(points_d, return_index=True)
+    loads_a = loads_a[unique_idx]
+    if points_d.size < 2:
+        raise ValueError("At least two distinct loading points are required.")
+    return points_d, loads_a
+
+
+def _DA_convert_loop(
+    track_d_val, offset_d, fullscale_d, reverse_fullscale_d, fullscale_load_a
+):
+    """
+    Sample-by-sample conversion used before DA_convert was vectorized. Kept as the
+    reference for the benchmark.
+    """
+    output = np.zeros(len(track_d_val), dtype=np.float64)
+    track_d = fullscale_load_a * (np.asarray(track_d_val, dtype=np.float64) - offset_d)
+    for i, val in enumerate(track_d):
+        if val > 0:
+            output[i] = val / (fullscale_d - offset_d)
+        else:
+            output[i] = val / (offset_d - reverse_fullscale_d)
+    return output
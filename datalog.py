@@ -0,0 +1,367 @@
+"""
+Download of the data logged in the memory of the IHH500.
+The samples are read in blocks into preallocated NumPy arrays. Two readers are
+available:
+    DataLogReader: one Get_Data_Logging round trip per sample, works on every
+        device that supports data logging. It is the reader used by default.
+    FastDataLogReader: experimental, uses the FastDataLogging properties of the
+        DLL, where each transfer returns a page of samples. These page semantics
+        come from the simulator and have not been verified on hardware.
+open_reader only tries the fast reader when asked to, or when the
+OPENFUTEK_FAST_LOGGING environment variable is set to 1, and falls back to
+DataLogReader unless the device reports its logged samples through
+FastDataLoggingNumberOfSamples and a first page reads as arrays. With
+DataLogReader the log length is found with probe_log_length before the download,
+in O(log n) round trips.
+A download can start in the middle of the log (see logstore.sync_data_log, which
+only fetches the samples logged since the previous download).
+"""
+import os
+import time
+
+import numpy as np
+
+# Opt-in to the experimental FastDataLogReader, see open_reader
+FAST_LOGGING = os.environ.get("OPENFUTEK_FAST_LOGGING") == "1"
+
+# Time interval tolerance used to detect the end of the log: a sample is valid if
+# its time interval is within t_delta_base / VALID_MARGIN and t_delta_base * VALID_MARGIN
+VALID_MARGIN = 1.5
+# DeviceStatus codes meaning that the device no longer answers: Invalid Handle,
+# Device Not Found, Device Not Opened and IO Error
+LINK_ERROR_STATUSES = (1, 2, 3, 4)
+
+
+class DataLogError(Exception):
+    """
+    Raised when the data log cannot be read from the device.
+    """
+
+
+class DataLogCancelled(DataLogError):
+    """
+    Raised when a download is cancelled before the end of the log.
+    """
+
+
+class DataLogConnectionError(DataLogError):
+    """
+    Raised when the device stops answering in the middle of a download.
+    """
+
+
+class DataLogReader:
+    """
+    Reads the data log one sample at a time with Get_Data_Logging.
+    """
+    # The log length is probed before reading, a block is the number of samples
+    # between two progress updates, cancel checks and sink calls
+    block_size = 64
+
+    def __init__(self, dev, handle):
+        self.dev = dev
+        self.handle = handle
+
+    def n_samples(self):
+        """
+        Number of logged samples, None because the device does not report it.
+        """
+        return None
+
+    def read_block(self, start, tim_out, adc_out):
+        """
+        Reads len(tim_out) samples starting at the index start into tim_out and
+        adc_out. Returns the number of samples read.
+        """
+        # Attribute lookups are hoisted out of the loop, the USB round trip is the
+        # only cost left per sample
+        dev = self.dev
+        handle = self.handle
+        get_data_logging = dev.Get_Data_Logging
+        for i in range(len(tim_out)):
+            if get_data_logging(handle, start + i) == "Error":
+                return i
+            adc_out[i] = dev.DataLogging_Value1
+            tim_out[i] = dev.DataLogging_Value2
+        return len(tim_out)
+
+
+class FastDataLogReader:
+    """
+    Experimental: reads the data log in pages through the FastDataLogging
+    properties, as the simulator implements them. Setting FastDataLoggingCounter selects the first sample of a page, which is
+    then available in FastDataLoggingADCValue (ADC counts) and
+    FastDataLoggingDateAndTime (elapsed ms).
+    """
+    block_size = 4096
+
+    def __init__(self, dev, handle):
+        self.dev = dev
+        self.handle = handle
+
+    def n_samples(self):
+        """
+        Number of logged samples reported by the device.
+        """
+        return int(self.dev.FastDataLoggingNumberOfSamples)
+
+    def read_block(self, start, tim_out, adc_out):
+        """
+        Reads up to len(tim_out) samples starting at the index start into tim_out
+        and adc_out. Returns the number of samples read.
+        """
+        dev = self.dev
+        count = 0
+        while count < len(tim_out):
+            dev.FastDataLoggingCounter = start + count
+            if dev.DeviceStatus != 0:
+                break
+            adc_page = np.fromiter(dev.FastDataLoggingADCValue, dtype=np.int64)
+            tim_page = np.fromiter(dev.FastDataLoggingDateAndTime, dtype=np.int64)
+            n_page = min(len(adc_page), len(tim_out) - count)
+            if n_page == 0:
+                break
+            adc_out[count:count + n_page] = adc_page[:n_page]
+            tim_out[count:count + n_page] = tim_page[:n_page]
+            count += n_page
+        return count
+
+    def check(self):
+        """
+        Reads the first page of the log and returns True if both properties hold
+        arrays of the same, non-zero length. A device exposing them as scalars
+        makes np.fromiter raise TypeError, which returns False.
+        """
+        try:
+            self.dev.FastDataLoggingCounter = 0
+            if self.dev.DeviceStatus != 0:
+                return False
+            adc_page = np.fromiter(self.dev.FastDataLoggingADCValue, dtype=np.int64)
+            tim_page = np.fromiter(self.dev.FastDataLoggingDateAndTime, dtype=np.int64)
+        except (AttributeError, TypeError, ValueError):
+            return False
+        return 0 < len(adc_page) == len(tim_page)
+
+
+def open_reader(dev, handle, fast=None):
+    """
+    Returns the Get_Data_Logging reader, or with fast the experimental fast reader
+    if the device reports logged samples and its first page reads back as arrays.
+    fast: Tries the fast reader, FAST_LOGGING if None.
+    """
+    if fast is None:
+        fast = FAST_LOGGING
+    if not fast:
+        return DataLogReader(dev, handle)
+    try:
+        if int(dev.FastDataLoggingNumberOfSamples) > 0:
+            reader = FastDataLogReader(dev, handle)
+            if reader.check():
+                return reader
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return DataLogReader(dev, handle)
+
+
+def read_sampling_period(dev, handle):
+    """
+    Reads the first two samples of the log and returns the time interval between
+    them, in ms. Raises DataLogError if it can't be obtained or is not positive.
+    """
+    try:
+        # Selects the sample to be read
+        dev.Get_Data_Logging(handle, 0)
+        # Reads the sample
+        time_sample_1 = dev.DataLogging_Value2
+        dev.Get_Data_Logging(handle, 1)
+        time_sample_2 = dev.DataLogging_Value2
+    except Exception as error:
+        raise DataLogError("Couldn't obtain data to calculate sampling period.") from error
+    t_delta_base = time_sample_2 - time_sample_1
+    if t_delta_base <= 0:
+        raise DataLogError(f"Invalid sampling period: {t_delta_base} ms.")
+    return t_delta_base
+
+
+def valid_length(tim_vals, t_delta_base, previous_t=None, valid_margin=VALID_MARGIN):
+    """
+    Returns the number of leading samples of tim_vals whose time interval is
+    consistent with t_delta_base. previous_t is the time of the sample before
+    tim_vals[0], if there is one.
+    """
+    if len(tim_vals) == 0:
+        return 0
+    if previous_t is None:
+        deltas = np.diff(tim_vals)
+        first = 1
+    else:
+        deltas = np.diff(tim_vals, prepend=previous_t)
+        first = 0
+    invalid = (deltas > t_delta_base * valid_margin) | (deltas < t_delta_base / valid_margin)
+    bad = np.flatnonzero(invalid)
+    if bad.size == 0:
+        return len(tim_vals)
+    return int(bad[0]) + first
+
+
+def probe_log_length(dev, handle, t_delta_base=None, start=0, valid_margin=VALID_MARGIN):
+    """
+    Finds the number of samples of the log in O(log n) Get_Data_Logging round
+    trips, with an exponential search for an index past the end of the log
+    followed by a binary search of the end.
+    A sample is in the log if its interval from the previous sample is within
+    valid_margin of t_delta_base, and if its time is consistent with the mean
+    interval of the log from the last sample known to be in it. Stale samples of
+    older recordings, zeros and wrapped-around samples beyond the end fail the
+    second check, unless they continue the log with the same time base, in which
+    case they can't be told apart from it.
+    Inputs:
+    dev, handle: USB_DLL instance and the handle of the open device.
+    t_delta_base: Sampling period in ms, read from the first two samples if None.
+    start: Number of leading samples already known to be in the log.
+    Output: Number of samples of the log, at least max(start, 2).
+    """
+    if t_delta_base is None:
+        t_delta_base = read_sampling_period(dev, handle)
+    tim_0 = _read_time(dev, handle, 0)
+    # Last index known to be in the log, the first two samples being the ones
+    # t_delta_base was measured on
+    last = max(start - 1, 1)
+    tim_last = _read_time(dev, handle, last)
+
+    def in_log(index):
+        """
+        Returns the time of the sample at index if it is in the log, else None.
+        """
+        tim = _read_time(dev, handle, index)
+        if tim is None:
+            return None
+        n_intervals = index - last
+        mean_interval = (tim_last - tim_0) / last
+        advance = tim - tim_last
+        if not (mean_interval * n_intervals / valid_margin <= advance
+                <= mean_interval * n_intervals * valid_margin):
+            return None
+        if n_intervals > 1:
+            delta_t = tim - _read_time(dev, handle, index - 1)
+            if not t_delta_base / valid_margin <= delta_t <= t_delta_base * valid_margin:
+                return None
+        return tim
+
+    # Exponential search: doubles the step until an index is past the end
+    step = 1
+    while True:
+        tim = in_log(last + step)
+        if tim is None:
+            end = last + step
+            break
+        last += step
+        tim_last = tim
+        step *= 2
+    # Binary search between the last sample in the log and the first one past it
+    while end - last > 1:
+        middle = (last + end) // 2
+        tim = in_log(middle)
+        if tim is None:
+            end = middle
+        else:
+            last = middle
+            tim_last = tim
+    return last + 1
+
+
+def _read_time(dev, handle, index):
+    """
+    Returns the time of the sample at index, None if it can't be read.
+    Raises DataLogConnectionError if the device stops answering.
+    """
+    if dev.Get_Data_Logging(handle, index) == "Error":
+        if dev.DeviceStatus in LINK_ERROR_STATUSES:
+            raise DataLogConnectionError(
+                f"Connection lost while reading sample {index} "
+                f"(status {dev.DeviceStatus})."
+            )
+        return None
+    return dev.DataLogging_Value2
+
+
+def download_data_log(
+    dev, handle, reader=None, block_size=None, progress=None,
+    valid_margin=VALID_MARGIN, cancel=None, start=0, previous_t=None,
+    t_delta_base=None, sink=None
+):
+    """
+    Downloads the data log of the device, from the sample start to the end.
+    Inputs:
+    dev, handle: USB_DLL instance and the handle of the open device.
+    reader: Reader used to fetch the samples, chosen by open_reader if None.
+    block_size: Number of samples requested at a time, reader.block_size if None.
+    progress: Optional callable progress(samples, total, samples_per_second),
+              called after every block. samples and total count from the start of
+              the log.
+    valid_margin: Time interval tolerance used to detect the end of the log.
+    cancel: Optional threading.Event (or any object with is_set). The download
+            stops with DataLogCancelled after the block in which it is set.
+    start: Index of the first sample to read.
+    previous_t: Time of the sample before start, if it is known, so that the
+                interval of the first sample read is checked as well.
+    t_delta_base: Sampling period in ms, read from the first two samples of the
+                  log if None.
+    sink: Optional callable sink(tim_block, adc_block), called with the valid
+          samples of every block as soon as they are read.
+
+    Output: Two int64 arrays, the elapsed time (ms) and the ADC value of each sample.
+    Raises DataLogConnectionError if the device stops answering, the samples read
+    until then have been passed to sink.
+    """
+    if reader is None:
+        reader = open_reader(dev, handle)
+    if block_size is None:
+        block_size = reader.block_size
+    if t_delta_base is None:
+        t_delta_base = read_sampling_period(dev, handle)
+    total = reader.n_samples()
+    # Devices that don't report the log length have it probed, the samples read
+    # are still checked in case the probe was fooled by a stale tail
+    validate = total is None
+    if validate:
+        total = probe_log_length(dev, handle, t_delta_base, start, valid_margin)
+    remaining = max(total - start, 0)
+
+    # Preallocated storage
+    tim_vals = np.empty(remaining, dtype=np.int64)
+    adc_vals = np.empty(remaining, dtype=np.int64)
+    count = 0
+    start_time = time.perf_counter()
+    while count < remaining:
+        if cancel is not None and cancel.is_set():
+            raise DataLogCancelled(f"Download cancelled after {start + count} samples.")
+        n_block = min(block_size, remaining - count)
+        tim_block = tim_vals[count:count + n_block]
+        adc_block = adc_vals[count:count + n_block]
+        n_read = reader.read_block(start + count, tim_block, adc_block)
+        if validate:
+            # The end of the log is the first sample with an inconsistent interval
+            block_previous_t = tim_vals[count - 1] if count else previous_t
+            n_valid = valid_length(
+                tim_block[:n_read], t_delta_base, block_previous_t, valid_margin
+            )
+        else:
+            n_valid = n_read
+        if sink is not None and n_valid:
+            sink(tim_block[:n_valid], adc_block[:n_valid])
+        count += n_valid
+        if progress is not None:
+            elapsed = time.perf_counter() - start_time
+            progress(start + count, total, count / elapsed if elapsed > 0 else 0.0)
+        # A block cut short by a failed request, not by the end of the log
+        if n_valid == n_read < n_block and dev.DeviceStatus in LINK_ERROR_STATUSES:
+            raise DataLogConnectionError(
+                f"Connection lost after {start + count} samples "
+                f"(status {dev.DeviceStatus})."
+            )
+        if n_valid < n_block:
+            break
+    if count == remaining:
+        return tim_vals, adc_vals
+    return tim_vals[:count].copy(), adc_vals[:count].copy()
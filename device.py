@@ -0,0 +1,154 @@
+"""
+Hardware abstraction layer.
+The GUI and the CLI only use the USB_DLL methods listed in DeviceBackend, so any
+class implementing them can replace FUTEK_USB_DLL.USB_DLL. Two backends exist:
+    "futek": the FUTEK .NET DLL loaded through pythonnet (Windows only).
+    "sim": the pure-Python simulator in simulator.py.
+The backend is chosen with the OPENFUTEK_BACKEND environment variable, "futek" by
+default. Loading the "futek" backend starts the .NET runtime, so the applications
+only do it when they first connect, through get_usb_dll.
+"""
+import os
+
+BACKENDS = ("futek", "sim")
+DEFAULT_BACKEND = os.environ.get("OPENFUTEK_BACKEND", "futek")
+
+# USB_DLL classes of the backends loaded so far
+_loaded = {}
+
+
+class DeviceBackend:
+    """
+    Methods and properties of USB_DLL used by this project. The Get commands
+    return strings ("Error" on failure) and every command updates DeviceStatus,
+    whose codes are listed in session.STATUS_MESSAGES.
+    This class only documents the interface, FUTEK's USB_DLL implements it
+    without inheriting from it.
+    """
+    # Properties
+    DeviceHandle = 0
+    DeviceStatus = 0
+    DataLogging_Counter = 0
+    DataLogging_Value1 = 0  # ADC value of the sample selected by Get_Data_Logging
+    DataLogging_Value2 = 0  # Elapsed time (ms) of the sample
+    AngleValue = 0.0  # Updated by Get_Rotation_Values
+    RPMValue = 0.0  # Updated by Get_Rotation_Values
+    PacketSent = 0  # USB packets sent and received since the object was created
+    PacketReceived = 0
+
+    # Connection commands
+    def Open_Device_Connection(self, serial):
+        raise NotImplementedError
+
+    def Close_Device_Connection(self, handle):
+        raise NotImplementedError
+
+    # Data link commands
+    def Slave_Activity_Inquiry(self, handle):
+        raise NotImplementedError
+
+    # Get commands
+    def Get_Device_Count(self):
+        raise NotImplementedError
+
+    def Get_Device_Serial_Number(self, index):
+        raise NotImplementedError
+
+    def Get_Offset_Value(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Fullscale_Value(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Normal_Data_Request(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Fast_Data_Request(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Internal_Register(self, handle, register):
+        raise NotImplementedError
+
+    def Get_Data_Logging(self, handle, counter):
+        raise NotImplementedError
+
+    def Get_Rotation_Values(self, handle):
+        raise NotImplementedError
+
+    def Get_Number_of_Loading_Points(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Loading_Point(self, handle, point, channel=0):
+        raise NotImplementedError
+
+    def Get_Load_of_Loading_Point(self, handle, point, channel=0):
+        raise NotImplementedError
+
+    def Get_Sensor_Identification_Number(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Unit_Code(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Decimal_Point(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Calibration_Day(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Calibration_Month(self, handle, channel=0):
+        raise NotImplementedError
+
+    def Get_Calibration_Year(self, handle, channel=0):
+        raise NotImplementedError
+
+
+def backend_methods():
+    """
+    Names of the methods every backend must implement.
+    """
+    return [
+        name for name, value in vars(DeviceBackend).items()
+        if callable(value) and not name.startswith("_")
+    ]
+
+
+def missing_methods(dev):
+    """
+    Returns the names of the DeviceBackend methods that dev does not implement.
+    """
+    return [name for name in backend_methods() if not callable(getattr(dev, name, None))]
+
+
+def load_usb_dll(backend=None):
+    """
+    Returns the USB_DLL class of the selected backend.
+    Loading the "futek" backend forces the STA COM mode and loads the .NET DLL, so
+    it must be called from the thread that will use the device.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend == "futek":
+        import ctypes
+        # Force STA mode
+        ctypes.windll.ole32.CoInitialize(None)
+        from clr import AddReference as pnetar  # From the pythonnet module
+        # Loading the DLL from the same folder as the python script
+        pnetar("FUTEK_USB_DLL")
+        from FUTEK_USB_DLL import USB_DLL
+        return USB_DLL
+    if backend == "sim":
+        import simulator
+        simulator.plug_default_device()
+        return simulator.USB_DLL
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+
+def get_usb_dll(backend=None):
+    """
+    Returns the USB_DLL class of the selected backend, loading it on the first
+    call only. See load_usb_dll.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in _loaded:
+        _loaded[backend] = load_usb_dll(backend)
+    return _loaded[backend]
@@ -0,0 +1,263 @@
+"""
+Streaming signal processing of torque (or ADC) values, one NumPy block at a time.
+A Pipeline chains stages: filters return a block of the same length, monitors
+(PeakValleyHold, RunningStats) return the block unchanged and keep their results
+as attributes. Each stage only keeps the few samples it needs from the previous
+block, so the memory used is constant, and every stage works on whole blocks
+without a Python loop over the samples. Processing a signal in blocks gives the
+same result as processing it at once, so the same pipeline runs on the live
+samples and on saved logs (apply).
+The filters are causal: each output only depends on the current and past samples.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Block size used by apply on whole arrays
+BLOCK_SIZE = 1 << 16
+
+
+class Stage:
+    """
+    Base class of the stages.
+    """
+    def process(self, block):
+        """
+        Returns the output for block, a 1D array of float values.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Forgets the previous blocks.
+        """
+        raise NotImplementedError
+
+
+class _WindowStage(Stage):
+    """
+    Stage computed on a trailing window: keeps the last window - 1 samples.
+    The first outputs use the samples available so far.
+    """
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("The window must hold at least one sample.")
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._history = np.empty(0)
+
+    def _extend(self, block):
+        """
+        Returns the history followed by block, and keeps the new history.
+        """
+        extended = np.concatenate((self._history, block))
+        self._history = extended[max(len(extended) - (self.window - 1), 0):].copy()
+        return extended
+
+
+class MovingAverage(_WindowStage):
+    """
+    Mean of the last window samples.
+    """
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        n_history = len(self._history)
+        extended = self._extend(block)
+        # Sums of the windows from the cumulative sum, computed again from zero at
+        # every block so the rounding errors don't accumulate
+        cumsum = np.concatenate(([0.0], np.cumsum(extended)))
+        ends = np.arange(n_history + 1, len(extended) + 1)
+        starts = np.maximum(ends - self.window, 0)
+        return (cumsum[ends] - cumsum[starts]) / (ends - starts)
+
+
+class MedianDespike(_WindowStage):
+    """
+    Replaces the samples that differ from the median of the last window samples
+    by more than threshold with that median. threshold None replaces every
+    sample, a median filter.
+    """
+    def __init__(self, window=5, threshold=None):
+        self.threshold = threshold
+        super().__init__(window)
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if not len(block):
+            return block.copy()
+        n_history = len(self._history)
+        extended = self._extend(block)
+        # Pads the start of the signal with its first sample, so the first windows
+        # are complete
+        missing = max(self.window - 1 - n_history, 0)
+        if missing:
+            extended = np.concatenate((np.full(missing, extended[0]), extended))
+        windows = sliding_window_view(extended, self.window)
+        medians = np.median(windows, axis=1)
+        if self.threshold is None:
+            return medians
+        return np.where(np.abs(block - medians) > self.threshold, medians, block)
+
+
+class LowPass(Stage):
+    """
+    Low-pass filter made of order identical first-order sections,
+        y[n] = y[n-1] + alpha * (x[n] - y[n-1])
+    with alpha set by the cutoff frequency and the sampling rate (Hz).
+    """
+    def __init__(self, cutoff, sample_rate, order=1):
+        if not 0 < cutoff < sample_rate / 2:
+            raise ValueError("The cutoff must be between 0 and half the sampling rate.")
+        self.cutoff = cutoff
+        self.sample_rate = sample_rate
+        self.order = order
+        omega = 2 * np.pi * cutoff / sample_rate
+        self.alpha = omega / (omega + 1)
+        decay = 1 - self.alpha
+        # Longest run computed in one pass: decay ** -run stays below 1E200
+        self._run = max(int(200 * np.log(10) / -np.log(decay)), 1)
+        self._weights = decay ** -np.arange(1, min(self._run, BLOCK_SIZE) + 1)
+        self.reset()
+
+    def reset(self):
+        # Output of each section for the previous sample, None before the first one
+        self._state = [None] * self.order
+
+    def process(self, block):
+        output = np.asarray(block, dtype=np.float64)
+        if not len(output):
+            return output.copy()
+        for section in range(self.order):
+            output = self._section(section, output)
+        return output
+
+    def _section(self, section, block):
+        """
+        Filters block with one first-order section. The recursion is solved in
+        closed form,
+            y[j] = d^(j+1) * (y_prev + alpha * sum(x[k] * d^-(k+1), k <= j))
+        with d = 1 - alpha, over runs short enough for d^-(j+1) to stay finite.
+        """
+        previous = self._state[section]
+        if previous is None:
+            previous = block[0]
+        output = np.empty_like(block)
+        for start in range(0, len(block), len(self._weights)):
+            part = block[start:start + len(self._weights)]
+            weights = self._weights[:len(part)]
+            output[start:start + len(part)] = \
+                (previous + self.alpha * np.cumsum(part * weights)) / weights
+            previous = output[start + len(part) - 1]
+        self._state[section] = previous
+        return output
+
+
+class PeakValleyHold(Stage):
+    """
+    Holds the maximum (peak) and minimum (valley) values since the last reset,
+    the index of the sample where they occurred and the last value (track), like
+    the peak, valley and track readouts of FUTEK's displays.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.peak = None
+        self.valley = None
+        self.peak_index = None
+        self.valley_index = None
+        self.track = None
+        self.n_samples = 0
+
+    def process(self, block):
+        block = np.asarray(block)
+        if len(block):
+            i_max = int(np.argmax(block))
+            i_min = int(np.argmin(block))
+            if self.peak is None or block[i_max] > self.peak:
+                self.peak = float(block[i_max])
+                self.peak_index = self.n_samples + i_max
+            if self.valley is None or block[i_min] < self.valley:
+                self.valley = float(block[i_min])
+                self.valley_index = self.n_samples + i_min
+            self.track = float(block[-1])
+            self.n_samples += len(block)
+        return block
+
+
+class RunningStats(Stage):
+    """
+    Count, mean, standard deviation, minimum and maximum of every sample since
+    the last reset. The block statistics are merged with the previous ones
+    (Chan et al.), which stays accurate over long runs.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else float("nan")
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.variance))
+
+    def process(self, block):
+        block = np.asarray(block)
+        n_block = len(block)
+        if n_block:
+            values = block.astype(np.float64, copy=False)
+            block_mean = float(values.mean())
+            block_m2 = float(np.square(values - block_mean).sum())
+            count = self.count + n_block
+            delta = block_mean - self.mean
+            self.mean += delta * n_block / count
+            self._m2 += block_m2 + delta * delta * self.count * n_block / count
+            self.count = count
+            block_min, block_max = float(values.min()), float(values.max())
+            self.min = block_min if self.min is None else min(self.min, block_min)
+            self.max = block_max if self.max is None else max(self.max, block_max)
+        return block
+
+    def summary(self):
+        return {"count": self.count, "mean": self.mean, "std": self.std,
+                "min": self.min, "max": self.max}
+
+
+class Pipeline(Stage):
+    """
+    Stages applied one after the other.
+    """
+    def __init__(self, *stages):
+        self.stages = list(stages)
+
+    def process(self, block):
+        for stage in self.stages:
+            block = stage.process(block)
+        return block
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+
+def apply(stage, values, block_size=BLOCK_SIZE, out=None):
+    """
+    Processes a whole array, e.g. a saved log, block by block. The stage keeps
+    its state, call reset first to start from scratch.
+    Returns the output array.
+    """
+    values = np.asarray(values)
+    if out is None:
+        out = np.empty(len(values), dtype=np.float64)
+    for start in range(0, len(values), block_size):
+        out[start:start + block_size] = stage.process(values[start:start + block_size])
+    return out
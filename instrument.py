@@ -0,0 +1,293 @@
+"""
+Opt-in instrumentation of a USB_DLL object.
+InstrumentedDevice wraps a USB_DLL instance and forwards every method call and
+property access to it, recording per name the number of calls, their latency,
+the failed calls ("Error" or an exception) and the DeviceStatus codes they set.
+It can also keep a timeline of the calls, exported in the Chrome trace format
+(open it in chrome://tracing or https://ui.perfetto.dev).
+The applications instrument their device when the OPENFUTEK_PROFILE environment
+variable is set, to the path prefix of the report and trace files written when
+the device is closed.
+"""
+import json
+import os
+import threading
+import time
+from array import array
+from collections import deque
+
+import numpy as np
+
+PROFILE_PATH = os.environ.get("OPENFUTEK_PROFILE")
+# Number of recent latencies kept per name for the percentiles and the histogram
+LATENCY_WINDOW = 1 << 16
+
+
+class CallStats:
+    """
+    Statistics of one method or property. The latencies of the last
+    LATENCY_WINDOW calls are kept in a ring, the call at position calls - 1.
+    """
+    __slots__ = ("calls", "errors", "total_ns", "latencies", "statuses")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.latencies = array("q")
+        # Non-zero DeviceStatus codes set by the calls, code: count
+        self.statuses = {}
+
+    def summary(self):
+        """
+        Returns a dict with the counts and the latency statistics in us, the mean
+        over all the calls and the percentiles and maximum over the recent ones.
+        """
+        summary = {
+            "calls": self.calls,
+            "errors": self.errors,
+            "statuses": dict(self.statuses),
+            "total_ms": self.total_ns / 1E6,
+        }
+        if self.calls:
+            latencies = np.frombuffer(self.latencies, dtype=np.int64) / 1E3
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            summary.update({
+                "mean_us": self.total_ns / self.calls / 1E3,
+                "p50_us": float(p50),
+                "p90_us": float(p90),
+                "p99_us": float(p99),
+                "max_us": float(latencies.max()),
+            })
+        return summary
+
+    def histogram(self):
+        """
+        Returns the latency histogram of the recent calls as (upper bound in us,
+        count) pairs, with bins growing by powers of two.
+        """
+        if not self.latencies:
+            return []
+        latencies = np.frombuffer(self.latencies, dtype=np.int64)
+        # Bin n holds the latencies of n bits, from 2^(n-1) to 2^n - 1 ns
+        _, n_bits = np.frexp(np.maximum(latencies, 1))
+        bins = np.bincount(n_bits)
+        return [(2 ** n / 1E3, int(count)) for n, count in enumerate(bins) if count]
+
+
+class InstrumentedDevice:
+    """
+    Wraps a USB_DLL instance, recording every call made through it.
+    """
+    def __init__(self, dev, track_status=True, trace=True, max_events=1 << 20):
+        """
+        dev: USB_DLL instance.
+        track_status: Reads DeviceStatus after every method call to count the
+                      status codes, which costs one property read.
+        trace: Keeps the last max_events calls for the Chrome trace.
+        """
+        object.__setattr__(self, "_dev", dev)
+        object.__setattr__(self, "_track_status", track_status)
+        object.__setattr__(self, "_stats", {})
+        object.__setattr__(self, "_events", deque(maxlen=max_events) if trace else None)
+        object.__setattr__(self, "_packets_start", self.packets())
+        object.__setattr__(self, "_start_ns", time.perf_counter_ns())
+
+    @property
+    def wrapped(self):
+        return self._dev
+
+    def __getattr__(self, name):
+        """
+        Called for every name that is not an attribute of the wrapper: methods are
+        wrapped once and cached, property reads are timed at every access.
+        """
+        start = time.perf_counter_ns()
+        value = getattr(self._dev, name)
+        if callable(value):
+            method = self._wrap(name, value)
+            object.__setattr__(self, name, method)
+            return method
+        self._record(name, start, time.perf_counter_ns(), 0, False)
+        return value
+
+    def __setattr__(self, name, value):
+        # Properties such as FastDataLoggingCounter start a transfer when set
+        start = time.perf_counter_ns()
+        setattr(self._dev, name, value)
+        self._record(f"{name} (set)", start, time.perf_counter_ns(), 0, False)
+
+    def _wrap(self, name, method):
+        """
+        Returns a function calling method and recording the call.
+        """
+        stats = self._stats_for(name)
+        events = self._events
+        dev = self._dev
+        track_status = self._track_status
+        clock = time.perf_counter_ns
+        get_ident = threading.get_ident
+        latencies = stats.latencies
+
+        def call(*args):
+            start = clock()
+            try:
+                result = method(*args)
+            except Exception:
+                end = clock()
+                stats.calls += 1
+                stats.errors += 1
+                self._add(stats, name, start, end, None)
+                raise
+            end = clock()
+            stats.calls += 1
+            stats.total_ns += end - start
+            if len(latencies) < LATENCY_WINDOW:
+                latencies.append(end - start)
+            else:
+                latencies[(stats.calls - 1) % LATENCY_WINDOW] = end - start
+            status = dev.DeviceStatus if track_status else 0
+            if status:
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if result == "Error":
+                stats.errors += 1
+            if events is not None:
+                events.append((name, start, end - start, get_ident(), status))
+            return result
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def _stats_for(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = CallStats()
+        return stats
+
+    def _record(self, name, start, end, status, failed):
+        stats = self._stats_for(name)
+        stats.calls += 1
+        stats.errors += failed
+        self._add(stats, name, start, end, status)
+
+    def _add(self, stats, name, start, end, status):
+        """
+        Records the latency and the trace event of a call already counted.
+        """
+        if len(stats.latencies) < LATENCY_WINDOW:
+            stats.latencies.append(end - start)
+        else:
+            stats.latencies[(stats.calls - 1) % LATENCY_WINDOW] = end - start
+        stats.total_ns += end - start
+        if self._events is not None:
+            self._events.append((name, start, end - start, threading.get_ident(), status))
+
+    def stats(self, name):
+        """
+        Returns the CallStats of a method or property, "<name> (set)" for the
+        property writes.
+        """
+        return self._stats[name]
+
+    def packets(self):
+        """
+        Returns the PacketSent and PacketReceived counters of the device, None
+        if it doesn't have them.
+        """
+        dev = object.__getattribute__(self, "_dev")
+        try:
+            return int(dev.PacketSent), int(dev.PacketReceived)
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def summary(self):
+        """
+        Returns a dict with the statistics of every method and property (see
+        CallStats.summary) and the packets sent and received since the wrapper
+        was created.
+        """
+        summary = {
+            "methods": {name: stats.summary() for name, stats in sorted(self._stats.items())},
+            "elapsed_s": (time.perf_counter_ns() - self._start_ns) / 1E9,
+        }
+        packets = self.packets()
+        if packets is not None and self._packets_start is not None:
+            summary["packets_sent"] = packets[0] - self._packets_start[0]
+            summary["packets_received"] = packets[1] - self._packets_start[1]
+        return summary
+
+    def report(self):
+        """
+        Returns the summary as a text table, the slowest names first.
+        """
+        summary = self.summary()
+        lines = [
+            f"{'name':36s} {'calls':>8s} {'errors':>7s} {'total ms':>10s} "
+            f"{'mean us':>9s} {'p50 us':>9s} {'p99 us':>9s} {'max us':>9s}  statuses"
+        ]
+        methods = sorted(
+            summary["methods"].items(), key=lambda item: item[1]["total_ms"], reverse=True
+        )
+        for name, stats in methods:
+            if not stats["calls"]:
+                lines.append(f"{name:36s} {0:8d} {stats['errors']:7d}")
+                continue
+            statuses = " ".join(f"{code}:{count}" for code, count in stats["statuses"].items())
+            lines.append(
+                f"{name:36s} {stats['calls']:8d} {stats['errors']:7d} "
+                f"{stats['total_ms']:10.1f} {stats['mean_us']:9.1f} {stats['p50_us']:9.1f} "
+                f"{stats['p99_us']:9.1f} {stats['max_us']:9.1f}  {statuses}"
+            )
+        lines.append(f"Elapsed: {summary['elapsed_s']:.3f} s")
+        if "packets_sent" in summary:
+            lines.append(
+                f"Packets sent: {summary['packets_sent']}, "
+                f"received: {summary['packets_received']}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """
+        Returns the recorded calls in the Chrome trace event format.
+        """
+        start_ns = self._start_ns
+        pid = os.getpid()
+        events = []
+        for name, start, duration, tid, status in list(self._events or ()):
+            event = {
+                "name": name, "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - start_ns) / 1E3, "dur": duration / 1E3,
+            }
+            if status:
+                event["args"] = {"DeviceStatus": status}
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path_prefix):
+        """
+        Writes the report to path_prefix.txt and the trace to path_prefix.json.
+        """
+        with open(f"{path_prefix}.txt", "w") as report_file:
+            report_file.write(self.report() + "\n")
+        with open(f"{path_prefix}.json", "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+
+def instrument(dev, **kwargs):
+    """
+    Wraps dev in an InstrumentedDevice if OPENFUTEK_PROFILE is set, otherwise
+    returns it unchanged.
+    """
+    if PROFILE_PATH:
+        return InstrumentedDevice(dev, **kwargs)
+    return dev
+
+
+def save_profile(dev):
+    """
+    Writes the report and the trace of an instrumented device to
+    OPENFUTEK_PROFILE.txt and .json. Does nothing for other devices.
+    """
+    if isinstance(dev, InstrumentedDevice) and PROFILE_PATH:
+        dev.save(PROFILE_PATH)
@@ -0,0 +1,296 @@
+"""
+Torque-vs-time plot that stays responsive during long captures.
+Only a min/max decimated view is drawn: the minimum and the maximum of the
+samples under each horizontal pixel, which looks the same as drawing all of
+them. DecimatedSeries keeps the min/max of small fixed bins up to date as samples
+arrive, so building the view costs O(n / BASE_BIN) per frame. It stores at most
+max_samples points: when full, the stored points are replaced by the min/max of
+their bins, so a capture of any duration uses the same memory and still plots
+every extreme.
+LivePlot redraws at most MAX_FPS times per second and blits: the axes background
+is rendered once and only the line is drawn again, until the data leaves the axes
+limits.
+"""
+import time
+from collections import deque
+
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+
+def minmax_indices(values, n_bins):
+    """
+    Splits values in n_bins groups of consecutive samples and returns the indices
+    of the minimum and the maximum of each group, in increasing order. The samples
+    left over by the last full group form one more group.
+    """
+    n_values = len(values)
+    if n_values <= 2 * n_bins:
+        return np.arange(n_values)
+    bin_size = n_values // n_bins
+    n_full = n_bins * bin_size
+    groups = values[:n_full].reshape(n_bins, bin_size)
+    offsets = np.arange(0, n_full, bin_size)
+    i_min = groups.argmin(axis=1)
+    i_max = groups.argmax(axis=1)
+    indices = np.empty(2 * n_bins, dtype=np.int64)
+    indices[0::2] = offsets + np.minimum(i_min, i_max)
+    indices[1::2] = offsets + np.maximum(i_min, i_max)
+    if n_full < n_values:
+        tail = values[n_full:]
+        tail_indices = np.unique([tail.argmin(), tail.argmax()]) + n_full
+        indices = np.concatenate((indices, tail_indices))
+    return indices
+
+
+def minmax_decimate(x_vals, y_vals, n_bins):
+    """
+    Returns the x and y values of the min/max decimated series, at most
+    2 * (n_bins + 1) points.
+    """
+    indices = minmax_indices(y_vals, n_bins)
+    return x_vals[indices], y_vals[indices]
+
+
+class DecimatedSeries:
+    """
+    Growing (x, y) series that keeps the indices of the minimum and the maximum of
+    every BASE_BIN consecutive samples, updated as the samples are appended.
+    At most max_samples points are stored, see compact.
+    """
+    BASE_BIN = 64
+    # 16 MB of x and y values, about 25 min of samples at 700 Hz before the
+    # first compaction
+    MAX_SAMPLES = 1 << 20
+
+    def __init__(self, capacity=1 << 16, max_samples=MAX_SAMPLES):
+        capacity = min(capacity, max_samples)
+        self.max_samples = max_samples
+        self.x = np.empty(capacity, dtype=np.float64)
+        self.y = np.empty(capacity, dtype=np.float64)
+        self.n_samples = 0
+        # Number of times the stored points were replaced by their min/max
+        self.compactions = 0
+        # Min/max indices of the complete base bins, in increasing order
+        self._bin_indices = np.empty(2 * (capacity // self.BASE_BIN), dtype=np.int64)
+        self._n_bins = 0
+
+    def __len__(self):
+        return self.n_samples
+
+    def clear(self):
+        self.n_samples = 0
+        self._n_bins = 0
+
+    def append(self, x_vals, y_vals):
+        """
+        Appends samples, growing the storage by doubling up to max_samples and
+        compacting it when it is full.
+        """
+        # Blocks of at most half the storage always fit after a compaction
+        step = self.max_samples // 2
+        for start in range(0, len(x_vals), step):
+            self._append(x_vals[start:start + step], y_vals[start:start + step])
+
+    def compact(self):
+        """
+        Replaces the stored points by the first one and the min/max of the
+        complete base bins, followed by the points of the last bin, about
+        2 / BASE_BIN of them. The view keeps the same extremes and time span, with
+        a coarser time resolution for the points compacted.
+        """
+        indices = np.unique(np.concatenate((
+            [0],
+            self._bin_indices[:2 * self._n_bins],
+            np.arange(self._n_bins * self.BASE_BIN, self.n_samples),
+        )))
+        n_points = len(indices)
+        self.x[:n_points] = self.x[indices]
+        self.y[:n_points] = self.y[indices]
+        self.n_samples = n_points
+        self._n_bins = 0
+        self._update_bins()
+        self.compactions += 1
+
+    def _append(self, x_vals, y_vals):
+        n_new = len(x_vals)
+        if self.n_samples + n_new > self.max_samples:
+            self.compact()
+        end = self.n_samples + n_new
+        if end > len(self.x):
+            capacity = min(max(2 * len(self.x), end), self.max_samples)
+            self.x = _grow(self.x, capacity)
+            self.y = _grow(self.y, capacity)
+            self._bin_indices = _grow(self._bin_indices, 2 * (capacity // self.BASE_BIN))
+        self.x[self.n_samples:end] = x_vals
+        self.y[self.n_samples:end] = y_vals
+        self.n_samples = end
+        self._update_bins()
+
+    def _update_bins(self):
+        """
+        Min/max of the bins completed since the last update.
+        """
+        n_bins = self.n_samples // self.BASE_BIN
+        if n_bins > self._n_bins:
+            first = self._n_bins * self.BASE_BIN
+            bins = self.y[first:n_bins * self.BASE_BIN].reshape(-1, self.BASE_BIN)
+            offsets = np.arange(first, n_bins * self.BASE_BIN, self.BASE_BIN)
+            i_min = bins.argmin(axis=1)
+            i_max = bins.argmax(axis=1)
+            new_indices = self._bin_indices[2 * self._n_bins:2 * n_bins]
+            new_indices[0::2] = offsets + np.minimum(i_min, i_max)
+            new_indices[1::2] = offsets + np.maximum(i_min, i_max)
+            self._n_bins = n_bins
+
+    def set_data(self, x_vals, y_vals):
+        self.clear()
+        self.append(x_vals, y_vals)
+
+    def view(self, n_points):
+        """
+        Returns the x and y values of the whole series decimated to about
+        2 * n_points points, from the first point to the last one.
+        """
+        n_samples = self.n_samples
+        if n_samples <= 2 * n_points:
+            return self.x[:n_samples].copy(), self.y[:n_samples].copy()
+        # The extremes of the complete bins, then every sample of the last one
+        candidates = np.concatenate((
+            self._bin_indices[:2 * self._n_bins],
+            np.arange(self._n_bins * self.BASE_BIN, n_samples),
+        ))
+        indices = candidates[minmax_indices(self.y[candidates], n_points)]
+        # The extremes of the first group may be far from the first point
+        indices = np.unique(np.concatenate(([0], indices, [n_samples - 1])))
+        return self.x[indices], self.y[indices]
+
+
+class LivePlot:
+    """
+    Plot of a DecimatedSeries embedded in a Qt layout. The owner appends samples
+    and calls refresh periodically, e.g. from a QTimer at MAX_FPS.
+    """
+    MAX_FPS = 10
+    # Maximum fraction of the time spent drawing. A slow frame delays the next
+    # one, so the plot never takes the CPU from the acquisition.
+    MAX_LOAD = 0.25
+
+    def __init__(self, layout, xlabel="Time (s)", ylabel="Torque (N.cm)"):
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        layout.addWidget(self.canvas)
+        self.axes = self.figure.add_subplot(111)
+        self.axes.grid(True, axis="y")
+        self.axes.set_xlabel(xlabel)
+        self.axes.set_ylabel(ylabel)
+        self.axes.set_xlim(0, 1)
+        self.line, = self.axes.plot([], [], linewidth=1, animated=True)
+        self.series = DecimatedSeries()
+        self._background = None
+        self._changed = False
+        # False until the axes limits were fitted to the current data
+        self._limits_fitted = False
+        self._next_frame = 0.0
+        # Duration of the recent frames (s) and number of full redraws
+        self.frame_times = deque(maxlen=256)
+        self.full_redraws = 0
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def clear(self):
+        self.series.clear()
+        self._limits_fitted = False
+        self._changed = True
+
+    def set_data(self, x_vals, y_vals):
+        self.series.set_data(x_vals, y_vals)
+        self._limits_fitted = False
+        self._changed = True
+
+    def append(self, x_vals, y_vals):
+        if len(x_vals):
+            self.series.append(x_vals, y_vals)
+            self._changed = True
+
+    def refresh(self, force=False):
+        """
+        Redraws the line if samples were added, unless the previous frame was too
+        recent. Returns True if a frame was drawn.
+        """
+        now = time.perf_counter()
+        if not (self._changed or force) or (now < self._next_frame and not force):
+            return False
+        n_points = max(int(self.axes.bbox.width), 1)
+        x_vals, y_vals = self.series.view(n_points)
+        self.line.set_data(x_vals, y_vals)
+        rescaled = self._rescale(x_vals, y_vals)
+        if rescaled or self._background is None:
+            # Renders the axes, _on_draw then saves the background and draws the line
+            self.full_redraws += 1
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self.axes.draw_artist(self.line)
+            self.canvas.blit(self.axes.bbox)
+        self._changed = False
+        frame_time = time.perf_counter() - now
+        self.frame_times.append(frame_time)
+        self._next_frame = now + max(1 / self.MAX_FPS, frame_time / self.MAX_LOAD)
+        return True
+
+    def _rescale(self, x_vals, y_vals):
+        """
+        Widens the axes limits if the data left them. The new limits leave room
+        for the series to grow, so that full redraws stay rare.
+        Returns True if the limits changed.
+        """
+        if len(x_vals) == 0:
+            return False
+        x_min, x_max = self.axes.get_xlim()
+        y_min, y_max = self.axes.get_ylim()
+        data_x_min, data_x_max = x_vals[0], x_vals[-1]
+        data_y_min, data_y_max = y_vals.min(), y_vals.max()
+        fit = not self._limits_fitted
+        changed = False
+        if fit or data_x_min < x_min or data_x_max > x_max:
+            span = max(data_x_max - data_x_min, 1E-9)
+            self.axes.set_xlim(data_x_min, data_x_min + 2 * span)
+            changed = True
+        if fit or data_y_min < y_min or data_y_max > y_max:
+            margin = max(data_y_max - data_y_min, abs(data_y_max), 1E-9) * 0.1
+            self.axes.set_ylim(data_y_min - margin, data_y_max + margin)
+            changed = True
+        self._limits_fitted = True
+        return changed
+
+    def _on_draw(self, event):
+        """
+        Saves the rendered axes without the line, as the background of blitting.
+        """
+        self._background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.axes.draw_artist(self.line)
+
+    def stats(self):
+        """
+        Returns a dict with the median and worst recent frame times (ms) and the
+        number of full redraws.
+        """
+        if not self.frame_times:
+            return {"frames": 0, "full_redraws": self.full_redraws}
+        frame_times = np.array(self.frame_times) * 1000
+        return {
+            "frames": len(frame_times),
+            "frame_p50": float(np.percentile(frame_times, 50)),
+            "frame_max": float(frame_times.max()),
+            "full_redraws": self.full_redraws,
+        }
+
+
+def _grow(array, capacity):
+    """
+    Returns a copy of array with room for capacity elements.
+    """
+    grown = np.empty(capacity, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
@@ -0,0 +1,135 @@
+"""
+Local copy of the data log of each device, so that downloading the log again only
+fetches the samples recorded since the previous download.
+The samples of each serial number are kept in an append-only file of (time, ADC)
+records. They are appended block by block during the download, so a download
+interrupted by a lost connection, a cancel or a crash resumes from the last block
+saved instead of from the start of the log.
+Before the stored samples are reused, a few of them are read back from the device
+(head probes) to check that the log was not erased or replaced since.
+"""
+import os
+
+import numpy as np
+
+from datalog import (
+    LINK_ERROR_STATUSES, DataLogConnectionError, download_data_log, open_reader
+)
+
+DEFAULT_FOLDER = os.path.join(os.path.expanduser("~"), ".openfutek", "logs")
+RECORD_DTYPE = np.dtype([("time", "<i8"), ("adc", "<i8")])
+# Number of stored samples compared with the device before a download
+N_PROBES = 8
+
+
+class LogStore:
+    """
+    Stored data logs, one file per serial number in folder.
+    """
+    def __init__(self, folder=DEFAULT_FOLDER):
+        self.folder = folder
+
+    def path(self, serial):
+        return os.path.join(self.folder, f"{serial}.log")
+
+    def load(self, serial):
+        """
+        Returns the stored time and ADC arrays of a device, empty if there are none.
+        A record cut short by a crash while it was appended is removed.
+        """
+        path = self.path(serial)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        size = os.path.getsize(path)
+        n_records = size // RECORD_DTYPE.itemsize
+        if size % RECORD_DTYPE.itemsize:
+            os.truncate(path, n_records * RECORD_DTYPE.itemsize)
+        records = np.fromfile(path, dtype=RECORD_DTYPE, count=n_records)
+        return records["time"].astype(np.int64), records["adc"].astype(np.int64)
+
+    def append(self, serial, tim_vals, adc_vals):
+        """
+        Appends samples to the stored log of a device.
+        """
+        records = np.empty(len(tim_vals), dtype=RECORD_DTYPE)
+        records["time"] = tim_vals
+        records["adc"] = adc_vals
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.path(serial), "ab") as log_file:
+            log_file.write(records.tobytes())
+
+    def clear(self, serial):
+        """
+        Deletes the stored log of a device.
+        """
+        path = self.path(serial)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def probe_indices(n_samples, n_probes=N_PROBES):
+    """
+    Indices of the stored samples checked against the device, spread over the log
+    and always including the first and the last one.
+    """
+    return np.unique(np.linspace(0, n_samples - 1, n_probes).astype(np.int64))
+
+
+def head_matches(dev, reader, tim_vals, adc_vals, n_probes=N_PROBES):
+    """
+    Returns True if the device still holds the stored samples, comparing the
+    samples at probe_indices.
+    Raises DataLogConnectionError if the device stops answering.
+    """
+    tim_probe = np.empty(1, dtype=np.int64)
+    adc_probe = np.empty(1, dtype=np.int64)
+    for index in probe_indices(len(tim_vals), n_probes):
+        if reader.read_block(int(index), tim_probe, adc_probe) != 1:
+            if dev.DeviceStatus in LINK_ERROR_STATUSES:
+                raise DataLogConnectionError(
+                    f"Connection lost while checking the stored log "
+                    f"(status {dev.DeviceStatus})."
+                )
+            return False
+        if tim_probe[0] != tim_vals[index] or adc_probe[0] != adc_vals[index]:
+            return False
+    return True
+
+
+def sync_data_log(dev, handle, serial, store, reader=None, n_probes=N_PROBES, **kwargs):
+    """
+    Downloads the data log of a device, reading only the samples that are not in
+    store yet. The whole log is downloaded again if the stored samples don't match
+    the device.
+    kwargs are passed to download_data_log (progress, cancel, ...).
+    Returns the time and ADC arrays of the whole log, like download_data_log.
+    Raises DataLogConnectionError if the device stops answering, calling it again
+    after reconnecting resumes the download.
+    """
+    if reader is None:
+        reader = open_reader(dev, handle)
+    tim_vals, adc_vals = store.load(serial)
+    count = len(tim_vals)
+    if count:
+        total = reader.n_samples()
+        # At least two samples are needed to know the sampling period
+        reusable = (
+            count >= 2 and tim_vals[1] > tim_vals[0]
+            and (total is None or total >= count)
+            and head_matches(dev, reader, tim_vals, adc_vals, n_probes)
+        )
+        if not reusable:
+            store.clear(serial)
+            tim_vals = tim_vals[:0]
+            adc_vals = adc_vals[:0]
+            count = 0
+    if count:
+        kwargs.update(
+            start=count, previous_t=tim_vals[-1], t_delta_base=tim_vals[1] - tim_vals[0]
+        )
+
+    def save(tim_block, adc_block):
+        store.append(serial, tim_block, adc_block)
+
+    tim_new, adc_new = download_data_log(dev, handle, reader, sink=save, **kwargs)
+    return np.concatenate((tim_vals, tim_new)), np.concatenate((adc_vals, adc_new))
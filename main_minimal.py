@@ -2,32 +2,103 @@
 This script uses the FUTEK USB DLL Api, which is written in .NET, therefore the 
 pythonnet module is required, and "import clr" is from pythonnet
 """
-#   importing ctypes stuff
-import ctypes
-co_initialize = ctypes.windll.ole32.CoInitialize
-
 # Qt5
-from PyQt5 import uic
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QApplication, QFileDialog, QMainWindow
 QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)  # enable highdpi scaling
 QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)  # use highdpi icons
-import numpy as np
 
 # To deal with files, time, paths...
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# NumPy and the modules using it are imported by the methods that need them, so
+# the window shows before they are loaded
+from uicache import load_form_class
+
+BASE_PATH = os.path.dirname(os.path.realpath(__file__))
+# Form class compiled from the .ui file, recompiled only when the file changes
+Ui_MainWindow = load_form_class(os.path.join(BASE_PATH, "gui", "torque_bench_minimal.ui"))
+
+
+class DataLogWorker(QObject):
+    """
+    Downloads the data log of the IHH on the device thread, so that the window
+    stays responsive. The results are delivered through signals, queued to the
+    main thread.
+    """
+    # Samples read so far and download rate (samples/s)
+    progress = pyqtSignal(int, float)
+    status = pyqtSignal(str)
+    # Time, ADC and torque arrays
+    finished = pyqtSignal(object, object, object)
+    failed = pyqtSignal(str)
+    # Minimum time between two progress signals, so at most 20 updates/s reach
+    # the main thread whatever the download speed
+    PROGRESS_INTERVAL = 0.05  # s
+
+    def __init__(self, session, calibration, log_store):
+        super(DataLogWorker, self).__init__()
+        self.session = session
+        self.calibration = calibration
+        self.log_store = log_store
+        self._cancel = threading.Event()
+        self._last_progress = 0.0
+
+    def cancel(self):
+        """
+        Requests the download to stop. Safe to call from any thread.
+        """
+        self._cancel.set()
+
+    def run(self):
+        """
+        Downloads the log and converts it with the calibration read at connection.
+        """
+        from datalog import DataLogConnectionError, DataLogError
+        from session import ReconnectError
+        try:
+            # Gets the data logging value stored in memory in blocks, directly into
+            # numpy arrays. The end of the log is detected by datalog from the time
+            # interval between samples. Only the samples recorded since the last
+            # download of this IHH are read, the others come from the log store.
+            # If the link is lost, the session reconnects and the download resumes.
+            self.status.emit("Initiating data retrieval.")
+            tim_vals, adc_vals = self.session.download_log(
+                self.log_store, progress=self._report_progress, cancel=self._cancel,
+                on_drop=self._report_drop
+            )
+        except (DataLogConnectionError, ReconnectError) as error:
+            self.failed.emit(f"{error} Reconnect and get the data to resume.")
+            return
+        except DataLogError as error:
+            self.failed.emit(str(error))
+            return
+        except Exception:
+            self.failed.emit("Unable to obtain logged data.")
+            return
 
-#   Force STA mode
-co_initialize(None)
+        # Get converted values:
+        tq_vals = self.calibration.convert(adc_vals)
+        self.finished.emit(tim_vals, adc_vals, tq_vals)
+
+    def _report_drop(self, error):
+        self.status.emit(f"{error} Reconnecting.")
 
-from clr import AddReference as pnetar  # From the pythonnet module
+    def _report_progress(self, sample_count, total, rate):
+        """
+        Progress callback of download_data_log, throttled to PROGRESS_INTERVAL.
+        """
+        now = time.perf_counter()
+        if now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progress.emit(sample_count, rate)
 
-# Loading the DLL from the same folder as the python script
-pnetar("FUTEK_USB_DLL")
-from FUTEK_USB_DLL import USB_DLL
 
-class MainWindow(QMainWindow):
+class MainWindow(QMainWindow, Ui_MainWindow):
     """
     Main window
     """
@@ -36,14 +107,49 @@ class MainWindow(QMainWindow):
         Initialization of the main window
         """
         super(MainWindow, self).__init__(parent)
-        # Loads the ui
-        self.base_path = os.path.dirname(os.path.realpath(__file__))
-        uic.loadUi(os.path.join(self.base_path, "gui", "torque_bench_minimal.ui"), self)
+        # Creates the widgets of the ui
+        self.base_path = BASE_PATH
+        self.setupUi(self)
         self.connect_signals()
         self.output_folder_line.setText(self.base_path)
-
+        self.get_data_btn_text = self.get_data_btn.text()
+
+        # Single thread making every DLL call: it loads the DLL (in STA mode) at
+        # the first connection and owns the device, see on_device
+        self.device_thread = None
+        # USB_DLL instance, created at the first connection and then reused, and
+        # the session of the connected device
+        self.usb = None
+        self.session = None
         self.dev_connected = False
         self.got_data = False
+        # Worker of the data log download in progress and its Future
+        self.download_worker = None
+        self.download_future = None
+        # Created at the first connection and the first download
+        self.calibration_cache = None
+        self.calibration = None
+        self.log_store = None
+        # Acquisition on the device thread while connected, paused (sending
+        # heartbeats) unless the live view is on, the reader of its samples and
+        # their plot
+        self.acquisition = None
+        self.stream_consumer = None
+        self.live_start = None
+        # Reports the heartbeats, see check_link
+        self.link_alive = True
+        self.link_timer = QTimer(self)
+        self.link_timer.setInterval(1000)
+        self.link_timer.timeout.connect(self.check_link)
+        # Records the live samples to disk as they arrive
+        self.live_writer = None
+        # Track, peak and valley torque of the live view or the downloaded log
+        self.peak_valley = None
+        # Created by show_plot when there is something to plot, importing
+        # matplotlib takes longer than starting the rest of the application
+        self.plot = None
+        self.plot_timer = QTimer(self)
+        self.plot_timer.timeout.connect(self.update_plot)
         self.update_gui()
         self.update_status_txt()
         
@@ -58,6 +164,7 @@ class MainWindow(QMainWindow):
         self.connect_btn.clicked.connect(self.connect_ihh)
         self.disconnect_btn.clicked.connect(self.disconnect_ihh)
         self.output_folder_btn.clicked.connect(self.choose_output_folder)
+        self.live_btn.toggled.connect(self.toggle_live)
 
         # File Menu actions
         self.action_connect.triggered.connect(self.connect_ihh)
@@ -68,167 +175,393 @@ class MainWindow(QMainWindow):
         """
         Enables and disables buttons, updating the interface.
         """
+        if self.download_worker is not None:
+            # While downloading, the get data button cancels the download
+            self.connect_btn.setEnabled(False)
+            self.disconnect_btn.setEnabled(False)
+            self.get_data_btn.setEnabled(True)
+            self.get_data_btn.setText("Cancel")
+            self.save_btn.setEnabled(False)
+            self.live_btn.setEnabled(False)
+            return
+        self.get_data_btn.setText(self.get_data_btn_text)
+
         if self.dev_connected:
             self.connect_btn.setEnabled(False)
             self.disconnect_btn.setEnabled(True)
-            self.get_data_btn.setEnabled(True)
-        
+            # The live view and the download can't use the device at the same time
+            self.get_data_btn.setEnabled(not self.live)
+            self.live_btn.setEnabled(True)
+
         else:
             self.connect_btn.setEnabled(True)
             self.disconnect_btn.setEnabled(False)
             self.get_data_btn.setEnabled(False)
+            self.live_btn.setEnabled(False)
 
         if self.got_data:
             self.save_btn.setEnabled(True)
         else:
             self.save_btn.setEnabled(False)
 
+    def on_device(self, func, *args):
+        """
+        Runs func(*args) on the device thread and waits for its result.
+        """
+        if self.device_thread is None:
+            self.device_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="IHH")
+        return self.device_thread.submit(func, *args).result()
+
     def connect_ihh(self):
-        self.usb = USB_DLL()
+        if self.download_worker is not None:
+            return
         serial = self.ihh_serial_line.text()
+        status, calibration = self.on_device(self.open_device, serial)
 
-        # Open the connection to the device using its serial number
-        self.usb.Open_Device_Connection(serial)
-
-        # Gets the handle and current status
-        self.ihh_handle = self.usb.DeviceHandle
-
-        status = self.usb.DeviceStatus
         dev_ok = self.check_device_status(status)
-        if dev_ok:
+        if dev_ok and calibration is None:
+            self.dev_connected = False
+            self.update_status_txt("Unable to read the calibration.")
+        elif dev_ok:
+            self.calibration = calibration
             self.dev_connected = True
             self.update_status_txt("Connected to IHH.")
+            self.start_acquisition()
         else:
             self.dev_connected = False
 
         self.update_gui()
 
+    def open_device(self, serial):
+        """
+        Opens the device and reads its calibration, on the device thread.
+        Returns the DeviceStatus and the calibration, None if it can't be read.
+        """
+        from calibration import CalibrationCache
+        from device import get_usb_dll
+        from instrument import instrument
+        from session import DeviceSession
+        # FUTEK's DLL (forcing the STA mode of this thread) or the simulator, see
+        # device.py. The DLL is only loaded at the first connection. Every call is
+        # recorded if OPENFUTEK_PROFILE is set, see instrument.py.
+        if self.usb is None:
+            self.usb = instrument(get_usb_dll()())
+        if self.calibration_cache is None:
+            self.calibration_cache = CalibrationCache()
+
+        # Open the connection to the device using its serial number. The session
+        # opens it again by itself if the link is lost.
+        self.session = DeviceSession(self.usb, serial)
+        self.session.open()
+        status = self.usb.DeviceStatus
+        if status != 0:
+            return status, None
+        # The calibration registers are only read if this sensor is not cached
+        # or was calibrated again
+        try:
+            return status, self.calibration_cache.get(self.usb, self.session.handle, serial)
+        except ValueError:
+            self.session.close()
+            return status, None
+
     def disconnect_ihh(self):
-        # Closes the connection at the end of the program
-        self.usb.Close_Device_Connection(self.ihh_handle)
+        from instrument import save_profile
+        # The device can't be closed while the download uses it
+        if self.download_worker is not None:
+            return
+        self.stop_acquisition()
+        # Closes the connection at the end of the program, even if the device was
+        # unplugged in the meantime
+        self.on_device(self.session.close)
+        save_profile(self.usb)
         self.dev_connected = False
         self.update_status_txt("Disconnected IHH.")
         self.update_gui()
 
     def get_logged_data(self):
         """
-        Gets the logged data from the IHH.
+        Starts downloading the logged data from the IHH on the device thread, or
+        cancels the download if one is in progress.
         """
+        if self.download_worker is not None:
+            self.download_worker.cancel()
+            self.update_status_txt("Cancelling data retrieval.")
+            return
+        if self.live:
+            return
         # If the device is not connected, trying to get data will result in an error
         if not self.dev_connected:
             self.update_status_txt("Disconnected IHH.")
             return
-        try:  # double checking
-            status = self.usb.DeviceStatus
-            dev_ok = self.check_device_status(status)
-            if not dev_ok:
-                self.dev_connected = False
-                return
-        except:
-            self.update_status_txt("Unable to obtain logged data.")
-            return
+        # The download needs the device thread, the heartbeats resume after it
+        self.stop_acquisition()
+        if self.log_store is None:
+            from logstore import LogStore
+            self.log_store = LogStore()
+
+        # A link lost since the connection is restored by the worker, through the
+        # session
+        self.download_worker = DataLogWorker(self.session, self.calibration, self.log_store)
+        self.download_worker.status.connect(self.update_status_txt)
+        self.download_worker.progress.connect(self.update_download_progress)
+        self.download_worker.finished.connect(self.download_finished)
+        self.download_worker.failed.connect(self.download_failed)
+        self.download_future = self.device_thread.submit(self.download_worker.run)
+        self.update_gui()
 
-        # TODO Change from lists to numpy arrays
-        # Create arrays to store the data
-        adc_vals = []
-        tim_vals = []
-
-        self.update_status_txt("Reading parameters from register.")
-        # These values may be obtained directly from these functions or from the
-        # Get_Internal_Register function
-        offset_d = int(self.usb.Get_Internal_Register(self.ihh_handle, 0x02))
-        # print(f"{offset_d = }")
-
-        # fullscale_d = dev.Get_Fullscale_Value(handle, channel)
-        # print(f'{fullscale_d = }')
-        fullscale_d = int(self.usb.Get_Internal_Register(self.ihh_handle, 0x03))
-        # print(f"{fullscale_d = }")
-
-        # There is no function to get the fullscale offset value directly
-        reverse_fullscale_d = int(self.usb.Get_Internal_Register(self.ihh_handle, 0x04))
-        # print(f"{reverse_fullscale_d = }")
-
-        # This value comes without the decimal point
-        fullscale_load_a = self.usb.Get_Internal_Register(self.ihh_handle, 0x05)
-        # convert to float and correct the decimals
-        fullscale_load_a = float(fullscale_load_a) * 1E-3
-        # print(f"{fullscale_load_a = }")
-
-        # Gets the data logging value stored in memory and assigns a value to the 
-        # DataLogging_Counter, DataLogging_Value1 and DataLogging_Value2.
-        # There is no way to know the length of the data_logging. An auxiliary variable
-        # verifies whether the time interval between two samples is consistent
-        
-        self.update_status_txt("Initiating data retrieval.")
-        try:
-            # Gets the first and second samples to calculate the time delay
-            # Selects the sample to be read
-            self.usb.Get_Data_Logging(self.ihh_handle, 0)
-            # Reads the sample
-            time_sample_1 = self.usb.DataLogging_Value2
+    def download_finished(self, tim_vals, adc_vals, tq_vals):
+        """
+        Receives the arrays of a completed download.
+        """
+        from dsp import PeakValleyHold
+        # Saves the data in globally accessible variables.
+        self.adc_vals = adc_vals
+        self.tim_vals = tim_vals
+        self.tq_vals = tq_vals
+        self.got_data = True
+        self.show_plot().set_data(tim_vals / 1000, tq_vals)
+        self.peak_valley = PeakValleyHold()
+        self.peak_valley.process(tq_vals)
+        self.update_values_txt()
+        self.update_status_txt(f"Got {len(tim_vals)} samples.")
+        self.end_download()
+
+    def download_failed(self, message):
+        """
+        Shows why the download stopped.
+        """
+        self.update_status_txt(message)
+        self.end_download()
+
+    def end_download(self):
+        """
+        Waits for the end of the download and updates the interface.
+        """
+        self.download_future.result()
+        self.download_future = None
+        self.download_worker = None
+        if self.dev_connected:
+            self.start_acquisition()
+        self.update_gui()
 
-            self.usb.Get_Data_Logging(self.ihh_handle, 1)
-            time_sample_2 = self.usb.DataLogging_Value2
+    def closeEvent(self, event):
+        """
+        Stops a download or the live view in progress before closing the window,
+        then the device thread.
+        """
+        self.stop_acquisition()
+        if self.download_worker is not None:
+            self.download_worker.cancel()
+            self.download_future.result()
+        if self.usb is not None:
+            from instrument import save_profile
+            save_profile(self.usb)
+        if self.device_thread is not None:
+            self.device_thread.shutdown()
+        super(MainWindow, self).closeEvent(event)
+
+    def toggle_live(self, checked):
+        if checked:
+            self.start_live()
+        else:
+            self.stop_live()
 
-            t_delta_base = time_sample_2 - time_sample_1
-        except:
-            self.update_status_txt("Couldn't obtain data to calculate sampling period.")
+    @property
+    def live(self):
+        """
+        True while the live view polls the device.
+        """
+        return self.acquisition is not None and not self.acquisition.paused
+
+    def start_acquisition(self):
+        """
+        Starts the acquisition of the connected device on the device thread,
+        paused: until the live view resumes it, it only sends heartbeats, which
+        reopen a lost link and are reported by check_link.
+        """
+        from scheduler import AdaptiveAcquisition
+        # Polls as fast as the device answers without failing. The requests go
+        # through the session, which reopens a lost link and sends them again.
+        self.acquisition = AdaptiveAcquisition(
+            self.usb, self.session.handle, channel=2, session=self.session
+        )
+        self.acquisition.pause()
+        self.acquisition.start(executor=self.device_thread)
+        self.link_alive = True
+        self.link_timer.start()
+
+    def stop_acquisition(self):
+        """
+        Stops the live view and the heartbeats, freeing the device thread.
+        """
+        self.stop_live()
+        self.link_timer.stop()
+        if self.acquisition is not None:
+            self.acquisition.stop()
+            self.acquisition = None
+
+    def check_link(self):
+        """
+        Shows whether the device answers the heartbeats, called by link_timer. A
+        device that didn't come back before the session timeout is disconnected.
+        """
+        if self.acquisition is None:
             return
+        error = self.acquisition.error
+        if error is not None:
+            self.stop_acquisition()
+            self.on_device(self.session.close)
+            self.dev_connected = False
+            self.update_status_txt(f"Connection lost: {error}")
+            self.update_gui()
+        elif self.acquisition.alive != self.link_alive:
+            self.link_alive = self.acquisition.alive
+            if self.link_alive:
+                self.update_status_txt("Connected to IHH.")
+            else:
+                self.update_status_txt("IHH not answering, reconnecting.")
 
-        # Check if the first time interval is good
-        if t_delta_base > 0:
-            valid_delta_t = True
-            self.update_status_txt(f"Sampling period: {t_delta_base} ms.")
+    def start_live(self):
+        """
+        Resumes polling the live value of the IHH on the device thread, plotted by
+        update_plot.
+        """
+        import streamlog
+        from dsp import PeakValleyHold
+        from streaming import StreamConsumer
+        if self.acquisition is None or self.download_worker is not None:
+            self.live_btn.setChecked(False)
+            return
+        self.stream_consumer = StreamConsumer(self.acquisition.buffer)
+        self.live_start = None
+        self.show_plot().clear()
+        self.peak_valley = PeakValleyHold()
+        filepath = self.live_file_path()
+        self.live_writer = None
+        if filepath is None:
+            self.update_status_txt(
+                "Live view, not recorded: choose a file name and an output folder."
+            )
         else:
-            valid_delta_t = False
-            self.update_status_txt(f"Invalid sampling period: {t_delta_base} ms.")
+            try:
+                create_output_folder(os.path.dirname(filepath))
+                self.live_writer = streamlog.StreamWriter(filepath, self.calibration)
+                self.update_status_txt(f"Live view, recording to {filepath}")
+            except OSError:
+                self.update_status_txt("Live view, unable to record the data.")
+        self.acquisition.resume()
+        self.update_gui()
+
+    def stop_live(self):
+        """
+        Pauses the live acquisition, keeping its samples on the plot.
+        """
+        if not self.live:
             return
+        self.acquisition.pause()
+        self.update_plot()
+        if self.live_writer is not None:
+            try:
+                self.live_writer.close()
+                self.update_status_txt(f"Data saved: {self.live_writer.filename}")
+            except OSError:
+                self.update_status_txt("Error saving the live data.")
+            self.live_writer = None
+        self.stream_consumer = None
+        self.live_btn.setChecked(False)
+        self.update_gui()
 
-        # Get all samples
-        sample_count = 0
-        while valid_delta_t:
-            self.usb.Get_Data_Logging(self.ihh_handle, sample_count)
-            torq_sample = self.usb.DataLogging_Value1
-            time_sample = self.usb.DataLogging_Value2
-            if sample_count < 2:
-                tim_vals.append(time_sample)
-                adc_vals.append(torq_sample)
-                sample_count +=1
-                continue
-
-            delta_t = time_sample - tim_vals[-1]
-            valid_margin = 1.5  # 50% time margin
-            if (delta_t <= t_delta_base * valid_margin) and (delta_t >= t_delta_base / valid_margin):
-                # print(f"Valid time interval: {delta_t} ms")
-                tim_vals.append(time_sample)
-                adc_vals.append(torq_sample)
-                self.update_status_txt(f"Sample {sample_count} at {time_sample} ms")
-                sample_count += 1
-            else:
-                # print(f"Invalid time interval: {delta_t}")
-                valid_delta_t = False
+    def discard_live_writer(self):
+        """
+        Stops the writer thread of a failed recording and closes its file, which
+        keeps the samples written before the error.
+        """
+        try:
+            self.live_writer.close()
+        except OSError:
+            pass
+        self.live_writer = None
 
-            
-        # Get converted values:
-        tq_vals = DA_convert(
-        adc_vals, offset_d, fullscale_d, reverse_fullscale_d, fullscale_load_a
-        )
-        # Saves the data in globally accessible variables.
-        self.adc_vals = adc_vals
-        self.tim_vals = tim_vals
-        self.tq_vals = tq_vals
-        self.got_data = True
-        self.update_gui()
+    def live_file_path(self):
+        """
+        File the live samples are recorded to: the output file name followed by
+        "_live", in the binary stream format if the output file is binary.
+        None if no file name or output folder was set, the folder of the code
+        shown by default is never recorded to.
+        """
+        import binlog
+        import streamlog
+        filename = self.file_name_line.text().strip()
+        folder = self.output_folder_line.text().strip()
+        if not filename or not folder or os.path.realpath(folder) == self.base_path:
+            return None
+        stem, extension = os.path.splitext(filename)
+        if extension.lower() == binlog.EXTENSION:
+            extension = streamlog.EXTENSION
+        return os.path.join(folder, f"{stem}_live{extension}")
+
+    def show_plot(self):
+        """
+        Creates the plot on first use and starts redrawing it periodically.
+        """
+        if self.plot is None:
+            from liveplot import LivePlot
+            self.plot = LivePlot(self.plot_layout)
+            self.plot_timer.setInterval(1000 // LivePlot.MAX_FPS)
+            self.plot_timer.start()
+        return self.plot
+
+    def update_plot(self):
+        """
+        Adds the new live samples to the plot and redraws it. Called by plot_timer,
+        the plot itself skips frames when nothing changed or drawing is too slow.
+        """
+        if self.plot is None:
+            return
+        if self.stream_consumer is not None:
+            timestamps, adc_vals = self.stream_consumer.read()
+            if len(timestamps):
+                if self.live_start is None:
+                    self.live_start = timestamps[0]
+                if self.live_writer is not None:
+                    try:
+                        self.live_writer.write(timestamps, adc_vals)
+                    except OSError:
+                        self.discard_live_writer()
+                        self.update_status_txt("Error recording the live data.")
+                tq_vals = self.calibration.convert(adc_vals)
+                self.plot.append(timestamps - self.live_start, tq_vals)
+                self.peak_valley.process(tq_vals)
+                self.update_values_txt()
+        self.plot.refresh()
+
+    def update_download_progress(self, sample_count, rate):
+        """
+        Shows the progress of the data log download.
+        """
+        self.update_status_txt(f"Sample {sample_count} ({rate:.0f} samples/s)")
 
     def save_data(self):
         """
         Saves the data stored in the arrays.
+        File names ending with binlog.EXTENSION are saved in the binary format,
+        the others as tab-separated text.
         """
+        import numpy as np
+
+        import binlog
         try:
             output_folder = self.output_folder_line.text()
             create_output_folder(output_folder)
             filename = self.file_name_line.text()
             filepath = os.path.join(output_folder, filename)
+            if filename.lower().endswith(binlog.EXTENSION):
+                binlog.write_binlog(
+                    filepath, self.tim_vals, self.adc_vals, self.tq_vals,
+                    serial=self.calibration.serial, **self.calibration.registers
+                )
+                self.update_status_txt(f"Data saved: {filepath}")
+                return
             cols = np.column_stack((self.tim_vals, self.adc_vals, self.tq_vals))
             format = ["%i", "%i", "%f"]
             header = f"Time(ms)\tADC Count\tTorque (N.cm)"
@@ -249,6 +582,19 @@ class MainWindow(QMainWindow):
             os.path.join(folder, "")  # OS independent separator
             self.output_folder_line.setText(folder)
 
+    def update_values_txt(self):
+        """
+        Shows the track, peak and valley torque.
+        """
+        values = self.peak_valley
+        if values is None or values.track is None:
+            self.values_label.setText("")
+            return
+        self.values_label.setText(
+            f"Track {values.track:.2f}   Peak {values.peak:.2f}   "
+            f"Valley {values.valley:.2f} N.cm"
+        )
+
     def update_status_txt(self, text=""):
         """
         Updates the gui status_lable.
@@ -258,54 +604,12 @@ class MainWindow(QMainWindow):
     def check_device_status(self, status=18):
         """
         Checks the device status according to the list of possible statuses on the 
-        programmers guide.
+        programmers guide, see session.STATUS_MESSAGES.
         Returns True if OK, False otherwise.
         """
-        msg = "Other Error"
-        if status == 0:
-            msg = "OK"
-            self.update_status_txt(msg)
-            return True
-        elif status == 1:
-            msg = "Invalid Handle"
-        elif status == 2:
-            msg = "Device Not Found"
-        elif status == 3:
-            msg = "Device Not Opened "
-        elif status == 4:
-            msg = " IO Error "
-        elif status == 5:
-            msg = "Insufficient Resources"
-        elif status == 6:
-            msg = "Invalid Parameter"
-        elif status == 7:
-            msg = "Invalid Baud Rate"
-        elif status == 8:
-            msg = "Device Not Opened For Erase"
-        elif status == 9:
-            msg = "Device Not Opened For Write"
-        elif status == 10:
-            msg = "Failed to Write Device"
-        elif status == 11:
-            msg = "EEPROM Read Failed"
-        elif status == 12:
-            msg = "EEPROM Write Failed"
-        elif status == 13:
-            msg = "EEPROM Erased Failed"
-        elif status == 14:
-            msg = "EEPROM Not Present"
-        elif status == 15:
-            msg = "EEPROM Not Programmed"
-        elif status == 16:
-            msg = "Invalid Arguments"
-        elif status == 17:
-            msg = "Not Supported"
-        elif status == 19:
-            msg = "Device List Not Ready"
-        else:
-            msg = "Other Error"
-        self.update_status_txt(msg)
-        return False
+        from session import status_message
+        self.update_status_txt(status_message(status))
+        return status == 0
 
 
 def create_output_folder(folder):
@@ -314,39 +618,6 @@ def create_output_folder(folder):
     """
     if not os.path.exists(folder):
         os.makedirs(folder)
-        
-def DA_convert(
-    track_d_val, offset_d, fullscale_d, reverse_fullscale_d, fullscale_load_a
-):
-    """
-    Converts a digital value (or array) to a float value.
-    variables with _d are digital, integer in the ADC range (16-bit usually)
-    variables with _a are analog, float.
-    Inputs:
-    track_d_val: Measurement, named "Tracking ADC Value" by FUTEK's software.
-                Corresponds to the measured ADC value, integer.
-    offset_d: Offset of the ADC circuit, corresponds to the zero of analog range.
-    fullscale_d: ADC value corresponding to fullscale_load_a
-    reverse_fullscale_d: ADC value corresponding to a negative fullscale_load_a
-    fullscale_load_a: Calibrated limit of the measurement scale.
-
-    Output: Converted analog value in the same units as fullscale_load_a.
-
-    The conversion formula is:
-    output = fullscale_load_a * (track_d_val-offset_d) / (fs-offset_d)
-    where:
-        fs = fullscale_d if track_d_val-offset > 0
-        fs = reverse_fullscale_d if track_d_val-offset < 0
-
-    """
-    output = np.zeros(len(track_d_val), dtype=np.float64)
-    track_d = fullscale_load_a * (np.asarray(track_d_val, dtype=np.float64) - offset_d)
-    for i, val in enumerate(track_d):
-        if val > 0:
-            output[i] = val / (fullscale_d - offset_d)
-        else:
-            output[i] = val / (offset_d - reverse_fullscale_d)
-    return output
 
 
 if __name__ == '__main__':
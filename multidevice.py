@@ -0,0 +1,188 @@
+"""
+Acquisition from several IHH500 at once.
+DeviceManager opens every device by serial number and gives each one its own
+worker thread (a single-thread executor that opens the connection and makes every
+DLL call, since the DLL must be used from the thread that owns the device) and its
+own buffers. Log downloads and live streaming then run on all devices concurrently.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datalog import download_data_log
+from logstore import sync_data_log
+from streaming import StreamingAcquisition
+
+
+def discover_serials(usb_dll):
+    """
+    Returns the serial numbers of the connected devices.
+    usb_dll: USB_DLL class of the backend (see device.load_usb_dll).
+    """
+    dev = usb_dll()
+    device_count = int(dev.Get_Device_Count())
+    serials = []
+    for index in range(device_count):
+        serial = dev.Get_Device_Serial_Number(str(index))
+        if serial != "Error":
+            serials.append(serial)
+    return serials
+
+
+class DeviceWorker:
+    """
+    One device, its USB_DLL instance and the thread that uses it.
+    """
+    def __init__(self, usb_dll, serial):
+        self.serial = serial
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"IHH-{serial}")
+        self.dev = None
+        self.handle = None
+        self.acquisition = None
+        # Results of the last download
+        self.tim_vals = None
+        self.adc_vals = None
+        self.download_time = 0.0
+        try:
+            self.executor.submit(self._open, usb_dll).result()
+        except Exception:
+            self.executor.shutdown()
+            raise
+
+    def _open(self, usb_dll):
+        """
+        Opens the connection from the worker thread.
+        """
+        self.dev = usb_dll()
+        self.dev.Open_Device_Connection(self.serial)
+        self.handle = self.dev.DeviceHandle
+        if self.dev.DeviceStatus != 0:
+            raise ConnectionError(
+                f"Device {self.serial} not opened, status {self.dev.DeviceStatus}."
+            )
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs func(dev, handle, *args, **kwargs) on the worker thread and returns
+        its Future.
+        """
+        return self.executor.submit(func, self.dev, self.handle, *args, **kwargs)
+
+    def download(self, progress=None, store=None):
+        """
+        Starts downloading the data log, returns a Future of (tim_vals, adc_vals).
+        progress is called as progress(serial, samples_read, total, rate).
+        store: Optional logstore.LogStore, only the samples it doesn't hold yet are
+               downloaded.
+        """
+        def run(dev, handle):
+            device_progress = None
+            if progress is not None:
+                def device_progress(count, total, rate):
+                    progress(self.serial, count, total, rate)
+            start = time.perf_counter()
+            if store is None:
+                self.tim_vals, self.adc_vals = download_data_log(
+                    dev, handle, progress=device_progress
+                )
+            else:
+                self.tim_vals, self.adc_vals = sync_data_log(
+                    dev, handle, self.serial, store, progress=device_progress
+                )
+            self.download_time = time.perf_counter() - start
+            return self.tim_vals, self.adc_vals
+        return self.submit(run)
+
+    def start_streaming(self, **kwargs):
+        """
+        Starts polling the live value on the worker thread. kwargs are passed to
+        StreamingAcquisition.
+        """
+        self.acquisition = StreamingAcquisition(self.dev, self.handle, **kwargs)
+        self.acquisition.start(executor=self.executor)
+        return self.acquisition
+
+    def stop_streaming(self):
+        if self.acquisition is not None:
+            self.acquisition.stop()
+
+    def close(self):
+        """
+        Stops the streaming, closes the connection and the worker thread.
+        """
+        self.stop_streaming()
+        if self.dev is not None:
+            self.submit(lambda dev, handle: dev.Close_Device_Connection(handle)).result()
+        self.executor.shutdown()
+
+
+class DeviceManager:
+    """
+    Opens and drives a bench of devices concurrently.
+    """
+    def __init__(self, usb_dll):
+        """
+        usb_dll: USB_DLL class of the backend (see device.load_usb_dll).
+        """
+        self.usb_dll = usb_dll
+        self.workers = {}
+
+    def open(self, serials=None):
+        """
+        Opens the devices with the given serial numbers, or every connected device
+        if serials is None. Returns the serial numbers opened.
+        """
+        if serials is None:
+            serials = discover_serials(self.usb_dll)
+        for serial in serials:
+            if serial not in self.workers:
+                self.workers[serial] = DeviceWorker(self.usb_dll, serial)
+        return list(self.workers)
+
+    def download_logs(self, progress=None, store=None):
+        """
+        Downloads the logs of all the devices concurrently, only the samples that
+        are not in store yet if a logstore.LogStore is given.
+        Returns a dict serial: (tim_vals, adc_vals).
+        """
+        futures = {
+            serial: worker.download(progress, store)
+            for serial, worker in self.workers.items()
+        }
+        return {serial: future.result() for serial, future in futures.items()}
+
+    def start_streaming(self, **kwargs):
+        """
+        Starts the live acquisition of all the devices.
+        """
+        for worker in self.workers.values():
+            worker.start_streaming(**kwargs)
+
+    def stop_streaming(self):
+        for worker in self.workers.values():
+            worker.stop_streaming()
+
+    def stats(self):
+        """
+        Per-device statistics and the aggregate throughput.
+        Returns a dict with "devices" (serial: stats) and the totals "download_rate"
+        and "stream_rate" in samples/s.
+        """
+        devices = {}
+        download_rate = 0.0
+        stream_rate = 0.0
+        for serial, worker in self.workers.items():
+            device_stats = {}
+            if worker.tim_vals is not None and worker.download_time > 0:
+                device_stats["download_samples"] = len(worker.tim_vals)
+                device_stats["download_rate"] = len(worker.tim_vals) / worker.download_time
+                download_rate += device_stats["download_rate"]
+            if worker.acquisition is not None:
+                device_stats["stream"] = worker.acquisition.stats()
+                stream_rate += device_stats["stream"]["rate"]
+            devices[serial] = device_stats
+        return {"devices": devices, "download_rate": download_rate, "stream_rate": stream_rate}
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.close()
+        self.workers.clear()
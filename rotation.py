@@ -0,0 +1,194 @@
+"""
+Torque and rotation sampled together.
+The IHH500 returns the torque with Normal_Data_Request and the shaft speed and
+angle with Get_Rotation_Values, which updates the RPMValue and AngleValue
+properties (read locally, without a round trip). A sampling cycle therefore costs
+two round trips, made one after the other by RotationAcquisition, and the
+angle is moved to the instant of the torque reading with the speed, so both
+channels share one timestamp. The speed changes slowly compared with the torque,
+so rotation_every can read it only every few cycles, extrapolating the angle
+meanwhile, which brings a cycle close to a single round trip. Given a
+DeviceSession, both requests are sent through it like in StreamingAcquisition, so
+a lost link is opened again instead of ending the acquisition.
+The samples are stored in the RingBuffer as SAMPLE_DTYPE records, and
+RotationChannels adds the derived channels: torque, cumulative angle and
+mechanical power. torque_angle_curve extracts the torque-angle curve of a
+tightening, used to test fasteners.
+"""
+import time
+
+import numpy as np
+
+from streaming import StreamingAcquisition
+
+# Values of the ring buffer: ADC count, speed (rpm) and angle (degrees, 0 to 360)
+SAMPLE_DTYPE = np.dtype([("adc", np.int64), ("rpm", np.float64), ("angle", np.float64)])
+# Samples with the derived channels: time (s), torque (N.cm), cumulative angle
+# since the first sample (degrees) and mechanical power (W)
+CHANNELS_DTYPE = np.dtype([
+    ("time", np.float64), ("adc", np.int64), ("torque", np.float64),
+    ("rpm", np.float64), ("angle", np.float64), ("power", np.float64),
+])
+
+
+class RotationAcquisition(StreamingAcquisition):
+    """
+    Polls the torque and the rotation values of a device on a worker thread, one
+    SAMPLE_DTYPE record per torque reading.
+    """
+    VALUE_DTYPE = SAMPLE_DTYPE
+
+    def __init__(self, dev, handle, channel=2, capacity=1 << 20, fast=False, interval=0.0,
+                 rotation_every=1, session=None):
+        """
+        rotation_every: Number of torque readings per Get_Rotation_Values.
+        The other arguments are those of StreamingAcquisition.
+        """
+        super().__init__(dev, handle, channel, capacity, fast, interval, session=session)
+        self.rotation_every = rotation_every
+        # Get_Rotation_Values calls, and those that failed
+        self.rotation_reads = 0
+        self.rotation_errors = 0
+        # Sum of the time between each torque reading and the rotation reading its
+        # angle was extrapolated from (s)
+        self._extrapolated = 0.0
+
+    def _poll(self):
+        """
+        Sends the rotation and torque requests until stop is called.
+        """
+        dev = self.dev
+        request = self._request_function()
+        get_rotation = self._command_function("Get_Rotation_Values")
+        channel = self.channel
+        append = self.buffer.append
+        latencies = self._latencies
+        window = self.LATENCY_WINDOW
+        clock = time.perf_counter
+        next_request = clock()
+        cycle = 0
+        rpm = angle = rotation_time = None
+        while self._running.is_set():
+            if self.interval > 0:
+                delay = next_request - clock()
+                if delay > 0:
+                    time.sleep(delay)
+                next_request = max(next_request + self.interval, clock())
+            if cycle % self.rotation_every == 0:
+                sent = clock()
+                response = get_rotation()
+                received = clock()
+                self.rotation_reads += 1
+                if response == "Error":
+                    self.rotation_errors += 1
+                else:
+                    rpm = float(dev.RPMValue)
+                    angle = float(dev.AngleValue)
+                    rotation_time = (sent + received) / 2
+            cycle += 1
+            sent = clock()
+            response = request(channel)
+            received = clock()
+            latencies[self._n_latencies % window] = received - sent
+            self._n_latencies += 1
+            try:
+                value = int(response)
+            except (TypeError, ValueError):  # "Error"
+                self.dropped += 1
+                continue
+            if rpm is None:  # No rotation values yet
+                self.dropped += 1
+                continue
+            timestamp = (sent + received) / 2
+            elapsed = timestamp - rotation_time
+            self._extrapolated += elapsed
+            # rpm * 6 is the speed in degrees per second
+            append(timestamp, (value, rpm, (angle + rpm * 6 * elapsed) % 360))
+
+    def stats(self):
+        """
+        Adds to the StreamingAcquisition statistics the Get_Rotation_Values calls,
+        their failures and the mean time the angles were extrapolated over (ms).
+        """
+        stats = super().stats()
+        stats["rotation_reads"] = self.rotation_reads
+        stats["rotation_errors"] = self.rotation_errors
+        samples = self.buffer.written
+        stats["extrapolated"] = self._extrapolated / samples * 1000 if samples else 0.0
+        return stats
+
+
+class RotationChannels:
+    """
+    Derives the channels of CHANNELS_DTYPE from consecutive blocks of samples,
+    unwrapping the angle from one block to the next.
+    """
+    def __init__(self, calibration, torque_scale=0.01):
+        """
+        calibration: Calibration converting the ADC values to torque.
+        torque_scale: Torque unit in N.m, 0.01 for N.cm.
+        """
+        self.calibration = calibration
+        self.torque_scale = torque_scale
+        self.reset()
+
+    def reset(self):
+        # Unwrapped angle of the previous sample and of the first one, the origin
+        # of the cumulative angle, None before the first sample
+        self._angle = None
+        self._origin = None
+
+    def process(self, timestamps, samples):
+        """
+        Returns the CHANNELS_DTYPE array of a block of SAMPLE_DTYPE samples.
+        """
+        channels = np.empty(len(samples), dtype=CHANNELS_DTYPE)
+        if not len(samples):
+            return channels
+        channels["time"] = timestamps
+        channels["adc"] = samples["adc"]
+        self.calibration.convert(samples["adc"], out=channels["torque"])
+        channels["rpm"] = samples["rpm"]
+        if self._angle is None:
+            self._angle = self._origin = samples["angle"][0]
+        # np.unwrap adds the turns, assuming the shaft turns less than half a turn
+        # between two samples
+        unwrapped = np.unwrap(np.concatenate(([self._angle], samples["angle"])), period=360)
+        self._angle = unwrapped[-1]
+        np.subtract(unwrapped[1:], self._origin, out=channels["angle"])
+        # P = T * omega, with omega = rpm * 2 pi / 60 in rad/s
+        np.multiply(channels["torque"], channels["rpm"], out=channels["power"])
+        channels["power"] *= self.torque_scale * 2 * np.pi / 60
+        return channels
+
+
+def torque_angle_curve(angle, torque, snug_torque, resolution=None):
+    """
+    Torque-angle curve of a tightening: the angle turned since the torque first
+    reached snug_torque (the seating of the fastener), and the torque.
+    Inputs:
+    angle: Cumulative angle (degrees), e.g. the "angle" of RotationChannels.
+    torque: Torque of the same samples.
+    snug_torque: Torque where the angle count starts.
+    resolution: If given, the curve is resampled to one point every resolution
+                degrees, keeping the highest torque (in absolute value) of each
+                interval.
+    Output: (angle, torque) arrays, empty if snug_torque is never reached.
+    """
+    angle = np.asarray(angle, dtype=np.float64)
+    torque = np.asarray(torque, dtype=np.float64)
+    reached = np.flatnonzero(np.abs(torque) >= abs(snug_torque))
+    if not len(reached):
+        return np.empty(0), np.empty(0)
+    start = reached[0]
+    curve_angle = np.abs(angle[start:] - angle[start])
+    curve_torque = torque[start:]
+    if resolution is None:
+        return curve_angle, curve_torque
+    # Tightening counterclockwise gives a negative torque
+    sign = 1.0 if torque[start] >= 0 else -1.0
+    bins = (curve_angle // resolution).astype(np.int64)
+    peak = np.full(int(bins.max()) + 1, -np.inf)
+    np.maximum.at(peak, bins, sign * curve_torque)
+    filled = np.isfinite(peak)
+    return np.flatnonzero(filled) * resolution, sign * peak[filled]
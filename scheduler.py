@@ -0,0 +1,239 @@
+"""
+Adaptive polling of the live value.
+AdaptiveScheduler chooses the interval between two Normal_Data_Request calls from
+the outcome of the previous ones. It lengthens the interval as soon as the
+failures of the current window of requests exceed the allowed rate, and shortens
+it after every window without: quickly down to the interval that last failed,
+then in small steps, like the congestion control of TCP. Once a whole window
+succeeds below the failed interval, the limit is forgotten and the fast probing
+resumes. A request fails when it returns "Error" or leaves DeviceStatus non-zero.
+The polling rate thus settles close to the highest rate the USB link and the
+device sustain, and follows them when they change.
+AdaptiveAcquisition is a StreamingAcquisition driven by the scheduler. While
+paused, it only sends Slave_Activity_Inquiry from time to time, a heartbeat that
+tells whether the device is still answering. Given a DeviceSession, a heartbeat
+that finds the link lost reopens it at once, so the device is ready again when
+polling resumes.
+"""
+import threading
+import time
+from collections import deque
+
+from streaming import StreamingAcquisition
+
+
+class AdaptiveScheduler:
+    """
+    Interval between two requests (s), from their latency and failures.
+    """
+    def __init__(self, max_error_rate=0.01, window=100, min_interval=0.0, max_interval=0.5,
+                 probe=0.8, fine_probe=0.98, backoff=1.25, smoothing=0.05, history=1024):
+        """
+        max_error_rate: Fraction of failed requests allowed.
+        window: Requests between two shortenings of the interval.
+        min_interval, max_interval: Limits of the interval, 0 polls back to back.
+        probe: Factor applied to the interval after a window without too many
+               failures, while the result stays above the interval that last
+               failed.
+        fine_probe: Factor used instead of probe near and below the interval that
+                    last failed.
+        backoff: Factor applied to the interval when the failures of a window
+                 exceed max_error_rate.
+        smoothing: Weight of each new latency in the moving average.
+        history: Number of interval changes kept in history.
+        """
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.probe = probe
+        self.fine_probe = fine_probe
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.interval = min_interval
+        # Exponential moving average of the latency of the successful requests (s)
+        self.latency = None
+        self.requests = 0
+        self.errors = 0
+        self.backoffs = 0
+        # (time.perf_counter, interval, latency) at each change of the interval
+        self.history = deque(maxlen=history)
+        self._window_requests = 0
+        self._window_errors = 0
+        # Interval (or latency, if longer) of the last back-off, None if forgotten
+        self._failed = None
+
+    @property
+    def rate(self):
+        """
+        Requests per second at the current interval and latency.
+        """
+        period = max(self.interval, self.latency or 0.0)
+        return 1 / period if period > 0 else 0.0
+
+    def record(self, latency, ok):
+        """
+        Records the outcome of a request and returns the interval to wait between
+        its start and the start of the next one.
+        """
+        self.requests += 1
+        self._window_requests += 1
+        if ok:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+        else:
+            self.errors += 1
+            self._window_errors += 1
+        if self._window_errors > self.max_error_rate * self.window:
+            # Backs off at once, without waiting for the end of the window. Below
+            # the latency the interval has no effect, so it is the starting point
+            self.backoffs += 1
+            self._failed = max(self.interval, latency, 1E-4)
+            self._set_interval(min(self._failed * self.backoff, self.max_interval))
+        elif self._window_requests >= self.window:
+            if self._failed is not None and self.interval < self._failed:
+                # A whole window succeeded faster than the interval that failed:
+                # the device or the link got faster
+                self._failed = None
+            if self._failed is None or self.interval * self.probe > self._failed:
+                interval = self.interval * self.probe
+            else:
+                interval = self.interval * self.fine_probe
+            self._set_interval(max(interval, self.min_interval))
+        return self.interval
+
+    def _set_interval(self, interval):
+        if interval != self.interval:
+            self.interval = interval
+            self.history.append((time.perf_counter(), interval, self.latency))
+        self._window_requests = 0
+        self._window_errors = 0
+
+    def stats(self):
+        """
+        Returns a dict with the current interval (ms), the polling rate (Hz), the
+        average latency (ms), the fraction of failed requests and the number of
+        back-offs.
+        """
+        return {
+            "interval": self.interval * 1000,
+            "polling_rate": self.rate,
+            "latency_average": (self.latency or 0.0) * 1000,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "backoffs": self.backoffs,
+        }
+
+
+class AdaptiveAcquisition(StreamingAcquisition):
+    """
+    StreamingAcquisition whose polling interval is chosen by an AdaptiveScheduler,
+    and that sends heartbeats while paused.
+    """
+    def __init__(self, dev, handle, channel=2, capacity=1 << 20, fast=False, scheduler=None,
+                 heartbeat_interval=1.0, session=None):
+        """
+        scheduler: AdaptiveScheduler, one with the default settings if None.
+        heartbeat_interval: Time between two Slave_Activity_Inquiry while paused (s).
+        The other arguments are those of StreamingAcquisition.
+        """
+        super().__init__(dev, handle, channel, capacity, fast, session=session)
+        self.scheduler = scheduler if scheduler is not None else AdaptiveScheduler()
+        self.interval = self.scheduler.interval
+        self.heartbeat_interval = heartbeat_interval
+        # Heartbeats sent, and whether the last one was answered
+        self.heartbeats = 0
+        self.alive = True
+        self._paused = False
+        self._wake = threading.Event()
+
+    def pause(self):
+        """
+        Stops polling the live value, only sending heartbeats.
+        """
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+        self._wake.set()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def stop(self, wait=True):
+        self._running.clear()
+        self._wake.set()
+        super().stop(wait)
+
+    def _poll(self):
+        """
+        Sends the requests at the interval of the scheduler, or the heartbeats
+        while paused, until stop is called.
+        """
+        dev = self.dev
+        request = self._request_function()
+        channel = self.channel
+        append = self.buffer.append
+        record = self.scheduler.record
+        latencies = self._latencies
+        window = self.LATENCY_WINDOW
+        clock = time.perf_counter
+        next_request = clock()
+        while self._running.is_set():
+            if self._paused:
+                self._heartbeat()
+                next_request = clock()
+                continue
+            delay = next_request - clock()
+            if delay > 0:
+                time.sleep(delay)
+            sent = clock()
+            response = request(channel)
+            received = clock()
+            latencies[self._n_latencies % window] = received - sent
+            self._n_latencies += 1
+            try:
+                value = int(response)
+                ok = dev.DeviceStatus == 0
+            except (TypeError, ValueError):  # "Error"
+                value = None
+                ok = False
+            self.interval = record(received - sent, ok)
+            next_request = sent + self.interval
+            if value is None:
+                self.dropped += 1
+                continue
+            # The sample is timestamped halfway through the round trip
+            append((sent + received) / 2, value)
+
+    def _heartbeat(self):
+        """
+        Sends one Slave_Activity_Inquiry, then waits for the next one or resume.
+        With a session, a lost link is reconnected before waiting, raising
+        ReconnectError if the device doesn't come back.
+        """
+        session = self.session
+        if session is None:
+            self.alive = self.dev.Slave_Activity_Inquiry(self.handle) != "Error" \
+                and self.dev.DeviceStatus == 0
+        else:
+            self.alive = session.check()
+            if not self.alive and (not session.connected or session.link_lost()):
+                if session.reconnect(self._stopping) is not None:
+                    self.alive = session.check()
+        self.heartbeats += 1
+        self._wake.wait(self.heartbeat_interval)
+        self._wake.clear()
+
+    def stats(self):
+        """
+        Adds to the StreamingAcquisition statistics those of the scheduler, the
+        heartbeats sent and whether the device answered the last one.
+        """
+        stats = super().stats()
+        stats.update(self.scheduler.stats())
+        stats["heartbeats"] = self.heartbeats
+        stats["alive"] = self.alive
+        return stats
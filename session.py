@@ -0,0 +1,266 @@
+"""
+Long-lived connection to one IHH500.
+DeviceSession keeps the USB_DLL instance and the serial number of the device, so
+that a connection lost to a USB hiccup (a loose cable, a hub reset, the device
+rebooting) is opened again by serial number instead of by the operator. A lost
+link shows in DeviceStatus (see LINK_ERROR_STATUSES): the session closes the stale
+handle and retries Open_Device_Connection with an exponential backoff, bounded by
+max_delay between two attempts and by timeout in total. The commands sent through
+call are replayed once the device is back, and download_log resumes the data log
+download at the first sample that was not read.
+The time taken by each recovery is kept, so how quickly the link comes back can be
+measured (see benchmarks/bench_reconnect.py).
+"""
+import threading
+import time
+
+import numpy as np
+
+from datalog import (
+    LINK_ERROR_STATUSES, DataLogCancelled, DataLogConnectionError, DataLogError,
+    download_data_log
+)
+from logstore import sync_data_log
+
+# Messages of the DeviceStatus codes, from FUTEK's programmer's guide
+STATUS_MESSAGES = {
+    0: "OK",
+    1: "Invalid Handle",
+    2: "Device Not Found",
+    3: "Device Not Opened",
+    4: "IO Error",
+    5: "Insufficient Resources",
+    6: "Invalid Parameter",
+    7: "Invalid Baud Rate",
+    8: "Device Not Opened For Erase",
+    9: "Device Not Opened For Write",
+    10: "Failed to Write Device",
+    11: "EEPROM Read Failed",
+    12: "EEPROM Write Failed",
+    13: "EEPROM Erased Failed",
+    14: "EEPROM Not Present",
+    15: "EEPROM Not Programmed",
+    16: "Invalid Arguments",
+    17: "Not Supported",
+    19: "Device List Not Ready",
+}
+
+
+def status_message(status):
+    """
+    Returns the message of a DeviceStatus code.
+    """
+    return STATUS_MESSAGES.get(status, "Other Error")
+
+
+class ReconnectError(ConnectionError):
+    """
+    Raised when the device can't be opened again before the session timeout.
+    """
+
+
+def _failed(response):
+    """
+    True if a command returned "Error". Some commands return other types.
+    """
+    return isinstance(response, str) and response == "Error"
+
+
+class DeviceSession:
+    """
+    Connection to the device with a given serial number, reopened automatically
+    when the link is lost. A lock serializes the commands sent through the
+    session, so it can be shared by several threads.
+    """
+    def __init__(self, dev, serial, initial_delay=0.05, max_delay=0.5, timeout=10.0,
+                 max_replays=3):
+        """
+        dev: USB_DLL instance, kept for the whole session.
+        serial: Serial number of the device.
+        initial_delay: Wait after the first failed reconnection attempt (s), doubled
+                       after each following one up to max_delay.
+        timeout: Time after which reconnect gives up (s).
+        max_replays: Number of times call replays a command whose link failed.
+        """
+        self.dev = dev
+        self.serial = str(serial)
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_replays = max_replays
+        self.handle = 0
+        self.connected = False
+        # Links lost, reconnections that succeeded, commands replayed, and the
+        # duration of each recovery (s)
+        self.drops = 0
+        self.reconnects = 0
+        self.replayed = 0
+        self.recovery_times = []
+        self._lock = threading.RLock()
+
+    @property
+    def status(self):
+        return self.dev.DeviceStatus
+
+    def link_lost(self):
+        """
+        True if the last command failed because the device no longer answers.
+        """
+        return self.dev.DeviceStatus in LINK_ERROR_STATUSES
+
+    def open(self):
+        """
+        Opens the connection. Returns True if the device answered.
+        """
+        with self._lock:
+            self.dev.Open_Device_Connection(self.serial)
+            self.handle = self.dev.DeviceHandle
+            self.connected = self.dev.DeviceStatus == 0
+            return self.connected
+
+    def close(self):
+        """
+        Closes the connection. A handle invalidated by a lost link is simply
+        forgotten.
+        """
+        with self._lock:
+            if self.handle:
+                self.dev.Close_Device_Connection(self.handle)
+            self.handle = 0
+            self.connected = False
+
+    def check(self):
+        """
+        Heartbeat: returns True if the device answers Slave_Activity_Inquiry.
+        """
+        with self._lock:
+            if not self.connected:
+                return False
+            return not _failed(self.dev.Slave_Activity_Inquiry(self.handle)) \
+                and self.dev.DeviceStatus == 0
+
+    def reconnect(self, cancel=None):
+        """
+        Closes the lost connection and opens it again, retrying with an exponential
+        backoff. Returns the time it took (s), or None if cancel (a threading.Event)
+        was set meanwhile.
+        Raises ReconnectError after timeout seconds without success.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            self.drops += 1
+            self.close()
+            delay = self.initial_delay
+            # The first attempt is immediate, most hiccups are already over
+            while not self.open():
+                elapsed = time.perf_counter() - started
+                if elapsed >= self.timeout:
+                    raise ReconnectError(
+                        f"Device {self.serial} not found again after {elapsed:.1f} s "
+                        f"({status_message(self.dev.DeviceStatus)})."
+                    )
+                wait = min(delay, self.timeout - elapsed)
+                if cancel is None:
+                    time.sleep(wait)
+                elif cancel.wait(wait):
+                    return None
+                delay = min(delay * 2, self.max_delay)
+            recovery = time.perf_counter() - started
+            self.reconnects += 1
+            self.recovery_times.append(recovery)
+            return recovery
+
+    def call(self, command, *args, cancel=None):
+        """
+        Sends a command taking the handle as first argument, e.g.
+        call("Normal_Data_Request", 2), and returns its response. If the link is
+        lost, reconnects and sends the command again. Raises ReconnectError if the
+        device doesn't come back.
+        cancel: Optional threading.Event stopping the reconnection, the failed
+                response is then returned.
+        """
+        with self._lock:
+            for replay in range(self.max_replays + 1):
+                if replay:
+                    if self.reconnect(cancel) is None:
+                        break
+                    self.replayed += 1
+                response = getattr(self.dev, command)(self.handle, *args)
+                if not (_failed(response) and self.link_lost()):
+                    break
+            return response
+
+    def download_log(self, store=None, cancel=None, on_drop=None, max_drops=None, **kwargs):
+        """
+        Downloads the data log, reconnecting and resuming the download whenever the
+        link is lost.
+        store: LogStore, the download is synced with it (see sync_data_log), so only
+               the samples missing from the store are read. Without a store, the
+               samples read before a drop are kept in memory.
+        cancel: Optional threading.Event stopping the download, or the reconnection,
+                with DataLogCancelled.
+        on_drop: Optional callable on_drop(error), called before reconnecting.
+        max_drops: Number of drops after which the DataLogConnectionError is raised,
+                   unlimited if None.
+        kwargs are passed to download_data_log (progress, block_size, ...).
+        Returns the time and ADC arrays of the whole log, like download_data_log.
+        """
+        # Samples of the attempts cut short by a drop
+        tim_parts, adc_parts = [], []
+        drops = 0
+        while True:
+            tim_attempt, adc_attempt = [], []
+
+            def keep(tim_block, adc_block):
+                tim_attempt.append(tim_block.copy())
+                adc_attempt.append(adc_block.copy())
+
+            try:
+                with self._lock:
+                    if store is not None:
+                        return sync_data_log(
+                            self.dev, self.handle, self.serial, store, cancel=cancel, **kwargs
+                        )
+                    resume = {}
+                    count = sum(len(part) for part in tim_parts)
+                    # The sampling period comes from the first two samples read
+                    if count >= 2:
+                        first = np.concatenate(tim_parts)[:2]
+                        resume = dict(start=count, previous_t=tim_parts[-1][-1],
+                                      t_delta_base=first[1] - first[0])
+                    else:
+                        tim_parts, adc_parts = [], []
+                    tim_vals, adc_vals = download_data_log(
+                        self.dev, self.handle, sink=keep, cancel=cancel, **resume, **kwargs
+                    )
+                    return (np.concatenate(tim_parts + [tim_vals]),
+                            np.concatenate(adc_parts + [adc_vals]))
+            except DataLogCancelled:
+                raise
+            except DataLogError as error:
+                # Reading the sampling period fails with a DataLogError as well
+                if not (isinstance(error, DataLogConnectionError) or self.link_lost()):
+                    raise
+                drops += 1
+                if max_drops is not None and drops > max_drops:
+                    raise
+                tim_parts += tim_attempt
+                adc_parts += adc_attempt
+                if on_drop is not None:
+                    on_drop(error)
+                if self.reconnect(cancel) is None:
+                    raise DataLogCancelled("Download cancelled while reconnecting.")
+
+    def stats(self):
+        """
+        Returns a dict with the links lost, the reconnections, the commands
+        replayed and the mean and longest recovery times (s).
+        """
+        times = self.recovery_times
+        return {
+            "drops": self.drops,
+            "reconnects": self.reconnects,
+            "replayed": self.replayed,
+            "recovery_mean": sum(times) / len(times) if times else 0.0,
+            "recovery_max": max(times, default=0.0),
+        }
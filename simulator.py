@@ -0,0 +1,455 @@
+"""
+Pure-Python stand-in for FUTEK_USB_DLL.USB_DLL.
+It implements the subset of the DLL used by this project, with the same method and
+property names, so the acquisition code can run and be benchmarked on any OS
+without an IHH500 attached.
+Every method that talks to the device in the real DLL waits for a configurable
+latency plus a random jitter, emulating the USB round trip. Property reads
+(DeviceStatus, DataLogging_Value1, ...) are local in the real DLL and cost nothing
+here as well.
+Devices can replay recorded .dat logs, both through the data logging commands and
+as the live value returned by Normal_Data_Request.
+Faults can be injected: a device can be unplugged after a number of round trips
+and plugged back later (SimulatedDevice.drop_after), invalidating its handles.
+"""
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from binlog import read_text_log
+from device import DeviceBackend
+
+# Log recorded with an IHH500, replayed by the default simulated device
+SAMPLE_LOG = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "Master Flash HI Porous RP 5,0x13,0 01 torque.dat",
+)
+
+# Simulated devices that are "plugged in", indexed by serial number
+_devices = {}
+
+
+class SimulatedDevice:
+    """
+    State of one simulated IHH500: calibration registers, the data logging memory
+    and the USB round trip latency.
+    """
+    def __init__(
+        self, serial="479586", tim_vals=None, adc_vals=None, offset_d=8388608,
+        fullscale_d=12582912, reverse_fullscale_d=4194304, fullscale_load=500000,
+        latency=0.0, jitter=0.0, memory_size=None, seed=0, fast_logging=True,
+        min_interval=0.0
+    ):
+        """
+        serial: Serial number used by Open_Device_Connection.
+        tim_vals, adc_vals: Logged samples (elapsed ms and ADC counts). A synthetic
+            20 ms log of 1000 samples is generated if omitted.
+        fullscale_load: Register 0x05, the fullscale load without the decimal point.
+        latency: Minimum duration of each simulated USB round trip, in seconds.
+        jitter: Mean of the exponentially distributed delay added to the latency.
+        memory_size: Number of samples of the logging memory. Addresses beyond the
+            logged samples read as zeros (see fill_memory), addresses beyond the
+            memory are an error.
+        seed: Seed of the jitter, so that benchmark runs are repeatable.
+        fast_logging: If False, FastDataLoggingNumberOfSamples reads 0, like on a
+            device that only supports Get_Data_Logging.
+        min_interval: Data requests and Get commands sent less than min_interval
+            seconds after the previous one fail with an IO error, like a device
+            polled faster than it can answer.
+        """
+        self.serial = str(serial)
+        if tim_vals is None:
+            tim_vals, adc_vals = synthetic_log(1000, offset_d=offset_d)
+        self.tim_vals = np.asarray(tim_vals, dtype=np.int64)
+        self.adc_vals = np.asarray(adc_vals, dtype=np.int64)
+        self.registers = {
+            0x02: offset_d,
+            0x03: fullscale_d,
+            0x04: reverse_fullscale_d,
+            0x05: fullscale_load,
+        }
+        # Values returned by the calibration Get commands
+        self.sensor_id = "100000"
+        self.unit_code = "8"
+        self.decimal_point = "3"
+        self.calibration_date = (1, 1, 2021)
+        self.points_d = [reverse_fullscale_d, offset_d, fullscale_d]
+        self.loads = [-fullscale_load, 0, fullscale_load]
+        # Shaft speed reported by Get_Rotation_Values
+        self.rpm = 0.0
+        self.fast_logging = fast_logging
+        self.latency = latency
+        self.jitter = jitter
+        self.min_interval = min_interval
+        self._last_command = None
+        self._rng = random.Random(seed)
+        if memory_size is None:
+            memory_size = max(2 * len(self.tim_vals), 1024)
+        self.memory_size = memory_size
+        # Former contents of the logging memory, read beyond the end of the log
+        self.stale_tim = np.empty(0, dtype=np.int64)
+        self.stale_adc = np.empty(0, dtype=np.int64)
+        self.round_trips = 0
+        self.opened_at = time.perf_counter()
+        # Number of times the device was unplugged, the handles opened before the
+        # last time are invalid
+        self.unplugged = 0
+        # Round trip after which the device is unplugged, and for how long
+        self._drop_at = None
+        self._drop_duration = None
+
+    @classmethod
+    def from_dat_file(cls, filename=SAMPLE_LOG, serial="479586", **kwargs):
+        """
+        Creates a device whose logging memory holds a recorded log. Both the
+        index/time/ADC .dat files and the files written by save_data are accepted.
+        """
+        tim_vals, adc_vals, _ = read_text_log(filename)
+        return cls(serial, tim_vals, adc_vals, **kwargs)
+
+    @property
+    def n_samples(self):
+        return len(self.tim_vals)
+
+    def record(self, tim_vals, adc_vals):
+        """
+        Appends samples to the logging memory, as if the operator logged more data.
+        """
+        self.tim_vals = np.concatenate((self.tim_vals, np.asarray(tim_vals, dtype=np.int64)))
+        self.adc_vals = np.concatenate((self.adc_vals, np.asarray(adc_vals, dtype=np.int64)))
+        self.memory_size = max(self.memory_size, self.n_samples)
+
+    def round_trip(self):
+        """
+        Waits for the simulated USB latency and counts the transfer.
+        """
+        self.round_trips += 1
+        if self._drop_at is not None and self.round_trips >= self._drop_at:
+            self._drop_at = None
+            self.unplug(self._drop_duration)
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self._rng.expovariate(1 / self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def drop_after(self, round_trips, duration=0.5):
+        """
+        Fault injection: unplugs the device after round_trips more round trips and
+        plugs it back duration seconds later, never if duration is None.
+        """
+        self._drop_at = self.round_trips + round_trips
+        self._drop_duration = duration
+
+    def unplug(self, duration=None):
+        """
+        Unplugs the device, plugging it back after duration seconds if not None.
+        """
+        remove_device(self.serial)
+        if duration is not None:
+            timer = threading.Timer(duration, add_device, (self,))
+            timer.daemon = True
+            timer.start()
+
+    def overloaded(self):
+        """
+        Returns True if the command being sent follows the previous one by less
+        than min_interval.
+        """
+        now = time.perf_counter()
+        previous, self._last_command = self._last_command, now
+        return previous is not None and now - previous < self.min_interval
+
+    def read_log(self, index):
+        """
+        Returns the (ADC, time) pair stored at a logging memory address.
+        """
+        if 0 <= index < self.n_samples:
+            return int(self.adc_vals[index]), int(self.tim_vals[index])
+        if 0 <= index < len(self.stale_tim):
+            return int(self.stale_adc[index]), int(self.stale_tim[index])
+        return 0, 0
+
+    def fill_memory(self, tim_vals, adc_vals):
+        """
+        Sets the former contents of the logging memory, which the log overwrote
+        from address 0. The addresses beyond the log read these samples instead of
+        zeros, like after an older, longer recording.
+        """
+        self.stale_tim = np.asarray(tim_vals, dtype=np.int64)
+        self.stale_adc = np.asarray(adc_vals, dtype=np.int64)
+        self.memory_size = max(self.memory_size, len(self.stale_tim))
+
+    def live_value(self):
+        """
+        ADC value "measured now": replays the log at its own sampling rate.
+        """
+        elapsed_ms = (time.perf_counter() - self.opened_at) * 1000
+        duration = max(int(self.tim_vals[-1] - self.tim_vals[0]), 1)
+        t = self.tim_vals[0] + elapsed_ms % duration
+        index = min(int(np.searchsorted(self.tim_vals, t)), self.n_samples - 1)
+        return int(self.adc_vals[index])
+
+    def angle(self):
+        """
+        Shaft angle in degrees, accumulated at self.rpm since the connection.
+        """
+        elapsed_min = (time.perf_counter() - self.opened_at) / 60
+        return (self.rpm * elapsed_min * 360) % 360
+
+
+def synthetic_log(n_samples, period_ms=20, offset_d=8388608, amplitude_d=300000,
+                  seed=0):
+    """
+    Generates a torque-like log: a slow sine around the offset plus ADC noise.
+    Returns the time (ms) and ADC arrays.
+    """
+    rng = np.random.default_rng(seed)
+    tim_vals = np.arange(n_samples, dtype=np.int64) * period_ms
+    adc_vals = offset_d + amplitude_d * np.sin(tim_vals / 2000.0)
+    adc_vals += rng.normal(0, 50, n_samples)
+    return tim_vals, adc_vals.astype(np.int64)
+
+
+def add_device(device):
+    """
+    Plugs a simulated device, making it visible to USB_DLL.
+    """
+    _devices[device.serial] = device
+    return device
+
+
+# Serial numbers of the IHH500 Elite and Pro used by viacli.py
+DEFAULT_SERIALS = ("479586", "482217")
+
+
+def plug_default_device(latency=1E-3, jitter=2E-4):
+    """
+    Plugs devices replaying SAMPLE_LOG with the DEFAULT_SERIALS when no simulated
+    device is plugged, so the GUI and the CLI work with the "sim" backend as is.
+    """
+    if not _devices:
+        for serial in DEFAULT_SERIALS:
+            add_device(SimulatedDevice.from_dat_file(
+                serial=serial, latency=latency, jitter=jitter
+            ))
+
+
+def remove_device(serial):
+    """
+    Unplugs a simulated device.
+    """
+    device = _devices.pop(str(serial), None)
+    if device is not None:
+        device.unplugged += 1
+
+
+def clear_devices():
+    """
+    Unplugs all the simulated devices.
+    """
+    for serial in list(_devices):
+        remove_device(serial)
+
+
+class USB_DLL(DeviceBackend):
+    """
+    Simulated FUTEK_USB_DLL.USB_DLL.
+    Like the DLL, the Get commands return strings and "Error" on failure, and the
+    outcome of the last command is stored in DeviceStatus.
+    """
+    def __init__(self):
+        self.DeviceHandle = 0
+        self.DeviceStatus = 0
+        self.DataLogging_Counter = 0
+        self.DataLogging_Value1 = 0
+        self.DataLogging_Value2 = 0
+        self.AngleValue = 0.0
+        self.RPMValue = 0.0
+        self.PacketSent = 0
+        self.PacketReceived = 0
+        self._device = None
+        # SimulatedDevice.unplugged when the device was opened
+        self._unplugged = 0
+        self._fast_counter = 0
+        self._fast_adc = np.empty(0, dtype=np.int64)
+        self._fast_tim = np.empty(0, dtype=np.int64)
+        # Number of samples returned by each FastDataLogging transfer
+        self.fast_page_size = 256
+
+    # Connection commands
+    def Open_Device_Connection(self, serial):
+        device = _devices.get(str(serial))
+        if device is None:
+            self.DeviceHandle = 0
+            self.DeviceStatus = 2  # Device Not Found
+            return
+        self._round_trip(device)
+        device.opened_at = time.perf_counter()
+        self._device = device
+        self._unplugged = device.unplugged
+        self.DeviceHandle = id(device)
+        self.DeviceStatus = 0
+
+    def Close_Device_Connection(self, handle):
+        if self._check_handle(handle):
+            self._device = None
+            self.DeviceHandle = 0
+
+    # Data link commands
+    def Slave_Activity_Inquiry(self, handle):
+        return self._command(handle, lambda device: "0")
+
+    # Get commands
+    def Get_Device_Count(self):
+        self.DeviceStatus = 0
+        return str(len(_devices))
+
+    def Get_Device_Serial_Number(self, index):
+        serials = list(_devices)
+        index = int(index)
+        if 0 <= index < len(serials):
+            self.DeviceStatus = 0
+            return serials[index]
+        self.DeviceStatus = 6  # Invalid Parameter
+        return "Error"
+
+    def Get_Internal_Register(self, handle, register):
+        return self._command(
+            handle, lambda device: str(device.registers.get(int(register), 0))
+        )
+
+    def Get_Offset_Value(self, handle, channel=0):
+        return self.Get_Internal_Register(handle, 0x02)
+
+    def Get_Fullscale_Value(self, handle, channel=0):
+        return self.Get_Internal_Register(handle, 0x03)
+
+    def Normal_Data_Request(self, handle, channel=0):
+        return self._command(handle, lambda device: str(device.live_value()))
+
+    def Fast_Data_Request(self, handle, channel=0):
+        return self.Normal_Data_Request(handle, channel)
+
+    def Get_Data_Logging(self, handle, counter):
+        counter = int(counter)
+        if not self._check_handle(handle):
+            return "Error"
+        self._round_trip(self._device)
+        if not 0 <= counter < self._device.memory_size:
+            self.DeviceStatus = 6  # Invalid Parameter
+            return "Error"
+        adc, tim = self._device.read_log(counter)
+        self.DataLogging_Counter = counter
+        self.DataLogging_Value1 = adc
+        self.DataLogging_Value2 = tim
+        return "0"
+
+    def Get_Rotation_Values(self, handle):
+        if not self._check_handle(handle):
+            return "Error"
+        self._round_trip(self._device)
+        self.AngleValue = self._device.angle()
+        self.RPMValue = self._device.rpm
+        return "0"
+
+    def Get_Number_of_Loading_Points(self, handle, channel=0):
+        return self._command(handle, lambda device: str(len(device.points_d)))
+
+    def Get_Loading_Point(self, handle, point, channel=0):
+        return self._command(handle, lambda device: str(device.points_d[int(point)]))
+
+    def Get_Load_of_Loading_Point(self, handle, point, channel=0):
+        return self._command(handle, lambda device: str(device.loads[int(point)]))
+
+    def Get_Sensor_Identification_Number(self, handle, channel=0):
+        return self._command(handle, lambda device: device.sensor_id)
+
+    def Get_Unit_Code(self, handle, channel=0):
+        return self._command(handle, lambda device: device.unit_code)
+
+    def Get_Decimal_Point(self, handle, channel=0):
+        return self._command(handle, lambda device: device.decimal_point)
+
+    def Get_Calibration_Day(self, handle, channel=0):
+        return self._command(handle, lambda device: str(device.calibration_date[0]))
+
+    def Get_Calibration_Month(self, handle, channel=0):
+        return self._command(handle, lambda device: str(device.calibration_date[1]))
+
+    def Get_Calibration_Year(self, handle, channel=0):
+        return self._command(handle, lambda device: str(device.calibration_date[2]))
+
+    # FastDataLogging properties: setting the counter transfers one page of the
+    # logging memory, which is then read from the ADC value and time properties.
+    # The DLL documents the properties but not these semantics, they are an
+    # assumption not verified on hardware, used by the experimental
+    # datalog.FastDataLogReader only when it is opted in to.
+    @property
+    def FastDataLoggingNumberOfSamples(self):
+        if self._device is None or not self._device.fast_logging:
+            return 0
+        return self._device.n_samples
+
+    @property
+    def FastDataLoggingCounter(self):
+        return self._fast_counter
+
+    @FastDataLoggingCounter.setter
+    def FastDataLoggingCounter(self, counter):
+        self._fast_counter = int(counter)
+        if not self._check_handle(self.DeviceHandle):
+            return
+        device = self._device
+        self._round_trip(device)
+        start = min(self._fast_counter, device.n_samples)
+        stop = min(start + self.fast_page_size, device.n_samples)
+        self._fast_adc = device.adc_vals[start:stop].copy()
+        self._fast_tim = device.tim_vals[start:stop].copy()
+
+    @property
+    def FastDataLoggingADCValue(self):
+        return self._fast_adc
+
+    @property
+    def FastDataLoggingDateAndTime(self):
+        return self._fast_tim
+
+    def _command(self, handle, response):
+        """
+        Runs a Get command: checks the handle, waits for the round trip and returns
+        response(device), or "Error".
+        """
+        if not self._check_handle(handle):
+            return "Error"
+        overloaded = self._device.overloaded()
+        self._round_trip(self._device)
+        if overloaded:
+            self.DeviceStatus = 4  # IO Error
+            return "Error"
+        return response(self._device)
+
+    def _round_trip(self, device):
+        """
+        Sends a command to device and waits for its response.
+        """
+        self.PacketSent += 1
+        device.round_trip()
+        self.PacketReceived += 1
+
+    def _check_handle(self, handle):
+        """
+        Updates DeviceStatus and returns True if the handle is an open device.
+        """
+        if self._device is None or handle != self.DeviceHandle:
+            self.DeviceStatus = 1  # Invalid Handle
+            return False
+        if _devices.get(self._device.serial) is not self._device \
+                or self._device.unplugged != self._unplugged:
+            self.DeviceStatus = 4  # IO Error, the device was unplugged
+            return False
+        self.DeviceStatus = 0
+        return True
@@ -0,0 +1,279 @@
+"""
+Continuous acquisition of the live ADC value.
+StreamingAcquisition polls Normal_Data_Request (or Fast_Data_Request) as fast as
+the USB link allows on a worker thread, and stores every sample with a monotonic
+host timestamp in a RingBuffer. Consumers (GUI, file writers) read from the ring
+buffer without ever blocking the producer.
+Given a DeviceSession, the requests are sent through it, so a link lost during the
+acquisition is opened again and the request replayed, see session.py.
+"""
+import threading
+import time
+from functools import partial
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-size, preallocated buffer of (timestamp, ADC value) samples with a single
+    producer and any number of consumers. dtype may be a structured dtype, to store
+    several channels sampled together in the values.
+    The producer writes the sample first and then publishes it by incrementing
+    written, so consumers never need a lock: they copy what they want and check
+    afterwards, with written, whether the producer overwrote part of it meanwhile.
+    """
+    def __init__(self, capacity=1 << 20, dtype=np.int64):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=dtype)
+        # Total number of samples ever written, only modified by the producer
+        self.written = 0
+
+    def append(self, timestamp, value):
+        """
+        Stores one sample. Called by the producer only.
+        """
+        index = self.written % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+        self.written += 1
+
+    def read_since(self, position, max_samples=None):
+        """
+        Returns the samples written after the absolute position (a previous value
+        of written) as (timestamps, values, new_position, dropped). dropped counts
+        the samples that were overwritten before they could be read.
+        """
+        end = self.written
+        if max_samples is not None:
+            end = min(end, position + max_samples)
+        oldest = end - self.capacity
+        dropped = max(oldest - position, 0)
+        start = position + dropped
+        timestamps, values = self._copy(start, end)
+        # Samples overwritten while copying are discarded as well, including the
+        # slot the producer may be writing right now
+        overwritten = min(max(self.written + 1 - self.capacity - start, 0), end - start)
+        if overwritten:
+            timestamps = timestamps[overwritten:]
+            values = values[overwritten:]
+            dropped += overwritten
+        return timestamps, values, end, dropped
+
+    def snapshot(self, n_samples=None):
+        """
+        Returns a copy of the latest n_samples (all the buffered ones if None).
+        """
+        end = self.written
+        available = min(end, self.capacity)
+        if n_samples is None or n_samples > available:
+            n_samples = available
+        timestamps, values, _, _ = self.read_since(end - n_samples)
+        return timestamps, values
+
+    def _copy(self, start, end):
+        """
+        Copies the samples between the absolute positions start and end.
+        """
+        first = start % self.capacity
+        count = end - start
+        if first + count <= self.capacity:
+            return (self.timestamps[first:first + count].copy(),
+                    self.values[first:first + count].copy())
+        split = self.capacity - first
+        timestamps = np.concatenate((self.timestamps[first:], self.timestamps[:count - split]))
+        values = np.concatenate((self.values[first:], self.values[:count - split]))
+        return timestamps, values
+
+
+class StreamingAcquisition:
+    """
+    Polls the live ADC value of a device on a dedicated worker thread.
+    The device must not be used by another thread while the acquisition runs.
+    """
+    # Number of recent request latencies kept for the percentiles
+    LATENCY_WINDOW = 4096
+    # Values of the ring buffer, a structured dtype for several channels
+    VALUE_DTYPE = np.int64
+
+    def __init__(self, dev, handle, channel=2, capacity=1 << 20, fast=False, interval=0.0,
+                 session=None):
+        """
+        dev, handle: USB_DLL instance and the handle of the open device.
+        capacity: Number of samples kept in the ring buffer.
+        fast: Uses Fast_Data_Request instead of Normal_Data_Request.
+        interval: Minimum time between two requests in seconds, 0 polls as fast as
+                  the link allows.
+        session: DeviceSession of the device, the requests are then sent with
+                 session.call and dev and handle are those of the session.
+        """
+        if session is not None:
+            dev, handle = session.dev, session.handle
+        self.dev = dev
+        self.handle = handle
+        self.session = session
+        self.channel = channel
+        self.fast = fast
+        self.interval = interval
+        self.buffer = RingBuffer(capacity, dtype=self.VALUE_DTYPE)
+        # Requests that failed ("Error"), so no sample was stored
+        self.dropped = 0
+        # ReconnectError that ended the acquisition, None while the device answers
+        self.error = None
+        self._latencies = np.zeros(self.LATENCY_WINDOW, dtype=np.float64)
+        self._n_latencies = 0
+        self._thread = None
+        self._running = threading.Event()
+        # Set by stop, interrupts a reconnection of the session
+        self._stopping = threading.Event()
+        self._started_at = None
+        self._stopped_at = None
+
+    def start(self, executor=None):
+        """
+        Starts the acquisition on a new worker thread, or on executor (a
+        concurrent.futures executor, e.g. the single thread that owns the device).
+        """
+        if self.running:
+            return
+        self._running.set()
+        self._stopping.clear()
+        self.error = None
+        self._started_at = time.perf_counter()
+        self._stopped_at = None
+        if executor is not None:
+            self._thread = executor.submit(self._run)
+        else:
+            self._thread = threading.Thread(
+                target=self._run, name="StreamingAcquisition", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stops the acquisition and waits for the loop to finish. With wait=False,
+        only asks the loop to stop, stop() must be called again to wait for it.
+        """
+        self._running.clear()
+        self._stopping.set()
+        if not wait:
+            return
+        if isinstance(self._thread, threading.Thread):
+            self._thread.join()
+        elif self._thread is not None:
+            self._thread.result()
+        self._thread = None
+        if self._started_at is not None and self._stopped_at is None:
+            self._stopped_at = time.perf_counter()
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def _request_function(self):
+        """
+        Returns the function sending one request, called as request(channel).
+        """
+        return self._command_function(
+            "Fast_Data_Request" if self.fast else "Normal_Data_Request"
+        )
+
+    def _command_function(self, command):
+        """
+        Returns the function sending a command to the device, called with the
+        arguments that follow the handle.
+        """
+        if self.session is not None:
+            return partial(self.session.call, command, cancel=self._stopping)
+        return partial(getattr(self.dev, command), self.handle)
+
+    def _run(self):
+        """
+        Acquisition loop of the worker thread.
+        """
+        try:
+            self._poll()
+        except ConnectionError as error:
+            # The session gave up reconnecting (ReconnectError)
+            self.error = error
+            self._running.clear()
+
+    def _poll(self):
+        """
+        Sends the requests until stop is called.
+        """
+        request = self._request_function()
+        channel = self.channel
+        append = self.buffer.append
+        latencies = self._latencies
+        window = self.LATENCY_WINDOW
+        clock = time.perf_counter
+        next_request = clock()
+        while self._running.is_set():
+            if self.interval > 0:
+                delay = next_request - clock()
+                if delay > 0:
+                    time.sleep(delay)
+                next_request = max(next_request + self.interval, clock())
+            sent = clock()
+            response = request(channel)
+            received = clock()
+            latencies[self._n_latencies % window] = received - sent
+            self._n_latencies += 1
+            try:
+                value = int(response)
+            except (TypeError, ValueError):  # "Error"
+                self.dropped += 1
+                continue
+            # The sample is timestamped halfway through the round trip
+            append((sent + received) / 2, value)
+
+    def stats(self):
+        """
+        Returns a dict with the number of samples, the achieved sample rate (Hz),
+        the samples dropped by failed requests and the request latency
+        percentiles (ms).
+        """
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            end = self._stopped_at if self._stopped_at is not None else time.perf_counter()
+            elapsed = end - self._started_at
+        samples = self.buffer.written
+        n_latencies = min(self._n_latencies, self.LATENCY_WINDOW)
+        stats = {
+            "samples": samples,
+            "rate": samples / elapsed if elapsed > 0 else 0.0,
+            "dropped": self.dropped,
+        }
+        if n_latencies:
+            p50, p90, p99, worst = (
+                float(p) * 1000 for p in np.percentile(
+                    self._latencies[:n_latencies], [50, 90, 99, 100]
+                )
+            )
+            stats.update({"latency_p50": p50, "latency_p90": p90,
+                          "latency_p99": p99, "latency_max": worst})
+        return stats
+
+
+class StreamConsumer:
+    """
+    Reads the new samples of a RingBuffer, keeping its own position and counting
+    the samples it missed because the producer overwrote them.
+    """
+    def __init__(self, buffer, from_start=False):
+        self.buffer = buffer
+        self.position = 0 if from_start else buffer.written
+        self.dropped = 0
+
+    def read(self, max_samples=None):
+        """
+        Returns the timestamps and values written since the previous read.
+        """
+        timestamps, values, self.position, dropped = self.buffer.read_since(
+            self.position, max_samples
+        )
+        self.dropped += dropped
+        return timestamps, values
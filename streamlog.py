@@ -0,0 +1,448 @@
+"""
+Crash-safe, append-only recording of the live acquisition.
+StreamWriter copies the samples into fixed-size chunks, from a fixed pool, and a
+background thread appends the full chunks to the file. The same thread also
+writes a chunk that has been filling for flush_interval seconds, even if no
+sample arrives anymore (e.g. the USB link dropped). The file is flushed after
+every chunk and fsynced at most every fsync_interval seconds, so a crash of the
+program loses at most the chunk being filled (at most flush_interval seconds of
+samples), and a power loss at most fsync_interval seconds more. The memory used
+doesn't depend on the duration of the recording.
+
+Two formats are written:
+    Text, the tab-separated columns of save_data with the same header. Every
+    line is a sample, a crash can only leave a partial last line.
+    Binary (EXTENSION): a HEADER_DTYPE header with the calibration, then chunks
+    of CHUNK_HEADER (magic, number of samples n, index of the first sample,
+    CRC-32 of the data) followed by n float64 times (s since the first sample),
+    n int32 ADC counts and n float32 torques. close() appends the offsets of the
+    chunks and a TRAILER; a file without a trailer was not closed, recover()
+    keeps its valid chunks and writes the trailer.
+"""
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+MAGIC = b"OFTKSTRM"
+VERSION = 1
+EXTENSION = ".tqs"
+# Header of the text format, as written by save_data with np.savetxt
+TEXT_HEADER = "# Time(ms)\tADC Count\tTorque (N.cm)\n"
+# Format of a line of the text format
+TEXT_LINE = "%.3f\t%i\t%f\n"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u2"),
+    ("header_size", "<u2"),
+    ("reserved", "<u4"),
+    ("start_time", "<f8"),  # Unix time of the first sample
+    ("offset_d", "<i4"),
+    ("fullscale_d", "<i4"),
+    ("reverse_fullscale_d", "<i4"),
+    ("reserved2", "<u4"),
+    ("fullscale_load_a", "<f8"),
+    ("serial", "S16"),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sIQI")
+# Bytes per sample: time, ADC and torque
+SAMPLE_SIZE = 8 + 4 + 4
+TRAILER_MAGIC = b"OFTKEND1"
+# Magic, number of chunks, number of samples, offset of the chunk index
+TRAILER = struct.Struct("<8sQQQ")
+
+CHUNK_SIZE = 4096
+FLUSH_INTERVAL = 1.0
+FSYNC_INTERVAL = 5.0
+# Chunks in the pool, the writer waits for a free one when they are all queued
+N_CHUNKS = 8
+
+
+class _Chunk:
+    def __init__(self, size):
+        self.timestamps = np.empty(size, dtype=np.float64)
+        self.adc = np.empty(size, dtype=np.int64)
+        self.n_samples = 0
+        self.first = 0
+        self.started = 0.0
+
+
+class StreamWriter:
+    """
+    Appends (timestamp, ADC value) samples to a text or binary file.
+    write is called by one producer, e.g. the consumer of the live acquisition.
+    A lock protects the chunk being filled, which the writer thread takes when
+    its samples waited flush_interval.
+    """
+    def __init__(self, filename, calibration=None, binary=None, chunk_size=CHUNK_SIZE,
+                 flush_interval=FLUSH_INTERVAL, fsync_interval=FSYNC_INTERVAL,
+                 n_chunks=N_CHUNKS):
+        """
+        calibration: calibration.Calibration used to compute the torque and stored
+                     in the binary header, the torque is NaN if None.
+        binary: Writes the binary format, by default if filename ends with
+                EXTENSION.
+        flush_interval: Maximum time a sample waits in a chunk that is not full (s).
+        fsync_interval: Maximum time between two fsync (s).
+        """
+        if binary is None:
+            binary = filename.lower().endswith(EXTENSION)
+        self.filename = filename
+        self.calibration = calibration
+        self.binary = binary
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.n_samples = 0
+        self.n_fsync = 0
+        # Reference of the timestamps, the first one written, and its Unix time
+        self.t0 = None
+        self.start_time = None
+        self._clock_offset = time.time() - time.perf_counter()
+        self._chunk_offsets = []
+        self._free = queue.Queue()
+        for _ in range(n_chunks):
+            self._free.put(_Chunk(chunk_size))
+        self._pending = queue.Queue()
+        self._chunk = None
+        self._lock = threading.Lock()
+        self._error = None
+        self._file = open(filename, "wb")
+        self._last_fsync = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="StreamWriter", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, timestamps, adc_vals):
+        """
+        Appends samples, timestamps in s (time.perf_counter, as recorded by
+        StreamingAcquisition). Waits if the disk can't keep up and every chunk
+        of the pool is queued.
+        """
+        self._raise_error()
+        n_new = len(adc_vals)
+        if self.t0 is None and n_new:
+            self.t0 = float(timestamps[0])
+            self.start_time = self.t0 + self._clock_offset
+        written = 0
+        with self._lock:
+            while written < n_new:
+                chunk = self._current_chunk()
+                count = min(n_new - written, len(chunk.adc) - chunk.n_samples)
+                chunk.timestamps[chunk.n_samples:chunk.n_samples + count] = \
+                    timestamps[written:written + count]
+                chunk.adc[chunk.n_samples:chunk.n_samples + count] = \
+                    adc_vals[written:written + count]
+                chunk.n_samples += count
+                written += count
+                if chunk.n_samples == len(chunk.adc):
+                    self._submit()
+
+    def flush(self):
+        """
+        Writes the samples waiting in memory and fsyncs the file.
+        """
+        with self._lock:
+            self._submit()
+        done = threading.Event()
+        self._pending.put(done)
+        done.wait()
+        self._raise_error()
+
+    def close(self):
+        """
+        Writes the remaining samples and, in the binary format, the trailer.
+        """
+        if self._file is None:
+            return
+        with self._lock:
+            self._submit()
+        self._pending.put(None)
+        self._thread.join()
+        try:
+            if self._error is None:
+                self._write_header_once()
+                if self.binary:
+                    _write_trailer(self._file, self._chunk_offsets, self.n_samples)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+            self._file = None
+        self._raise_error()
+
+    def _current_chunk(self):
+        if self._chunk is None:
+            self._chunk = self._free.get()
+            self._chunk.n_samples = 0
+            self._chunk.first = self.n_samples
+            self._chunk.started = time.perf_counter()
+        return self._chunk
+
+    def _submit(self):
+        """
+        Queues the current chunk for the writer thread. Called with the lock held.
+        """
+        chunk = self._chunk
+        if chunk is None or not chunk.n_samples:
+            return
+        self.n_samples += chunk.n_samples
+        self._chunk = None
+        self._pending.put(chunk)
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        """
+        Writer thread: appends the queued chunks, fsyncs periodically, and queues
+        the chunk being filled once its first sample waited flush_interval.
+        """
+        while True:
+            chunk = self._chunk
+            if chunk is None:
+                timeout = self.flush_interval
+            else:
+                timeout = max(chunk.started + self.flush_interval - time.perf_counter(), 0)
+            try:
+                item = self._pending.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_stale()
+                continue
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                try:
+                    self._fsync()
+                except OSError as error:
+                    self._error = error
+                item.set()
+                continue
+            try:
+                if self._error is None:
+                    self._write_chunk(item)
+                    if time.perf_counter() - self._last_fsync >= self.fsync_interval:
+                        self._fsync()
+            except OSError as error:
+                # Raised to the producer at its next write, the samples that
+                # follow are discarded
+                self._error = error
+            finally:
+                self._free.put(item)
+
+    def _flush_stale(self):
+        """
+        Queues the chunk being filled if it waited flush_interval. Gives up if
+        write holds the lock too long: it may be waiting for this thread to free
+        a chunk.
+        """
+        if not self._lock.acquire(timeout=0.01):
+            return
+        try:
+            chunk = self._chunk
+            if chunk is not None and \
+                    time.perf_counter() - chunk.started >= self.flush_interval:
+                self._submit()
+        finally:
+            self._lock.release()
+
+    def _write_chunk(self, chunk):
+        n_samples = chunk.n_samples
+        times = chunk.timestamps[:n_samples] - self.t0
+        adc_vals = chunk.adc[:n_samples]
+        if self.calibration is not None:
+            tq_vals = self.calibration.convert(adc_vals, dtype=np.float32)
+        else:
+            tq_vals = np.full(n_samples, np.nan, dtype=np.float32)
+        self._write_header_once()
+        if self.binary:
+            data = b"".join((
+                times.astype("<f8").tobytes(),
+                adc_vals.astype("<i4").tobytes(),
+                tq_vals.astype("<f4").tobytes(),
+            ))
+            self._chunk_offsets.append(self._file.tell())
+            self._file.write(CHUNK_HEADER.pack(
+                CHUNK_MAGIC, n_samples, chunk.first, zlib.crc32(data)
+            ))
+            self._file.write(data)
+        else:
+            # One %-format of the whole chunk, the columns interleaved in the
+            # order of the lines
+            values = np.empty(3 * n_samples, dtype=object)
+            values[0::3] = (times * 1000).tolist()
+            values[1::3] = adc_vals.tolist()
+            values[2::3] = tq_vals.tolist()
+            self._file.write(((TEXT_LINE * n_samples) % tuple(values)).encode())
+        # Reaches the OS at every chunk, so a crash of the program loses nothing
+        # already written
+        self._file.flush()
+
+    def _write_header_once(self):
+        if self._file.tell():
+            return
+        if not self.binary:
+            self._file.write(TEXT_HEADER.encode())
+            return
+        header = np.zeros((), dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["header_size"] = HEADER_SIZE
+        header["start_time"] = self.start_time or time.time()
+        calibration = self.calibration
+        if calibration is not None:
+            for name, value in calibration.registers.items():
+                header[name] = value
+            header["serial"] = str(calibration.serial).encode("ascii")[:16]
+        self._file.write(header.tobytes())
+
+    def _fsync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.perf_counter()
+        self.n_fsync += 1
+
+
+def read_header(filename):
+    """
+    Returns the header of a binary stream log as a dict.
+    """
+    raw = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)
+    if len(raw) != 1 or raw["magic"][0] != MAGIC:
+        raise ValueError(f"{filename} is not a binary stream log.")
+    if raw["version"][0] > VERSION:
+        raise ValueError(f"{filename} has an unsupported version {raw['version'][0]}.")
+    header = {name: raw[name][0].item() for name in HEADER_DTYPE.names}
+    header["serial"] = header["serial"].decode("ascii")
+    return header
+
+
+def iter_chunks(filename):
+    """
+    Yields the chunks of a binary stream log as (first sample index, times (s),
+    ADC values, torques). Uses the index of the trailer if there is one, otherwise
+    reads the valid chunks up to the first damaged one.
+    """
+    header = read_header(filename)
+    with open(filename, "rb") as log_file:
+        offsets = _read_index(log_file)
+        if offsets is None:
+            offsets = (offset for offset, _ in _scan_chunks(log_file, header["header_size"]))
+        for offset in offsets:
+            log_file.seek(offset)
+            magic, n_samples, first, crc = CHUNK_HEADER.unpack(
+                log_file.read(CHUNK_HEADER.size)
+            )
+            data = log_file.read(n_samples * SAMPLE_SIZE)
+            yield first, *_decode(data, n_samples)
+
+
+def read_stream_log(filename):
+    """
+    Reads a binary stream log. Returns the header and the times (s since
+    header["start_time"]), ADC values and torques.
+    """
+    header = read_header(filename)
+    chunks = list(iter_chunks(filename))
+    if not chunks:
+        return header, np.empty(0), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    _, times, adc_vals, tq_vals = zip(*chunks)
+    return header, np.concatenate(times), np.concatenate(adc_vals), np.concatenate(tq_vals)
+
+
+def recover(filename):
+    """
+    Makes a log left open by a crash readable, returns its number of samples.
+    Binary logs are truncated after the last valid chunk and get their trailer,
+    text logs lose their partial last line.
+    """
+    if not filename.lower().endswith(EXTENSION):
+        return _recover_text(filename)
+    header = read_header(filename)
+    with open(filename, "r+b") as log_file:
+        if _read_index(log_file) is not None:
+            log_file.seek(-TRAILER.size, os.SEEK_END)
+            return TRAILER.unpack(log_file.read(TRAILER.size))[2]
+        offsets = []
+        n_samples = 0
+        end = header["header_size"]
+        for offset, chunk_samples in _scan_chunks(log_file, header["header_size"]):
+            offsets.append(offset)
+            n_samples += chunk_samples
+            end = offset + CHUNK_HEADER.size + chunk_samples * SAMPLE_SIZE
+        log_file.truncate(end)
+        log_file.seek(end)
+        _write_trailer(log_file, offsets, n_samples)
+        log_file.flush()
+        os.fsync(log_file.fileno())
+    return n_samples
+
+
+def _recover_text(filename):
+    with open(filename, "r+b") as log_file:
+        data = log_file.read()
+        end = data.rfind(b"\n") + 1
+        log_file.truncate(end)
+    n_lines = data.count(b"\n", 0, end)
+    return max(n_lines - data.startswith(b"#"), 0)
+
+
+def _decode(data, n_samples):
+    times = np.frombuffer(data, dtype="<f8", count=n_samples)
+    adc_vals = np.frombuffer(data, dtype="<i4", count=n_samples, offset=8 * n_samples)
+    tq_vals = np.frombuffer(data, dtype="<f4", count=n_samples, offset=12 * n_samples)
+    return times, adc_vals, tq_vals
+
+
+def _write_trailer(log_file, offsets, n_samples):
+    index_offset = log_file.tell()
+    log_file.write(np.asarray(offsets, dtype="<u8").tobytes())
+    log_file.write(TRAILER.pack(TRAILER_MAGIC, len(offsets), n_samples, index_offset))
+
+
+def _read_index(log_file):
+    """
+    Returns the chunk offsets of the trailer, None if the file has no trailer.
+    """
+    log_file.seek(0, os.SEEK_END)
+    size = log_file.tell()
+    if size < HEADER_SIZE + TRAILER.size:
+        return None
+    log_file.seek(size - TRAILER.size)
+    magic, n_chunks, _, index_offset = TRAILER.unpack(log_file.read(TRAILER.size))
+    if magic != TRAILER_MAGIC or index_offset + 8 * n_chunks + TRAILER.size != size:
+        return None
+    log_file.seek(index_offset)
+    return np.frombuffer(log_file.read(8 * n_chunks), dtype="<u8").tolist()
+
+
+def _scan_chunks(log_file, offset):
+    """
+    Yields the offset and the number of samples of the chunks from offset, up to
+    the first incomplete or damaged one.
+    """
+    while True:
+        log_file.seek(offset)
+        header = log_file.read(CHUNK_HEADER.size)
+        if len(header) < CHUNK_HEADER.size:
+            return
+        magic, n_samples, _, crc = CHUNK_HEADER.unpack(header)
+        if magic != CHUNK_MAGIC:
+            return
+        data = log_file.read(n_samples * SAMPLE_SIZE)
+        if len(data) < n_samples * SAMPLE_SIZE or zlib.crc32(data) != crc:
+            return
+        yield offset, n_samples
+        offset += CHUNK_HEADER.size + n_samples * SAMPLE_SIZE
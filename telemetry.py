@@ -0,0 +1,303 @@
+"""
+Local telemetry server: streams the live samples of one device to any number of
+clients over TCP (localhost by default) or a Unix socket, so that other processes
+can see the data of the device this process owns.
+The samples are polled by an AsyncDevice. Every poll_interval the new ones are
+encoded once and queued for every client, at most max_frames per client: a client
+that reads too slowly loses its oldest frames, which it notices from the sequence
+numbers, and never slows the acquisition or the other clients.
+
+Protocol, little endian. The clients never send anything.
+    Hello, once: MAGIC, u32 length, JSON object with the serial, channel,
+    calibration registers and clock_offset (add it to a timestamp to get a Unix
+    time).
+    Then data frames: FRAME_HEADER (u32 number of samples n, u64 sequence number
+    of the first sample since the start of the acquisition), n float64 timestamps
+    (time.perf_counter of the server, s) and n int32 ADC values.
+
+Run from the repository root:
+    python telemetry.py --serial 479586 --port 5577
+    python telemetry.py --serial 479586 --unix /tmp/openfutek.sock
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import struct
+import time
+from collections import deque
+
+import numpy as np
+
+from asyncdevice import AsyncDevice
+from streaming import StreamConsumer
+
+MAGIC = b"OFTS"
+HELLO_LENGTH = struct.Struct("<I")
+FRAME_HEADER = struct.Struct("<IQ")
+DEFAULT_PORT = 5577
+
+
+class _Client:
+    """
+    Frames waiting to be sent to one client.
+    """
+    def __init__(self, max_frames):
+        self.frames = deque(maxlen=max_frames)
+        self.ready = asyncio.Event()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def put(self, frame):
+        if len(self.frames) == self.frames.maxlen:
+            self.frames_dropped += 1
+        self.frames.append(frame)
+        self.ready.set()
+
+
+class TelemetryServer:
+    """
+    Streams the live samples of a connected AsyncDevice to the clients.
+    """
+    def __init__(self, device, poll_interval=0.01, max_frames=64):
+        """
+        device: Connected AsyncDevice, streaming starts with the server.
+        poll_interval: Time between two frames (s).
+        max_frames: Frames queued per client before the oldest one is dropped.
+        """
+        self.device = device
+        self.poll_interval = poll_interval
+        self.max_frames = max_frames
+        self.clients = set()
+        self.frames = 0
+        self.samples = 0
+        # Frames of the clients that disconnected
+        self._frames_sent = 0
+        self._frames_dropped = 0
+        self._consumer = None
+        self._server = None
+        self._publisher = None
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None, **kwargs):
+        """
+        Starts streaming (kwargs are passed to StreamingAcquisition) and listening
+        on host:port, or on the Unix socket unix_path.
+        """
+        acquisition = self.device.start_streaming(**kwargs)
+        self._consumer = StreamConsumer(acquisition.buffer, from_start=True)
+        if unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_client, unix_path)
+        else:
+            self._server = await asyncio.start_server(self._serve_client, host, port)
+        self._publisher = asyncio.get_running_loop().create_task(self._publish_samples())
+
+    @property
+    def addresses(self):
+        return [sock.getsockname() for sock in self._server.sockets]
+
+    async def close(self):
+        """
+        Disconnects the clients and stops streaming.
+        """
+        self._server.close()
+        self._publisher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._publisher
+        for client in list(self.clients):
+            client.ready.set()
+        self.clients.clear()
+        await self._server.wait_closed()
+        await self.device.stop_streaming()
+
+    def stats(self):
+        """
+        Returns a dict with the number of clients, the frames and samples
+        published, and the frames sent to and dropped for all the clients.
+        """
+        return {
+            "clients": len(self.clients),
+            "frames": self.frames,
+            "samples": self.samples,
+            "frames_sent": self._frames_sent + sum(c.frames_sent for c in self.clients),
+            "frames_dropped": self._frames_dropped + sum(
+                c.frames_dropped for c in self.clients
+            ),
+            "acquisition": self.device.acquisition.stats(),
+        }
+
+    def hello(self):
+        calibration = self.device.calibration
+        info = {
+            "serial": self.device.serial,
+            "channel": self.device.channel,
+            "calibration": calibration.registers if calibration is not None else None,
+            "clock_offset": time.time() - time.perf_counter(),
+        }
+        payload = json.dumps(info).encode()
+        return MAGIC + HELLO_LENGTH.pack(len(payload)) + payload
+
+    async def _publish_samples(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self._publish()
+
+    def _publish(self):
+        """
+        Encodes the new samples once and queues the frame for every client.
+        """
+        consumer = self._consumer
+        position, dropped = consumer.position, consumer.dropped
+        timestamps, values = consumer.read()
+        n_samples = len(values)
+        if not n_samples:
+            return
+        # Samples overwritten in the ring buffer before they could be read are skipped
+        first = position + consumer.dropped - dropped
+        frame = b"".join((
+            FRAME_HEADER.pack(n_samples, first),
+            timestamps.astype("<f8", copy=False).tobytes(),
+            values.astype("<i4").tobytes(),
+        ))
+        self.frames += 1
+        self.samples += n_samples
+        for client in self.clients:
+            client.put(frame)
+
+    async def _serve_client(self, reader, writer):
+        client = _Client(self.max_frames)
+        self.clients.add(client)
+        try:
+            writer.write(self.hello())
+            await writer.drain()
+            while client in self.clients:
+                await client.ready.wait()
+                client.ready.clear()
+                frames = list(client.frames)
+                client.frames.clear()
+                writer.write(b"".join(frames))
+                client.frames_sent += len(frames)
+                # Waits while the socket buffer is full, the next frames are
+                # queued (or dropped) meanwhile
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            self._frames_sent += client.frames_sent
+            self._frames_dropped += client.frames_dropped
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+class TelemetryClient:
+    """
+    Subscriber of a TelemetryServer, iterates over the frames as
+    (first sequence number, timestamps, ADC values).
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None, sock=None):
+        """
+        sock: Connected socket used instead of host and port or unix_path.
+        """
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.sock = sock
+        # Hello of the server: serial, channel, calibration and clock_offset
+        self.info = None
+        self._reader = None
+        self._writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        """
+        Connects and reads the hello. Raises ValueError if the server is not a
+        telemetry server.
+        """
+        if self.sock is not None:
+            self._reader, self._writer = await asyncio.open_connection(sock=self.sock)
+        elif self.unix_path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        magic = await self._reader.readexactly(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"Not a telemetry server: {magic!r}")
+        length, = HELLO_LENGTH.unpack(await self._reader.readexactly(HELLO_LENGTH.size))
+        self.info = json.loads(await self._reader.readexactly(length))
+
+    async def read(self):
+        """
+        Returns the next frame, None when the server closed the connection.
+        """
+        try:
+            header = await self._reader.readexactly(FRAME_HEADER.size)
+            n_samples, first = FRAME_HEADER.unpack(header)
+            payload = await self._reader.readexactly(12 * n_samples)
+        except asyncio.IncompleteReadError:
+            return None
+        timestamps = np.frombuffer(payload, dtype="<f8", count=n_samples)
+        values = np.frombuffer(payload, dtype="<i4", offset=8 * n_samples)
+        return first, timestamps, values
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        frame = await self.read()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+    async def close(self):
+        self._writer.close()
+        with contextlib.suppress(ConnectionError):
+            await self._writer.wait_closed()
+
+
+async def serve(serial, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None,
+                poll_interval=0.01, max_frames=64, stats_interval=10.0, **kwargs):
+    """
+    Connects to the device and serves its samples until cancelled, printing the
+    statistics every stats_interval seconds.
+    """
+    async with AsyncDevice(serial) as device:
+        server = TelemetryServer(device, poll_interval, max_frames)
+        await server.start(host, port, unix_path, **kwargs)
+        print(f"Streaming {serial} on {unix_path or f'{host}:{port}'}")
+        try:
+            while True:
+                await asyncio.sleep(stats_interval)
+                stats = server.stats()
+                print(f"{stats['clients']} clients, {stats['samples']} samples, "
+                      f"{stats['acquisition']['rate']:.0f} samples/s, "
+                      f"{stats['frames_dropped']} frames dropped")
+        finally:
+            await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--serial", default="479586")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="Path of a Unix socket, instead of TCP")
+    parser.add_argument("--poll-interval", type=float, default=0.01)
+    parser.add_argument("--max-frames", type=int, default=64)
+    parser.add_argument("--fast", action="store_true", help="Use Fast_Data_Request")
+    args = parser.parse_args()
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(
+            args.serial, args.host, args.port, args.unix, args.poll_interval,
+            args.max_frames, fast=args.fast
+        ))
+
+
+if __name__ == "__main__":
+    main()
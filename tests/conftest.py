@@ -0,0 +1,30 @@
+"""
+Fixtures shared by the tests. The modules are imported from the repository root,
+like the benchmarks do.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calibration import Calibration  # noqa: E402
+from simulator import synthetic_log  # noqa: E402
+
+
+@pytest.fixture
+def calibration():
+    return Calibration(
+        serial="479586", sensor_id="123456", calibration_date="2020-01-01",
+        offset_d=8388608, fullscale_d=12582912, reverse_fullscale_d=4194304,
+        fullscale_load_a=500.0, unit_code="0", decimal_point="2",
+    )
+
+
+@pytest.fixture
+def log():
+    """
+    Time (ms) and ADC columns of a 10^4 sample log.
+    """
+    return synthetic_log(10000)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import archive
+
+
+def test_zigzag_varint_round_trip():
+    values = np.array([0, -1, 1, -2, 2, 63, -64, 64, 2 ** 40, -2 ** 40,
+                       2 ** 62, -2 ** 63, 2 ** 63 - 1], dtype=np.int64)
+    encoded = archive.zigzag_encode(values)
+    np.testing.assert_array_equal(encoded[:5], [0, 1, 2, 3, 4])
+    packed = archive.encode_varint(encoded)
+    np.testing.assert_array_equal(archive.zigzag_decode(archive.decode_varint(packed)), values)
+
+
+def test_round_trip(tmp_path, log):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "log.tqz")
+    archive.write_archive(path, tim_vals, adc_vals, chunk_size=1024)
+    times, adc = archive.read_archive(path)
+    np.testing.assert_array_equal(times, tim_vals)
+    np.testing.assert_array_equal(adc, adc_vals)
+
+
+def test_read_range(tmp_path, log):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "log.tqz")
+    archive.write_archive(path, tim_vals, adc_vals, chunk_size=1024)
+    opened = archive.Archive(path)
+    assert len(opened) == len(tim_vals)
+    assert opened.n_chunks == 10
+    for start, stop in ((0, 1), (1000, 1100), (1023, 1025), (3000, 9999), (9000, None)):
+        times, adc = opened.read(start, stop)
+        np.testing.assert_array_equal(times, tim_vals[start:stop])
+        np.testing.assert_array_equal(adc, adc_vals[start:stop])
+
+
+def test_corrupted_chunk(tmp_path, log):
+    path = tmp_path / "log.tqz"
+    archive.write_archive(str(path), *log, chunk_size=1024)
+    data = bytearray(path.read_bytes())
+    data[archive.HEADER_SIZE + 10] ^= 0xFF
+    path.write_bytes(bytes(data))
+    opened = archive.Archive(str(path))
+    with pytest.raises(ValueError):
+        opened.read_chunk(0)
+    # The other chunks are still read
+    np.testing.assert_array_equal(opened.read_chunk(1)[0], log[0][1024:2048])
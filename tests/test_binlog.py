@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import binlog
+from conversion import DA_convert
+
+
+def test_round_trip(tmp_path, log, calibration):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "log.tqb")
+    binlog.write_binlog(path, tim_vals, adc_vals, serial="479586", **calibration.registers)
+    log_file = binlog.read_binlog(path)
+    np.testing.assert_array_equal(log_file.time, tim_vals)
+    np.testing.assert_array_equal(log_file.adc, adc_vals)
+    np.testing.assert_array_equal(
+        log_file.torque, calibration.convert(adc_vals, dtype=np.float32)
+    )
+    assert log_file.header["n_samples"] == len(tim_vals)
+    assert log_file.header["serial"] == "479586"
+    assert log_file.header["sampling_period"] == 20
+
+
+def test_empty_log(tmp_path):
+    path = str(tmp_path / "empty.tqb")
+    binlog.write_binlog(path, [], [], [])
+    log_file = binlog.read_binlog(path)
+    assert len(log_file.time) == len(log_file.adc) == len(log_file.torque) == 0
+
+
+def test_not_a_binlog(tmp_path):
+    path = tmp_path / "log.tqb"
+    path.write_bytes(b"not a log")
+    with pytest.raises(ValueError):
+        binlog.read_binlog(str(path))
+
+
+def test_convert_text_log(tmp_path, log, calibration):
+    tim_vals, adc_vals = log
+    tq_vals = DA_convert(adc_vals, **calibration.registers)
+    text_path = str(tmp_path / "saved.dat")
+    np.savetxt(text_path, np.column_stack((tim_vals, adc_vals, tq_vals)),
+               fmt=["%i", "%i", "%f"], header="Time(ms)\tADC Count\tTorque (N.cm)",
+               delimiter="\t")
+    path = str(tmp_path / "saved.tqb")
+    binlog.convert_text_log(text_path, path)
+    log_file = binlog.read_binlog(path)
+    np.testing.assert_array_equal(log_file.time, tim_vals)
+    np.testing.assert_array_equal(log_file.adc, adc_vals)
+    # The torque column of the text, rounded to 6 decimals by save_data
+    np.testing.assert_allclose(log_file.torque, tq_vals, atol=1E-4)
+
+
+def test_cli_requires_all_registers(tmp_path, log):
+    text_path = str(tmp_path / "log.dat")
+    np.savetxt(text_path, np.column_stack((np.arange(len(log[0])), *log)))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = os.path.join(root, "binlog.py")
+    result = subprocess.run([sys.executable, script, text_path, "--fullscale-load", "500"],
+                            capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "must be given together" in result.stderr
+    assert not os.path.exists(tmp_path / "log.tqb")
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from conversion import DA_convert, _DA_convert_loop, loading_point_convert
+
+REGISTERS = (8388608, 12582912, 4194304, 500.0)
+
+
+def test_da_convert_matches_loop():
+    adc_vals = np.random.default_rng(0).integers(4000000, 13000000, 1000)
+    np.testing.assert_allclose(
+        DA_convert(adc_vals, *REGISTERS), _DA_convert_loop(adc_vals, *REGISTERS),
+        rtol=1E-12, atol=1E-9,
+    )
+
+
+def test_da_convert_fullscale():
+    offset_d, fullscale_d, reverse_fullscale_d, load = REGISTERS
+    converted = DA_convert(
+        np.array([reverse_fullscale_d, offset_d, fullscale_d]), *REGISTERS
+    )
+    np.testing.assert_allclose(converted, [-load, 0.0, load])
+
+
+def test_da_convert_scalar_and_2d():
+    assert DA_convert(REGISTERS[1], *REGISTERS) == pytest.approx(REGISTERS[3])
+    adc_vals = np.arange(4000000, 4000012).reshape(3, 4)
+    np.testing.assert_array_equal(
+        DA_convert(adc_vals, *REGISTERS), DA_convert(adc_vals.ravel(), *REGISTERS).reshape(3, 4)
+    )
+
+
+def test_da_convert_out():
+    adc_vals = np.arange(8000000, 8000100)
+    out = np.empty(100, dtype=np.float32)
+    assert DA_convert(adc_vals, *REGISTERS, out=out) is out
+    np.testing.assert_allclose(out, DA_convert(adc_vals, *REGISTERS), rtol=1E-6)
+
+
+def test_da_convert_strided_out():
+    # A field of a structured array, as rotation.RotationChannels passes
+    adc_vals = np.arange(8000000, 8000100)
+    samples = np.zeros(100, dtype=[("torque", np.float64), ("rpm", np.float64)])
+    DA_convert(adc_vals, *REGISTERS, out=samples["torque"])
+    np.testing.assert_array_equal(samples["torque"], DA_convert(adc_vals, *REGISTERS))
+
+
+def test_da_convert_bad_out():
+    adc_vals = np.zeros((4, 4), dtype=np.int64)
+    with pytest.raises(ValueError):
+        DA_convert(adc_vals, *REGISTERS, out=np.empty(16))
+    with pytest.raises(ValueError):
+        DA_convert(adc_vals, *REGISTERS, out=np.empty((4, 8))[:, ::2])
+
+
+def test_loading_point_convert():
+    points_d = [4194304, 8388608, 8388608, 10000000, 12582912]
+    loads_a = [-500.0, 0.0, 0.0, 150.0, 500.0]
+    converted = loading_point_convert(
+        np.array([4194304, 8388608, 9194304, 10000000, 12582912, 13000000]), points_d, loads_a
+    )
+    slope = 350.0 / (12582912 - 10000000)
+    np.testing.assert_allclose(
+        converted, [-500.0, 0.0, 75.0, 150.0, 500.0, 500.0 + slope * 417088]
+    )
+
+
+def test_loading_point_convert_two_points_is_linear():
+    offset_d, fullscale_d, _, load = REGISTERS
+    adc_vals = np.arange(8000000, 13000000, 1000)
+    np.testing.assert_allclose(
+        loading_point_convert(adc_vals, [offset_d, fullscale_d], [0.0, load]),
+        load * (adc_vals - offset_d) / (fullscale_d - offset_d),
+    )
+
+
+def test_loading_point_convert_needs_two_points():
+    with pytest.raises(ValueError):
+        loading_point_convert([1, 2], [5, 5], [0.0, 0.0])
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import simulator
+from datalog import (
+    DataLogError, DataLogReader, FastDataLogReader, download_data_log, open_reader,
+    probe_log_length
+)
+
+MEMORY_SIZE = 4096
+# Around the indexes visited by the exponential search, 1 + 2^k
+LENGTHS = [2, 3, 4, 5, 16, 17, 18, 1024, 1025, 2047]
+
+
+def zeros(tim_vals, adc_vals):
+    return simulator.SimulatedDevice("1", tim_vals, adc_vals, memory_size=MEMORY_SIZE)
+
+
+def stale_faster(tim_vals, adc_vals):
+    # An older recording at 10 ms
+    device = zeros(tim_vals, adc_vals)
+    device.fill_memory(*simulator.synthetic_log(MEMORY_SIZE, period_ms=10, seed=1))
+    return device
+
+
+def stale_later(tim_vals, adc_vals):
+    # An older recording at the same period, started 60 s later
+    device = zeros(tim_vals, adc_vals)
+    stale_tim, stale_adc = simulator.synthetic_log(MEMORY_SIZE, seed=2)
+    device.fill_memory(stale_tim + 60000, stale_adc)
+    return device
+
+
+def wrapped(tim_vals, adc_vals):
+    # A recording longer than the memory, continued at address 0 over its own start
+    n_samples = len(tim_vals)
+    recording_tim, recording_adc = simulator.synthetic_log(MEMORY_SIZE + n_samples, seed=3)
+    device = zeros(recording_tim[MEMORY_SIZE:], recording_adc[MEMORY_SIZE:])
+    device.fill_memory(recording_tim[:MEMORY_SIZE], recording_adc[:MEMORY_SIZE])
+    return device
+
+
+@pytest.fixture
+def open_device():
+    def open_device(device):
+        simulator.add_device(device)
+        dev = simulator.USB_DLL()
+        dev.Open_Device_Connection(device.serial)
+        return dev, dev.DeviceHandle
+    yield open_device
+    simulator.clear_devices()
+
+
+@pytest.mark.parametrize("layout", [zeros, stale_faster, stale_later, wrapped])
+@pytest.mark.parametrize("n_samples", LENGTHS)
+def test_probe_finds_length(open_device, layout, n_samples):
+    device = layout(*simulator.synthetic_log(n_samples))
+    dev, handle = open_device(device)
+    before = device.round_trips
+    assert probe_log_length(dev, handle) == device.n_samples
+    # Two reads per index visited, about 2 log2(n) indexes
+    assert device.round_trips - before <= 4 * np.log2(n_samples) + 8
+    tim_vals, adc_vals = download_data_log(dev, handle, reader=DataLogReader(dev, handle))
+    np.testing.assert_array_equal(tim_vals, device.tim_vals)
+    np.testing.assert_array_equal(adc_vals, device.adc_vals)
+
+
+@pytest.mark.parametrize("n_samples", [2, 1024, MEMORY_SIZE])
+def test_log_filling_the_memory(open_device, n_samples):
+    tim_vals, adc_vals = simulator.synthetic_log(n_samples)
+    device = simulator.SimulatedDevice("1", tim_vals, adc_vals, memory_size=n_samples)
+    dev, handle = open_device(device)
+    assert probe_log_length(dev, handle) == n_samples
+
+
+@pytest.mark.parametrize("n_samples", [0, 1])
+def test_no_sampling_period(open_device, n_samples):
+    # An empty memory, or a single sample, has no interval to measure
+    dev, handle = open_device(zeros(*simulator.synthetic_log(n_samples)))
+    with pytest.raises(DataLogError):
+        probe_log_length(dev, handle)
+
+
+def test_fast_reader_is_opt_in(open_device):
+    device = zeros(*simulator.synthetic_log(1000))
+    dev, handle = open_device(device)
+    assert type(open_reader(dev, handle)) is DataLogReader
+    assert type(open_reader(dev, handle, fast=True)) is FastDataLogReader
+    device.fast_logging = False
+    assert type(open_reader(dev, handle, fast=True)) is DataLogReader
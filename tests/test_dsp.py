@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import dsp
+
+STAGES = {
+    "moving_average": lambda: dsp.MovingAverage(25),
+    "median": lambda: dsp.MedianDespike(7),
+    "despike": lambda: dsp.MedianDespike(5, threshold=2.0),
+    "low_pass": lambda: dsp.LowPass(5.0, 50.0, order=3),
+    "pipeline": lambda: dsp.Pipeline(dsp.MedianDespike(5, 2.0), dsp.LowPass(5.0, 50.0)),
+}
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(0)
+    values = np.sin(np.arange(20000) / 200) * 10 + rng.normal(0, 0.5, 20000)
+    values[rng.integers(0, 20000, 50)] += 30
+    return values
+
+
+@pytest.mark.parametrize("name", STAGES)
+@pytest.mark.parametrize("block_size", [1, 7, 1000, 4096])
+def test_blocks_match_whole(name, block_size, signal):
+    whole = STAGES[name]().process(signal)
+    blocks = dsp.apply(STAGES[name](), signal[:5000] if block_size == 1 else signal,
+                       block_size=block_size)
+    np.testing.assert_allclose(blocks, whole[:len(blocks)], rtol=1E-9, atol=1E-9)
+
+
+def test_moving_average(signal):
+    output = dsp.MovingAverage(4).process(signal[:100])
+    np.testing.assert_allclose(output[3:], np.convolve(signal[:100], np.ones(4) / 4, "valid"))
+    np.testing.assert_allclose(output[:3], np.cumsum(signal[:3]) / [1, 2, 3])
+
+
+def test_monitors_match_whole(signal):
+    hold, stats = dsp.PeakValleyHold(), dsp.RunningStats()
+    output = dsp.apply(dsp.Pipeline(hold, stats), signal, block_size=333)
+    np.testing.assert_array_equal(output, signal)
+    assert (hold.peak, hold.peak_index) == (signal.max(), int(signal.argmax()))
+    assert (hold.valley, hold.valley_index) == (signal.min(), int(signal.argmin()))
+    assert hold.track == signal[-1]
+    assert stats.count == len(signal)
+    assert stats.mean == pytest.approx(signal.mean(), rel=1E-12)
+    assert stats.std == pytest.approx(signal.std(), rel=1E-12)
+    assert (stats.min, stats.max) == (signal.min(), signal.max())
+
+
+def test_reset(signal):
+    stage = dsp.LowPass(5.0, 50.0)
+    first = stage.process(signal[:100])
+    stage.reset()
+    np.testing.assert_array_equal(stage.process(signal[:100]), first)
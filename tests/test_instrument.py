@@ -0,0 +1,33 @@
+import time
+
+import instrument
+from instrument import InstrumentedDevice
+
+
+class Device:
+    DeviceStatus = 0
+    delay = 0.0
+
+    def Normal_Data_Request(self, handle, channel=0):
+        if self.delay:
+            time.sleep(self.delay)
+        return "8388608"
+
+
+def test_latencies_of_recent_calls(monkeypatch):
+    monkeypatch.setattr(instrument, "LATENCY_WINDOW", 100)
+    device = Device()
+    dev = InstrumentedDevice(device, trace=False)
+    for _ in range(250):
+        dev.Normal_Data_Request(1, 2)
+    device.delay = 1E-3
+    for _ in range(100):
+        dev.Normal_Data_Request(1, 2)
+    stats = dev.stats("Normal_Data_Request")
+    assert stats.calls == 350
+    assert len(stats.latencies) == 100
+    # Only the slow calls are left in the window, the mean covers all of them
+    summary = stats.summary()
+    assert summary["p50_us"] >= 1000
+    assert summary["mean_us"] < summary["p50_us"]
+    assert sum(count for _, count in stats.histogram()) == 100
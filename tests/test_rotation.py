@@ -0,0 +1,30 @@
+import time
+
+import simulator
+from rotation import SAMPLE_DTYPE, RotationAcquisition
+from session import DeviceSession
+
+SERIAL = "479586"
+
+
+def test_reconnects_after_drop():
+    device = simulator.add_device(simulator.SimulatedDevice(SERIAL, latency=1E-4))
+    device.rpm = 60.0
+    try:
+        session = DeviceSession(simulator.USB_DLL(), SERIAL, initial_delay=0.01)
+        assert session.open()
+        acquisition = RotationAcquisition(None, None, rotation_every=4, session=session)
+        assert acquisition.buffer.values.dtype == SAMPLE_DTYPE
+        acquisition.start()
+        time.sleep(0.1)
+        device.unplug(0.1)
+        time.sleep(0.2)
+        written = acquisition.buffer.written
+        time.sleep(0.1)
+        acquisition.stop()
+        assert acquisition.error is None
+        assert session.reconnects == 1
+        # Still sampling after the reconnection
+        assert acquisition.buffer.written > written
+    finally:
+        simulator.clear_devices()
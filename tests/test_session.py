@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import datalog
+import simulator
+from datalog import DataLogCancelled
+from session import DeviceSession, ReconnectError
+
+SERIAL = "479586"
+
+
+@pytest.fixture
+def device():
+    tim_vals, adc_vals = simulator.synthetic_log(3000, seed=1)
+    yield simulator.add_device(simulator.SimulatedDevice(SERIAL, tim_vals, adc_vals))
+    simulator.clear_devices()
+
+
+@pytest.fixture
+def session(device):
+    session = DeviceSession(simulator.USB_DLL(), SERIAL, initial_delay=0.01,
+                            max_delay=0.05, timeout=5.0)
+    assert session.open()
+    return session
+
+
+def test_reconnect_after_drop(device, session):
+    device.unplug(0.1)
+    assert not session.check()
+    assert session.link_lost()
+    recovery = session.reconnect()
+    assert 0.1 <= recovery < 1.0
+    assert session.connected and session.check()
+    assert session.stats()["reconnects"] == 1
+
+
+def test_call_replays_failed_command(device, session):
+    # The first read goes through, the device is unplugged right after it
+    device.drop_after(1, 0.1)
+    assert session.call("Normal_Data_Request", 2) != "Error"
+    round_trips = device.round_trips
+    response = session.call("Normal_Data_Request", 2)
+    assert response != "Error"
+    int(response)
+    assert session.replayed == 1
+    assert session.drops == 1
+    # The read was sent again, after the reconnection
+    assert device.round_trips >= round_trips + 2
+
+
+@pytest.mark.parametrize("fast_logging", [True, False])
+def test_download_resumes_after_drop(device, session, fast_logging, monkeypatch):
+    monkeypatch.setattr(datalog, "FAST_LOGGING", fast_logging)
+    round_trips = device.round_trips
+    session.download_log()
+    full_download = device.round_trips - round_trips
+    device.drop_after(full_download // 2, 0.1)
+    dropped = []
+    tim_vals, adc_vals = session.download_log(on_drop=dropped.append)
+    np.testing.assert_array_equal(tim_vals, device.tim_vals)
+    np.testing.assert_array_equal(adc_vals, device.adc_vals)
+    assert len(dropped) == 1
+    assert session.reconnects == 1
+
+
+def test_gives_up_after_timeout(device, session):
+    session.timeout = 0.3
+    device.unplug()
+    start = time.perf_counter()
+    with pytest.raises(ReconnectError):
+        session.call("Normal_Data_Request", 2)
+    assert 0.3 <= time.perf_counter() - start < 1.0
+    assert not session.connected
+
+
+def test_cancel_stops_retries(device, session):
+    device.unplug()
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    start = time.perf_counter()
+    assert session.reconnect(cancel) is None
+    assert time.perf_counter() - start < 1.0
+    # An already cancelled retry loop returns at its first wait
+    assert session.call("Normal_Data_Request", 2, cancel=cancel) == "Error"
+    with pytest.raises(DataLogCancelled):
+        session.download_log(cancel=cancel)
+    assert session.reconnects == 0
@@ -0,0 +1,62 @@
+import numpy as np
+
+import streamlog
+
+
+def record(path, log, calibration, chunk_size=1000):
+    """
+    Writes the log as the live view does, timestamps in s, in blocks of 700 samples.
+    """
+    tim_vals, adc_vals = log
+    timestamps = 100.0 + tim_vals / 1000
+    with streamlog.StreamWriter(path, calibration, chunk_size=chunk_size) as writer:
+        for start in range(0, len(adc_vals), 700):
+            writer.write(timestamps[start:start + 700], adc_vals[start:start + 700])
+    return writer
+
+
+def test_binary_round_trip(tmp_path, log, calibration):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "live.tqs")
+    writer = record(path, log, calibration)
+    header, times, adc, torque = streamlog.read_stream_log(path)
+    assert writer.n_samples == len(adc) == len(adc_vals)
+    assert header["serial"] == "479586"
+    assert header["offset_d"] == calibration.offset_d
+    np.testing.assert_allclose(times, (tim_vals - tim_vals[0]) / 1000, atol=1E-9)
+    np.testing.assert_array_equal(adc, adc_vals)
+    np.testing.assert_array_equal(torque, calibration.convert(adc_vals, dtype=np.float32))
+
+
+def test_text_round_trip(tmp_path, log, calibration):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "live.dat")
+    record(path, log, calibration)
+    times, adc, torque = np.loadtxt(path, unpack=True)
+    np.testing.assert_allclose(times, tim_vals - tim_vals[0], atol=1E-3)
+    np.testing.assert_array_equal(adc, adc_vals)
+    np.testing.assert_allclose(torque, calibration.convert(adc_vals), atol=1E-4)
+
+
+def test_recover_binary(tmp_path, log, calibration):
+    path = tmp_path / "live.tqs"
+    record(str(path), log, calibration)
+    # A crash during the last chunk: no trailer and half of the last chunk
+    chunk_bytes = streamlog.CHUNK_HEADER.size + 1000 * streamlog.SAMPLE_SIZE
+    end = streamlog.HEADER_SIZE + 10 * chunk_bytes
+    path.write_bytes(path.read_bytes()[:end - chunk_bytes // 2])
+    assert streamlog.recover(str(path)) == 9000
+    _, _, adc, _ = streamlog.read_stream_log(str(path))
+    np.testing.assert_array_equal(adc, log[1][:9000])
+    # A log with its trailer is left as is
+    assert streamlog.recover(str(path)) == 9000
+
+
+def test_recover_text(tmp_path, log, calibration):
+    path = tmp_path / "live.dat"
+    record(str(path), log, calibration)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) - 5])
+    assert streamlog.recover(str(path)) == len(log[1]) - 1
+    adc = np.loadtxt(str(path), usecols=1)
+    np.testing.assert_array_equal(adc, log[1][:-1])
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pytest
+
+import textlog
+from conversion import DA_convert
+
+
+def write_dat(path, tim_vals, adc_vals):
+    # The layout of the .dat files: index, time, ADC in np.savetxt's default format
+    np.savetxt(path, np.column_stack((np.arange(len(tim_vals)), tim_vals, adc_vals)))
+
+
+def write_saved(path, tim_vals, adc_vals, tq_vals):
+    # Same call as MainWindow.save_data
+    np.savetxt(path, np.column_stack((tim_vals, adc_vals, tq_vals)),
+               fmt=["%i", "%i", "%f"], header="Time(ms)\tADC Count\tTorque (N.cm)",
+               delimiter="\t")
+
+
+def read_chunks(path, **kwargs):
+    chunks = list(textlog.iter_text_log(path, **kwargs))
+    return tuple(
+        None if chunks[0][column] is None
+        else np.concatenate([chunk[column] for chunk in chunks])
+        for column in range(3)
+    )
+
+
+@pytest.fixture
+def saved(tmp_path, log):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "saved.dat")
+    write_saved(path, tim_vals, adc_vals, DA_convert(adc_vals, 8388608, 12582912, 4194304, 500.0))
+    return path
+
+
+def test_dat_layout(tmp_path, log):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "log.dat")
+    write_dat(path, tim_vals, adc_vals)
+    layout = textlog.detect_layout(path)
+    assert (layout.name, layout.data_offset) == ("dat", 0)
+    times, adc, torque = read_chunks(path, chunk_size=1000, block_size=4096)
+    np.testing.assert_array_equal(times, tim_vals)
+    np.testing.assert_array_equal(adc, adc_vals)
+    assert adc.dtype == np.int64
+    assert torque is None
+
+
+def test_save_data_layout(saved):
+    reference = np.loadtxt(saved, ndmin=2)
+    assert textlog.detect_layout(saved).name == "save_data"
+    times, adc, torque = read_chunks(saved, block_size=4096)
+    np.testing.assert_array_equal(times, reference[:, 0])
+    np.testing.assert_array_equal(adc, reference[:, 1])
+    np.testing.assert_array_equal(torque, reference[:, 2])
+
+
+def test_chunks_match_whole_log(saved):
+    reference = np.loadtxt(saved, ndmin=2)
+    chunks = list(textlog.iter_text_log(saved, chunk_size=1000, block_size=4096))
+    assert [len(chunk[0]) for chunk in chunks] == [1000] * 10
+    for column in range(3):
+        np.testing.assert_array_equal(
+            np.concatenate([chunk[column] for chunk in chunks]), reference[:, column]
+        )
+
+
+def test_time_range_through_index(saved):
+    reference = np.loadtxt(saved, ndmin=2)
+    times, adc = reference[:, 0], reference[:, 1]
+    start_time, stop_time = times[4321], times[6000]
+    range_times, range_adc, _ = textlog.read_range(saved, start_time, stop_time)
+    assert os.path.exists(textlog.index_path(saved))
+    np.testing.assert_array_equal(range_times, times[4321:6000])
+    np.testing.assert_array_equal(range_adc, adc[4321:6000])
+    # Read again with the index written by the first read
+    np.testing.assert_array_equal(
+        textlog.read_range(saved, start_time, stop_time)[0], times[4321:6000]
+    )
+
+
+def test_index_rebuilt_when_log_changes(tmp_path, log):
+    tim_vals, adc_vals = log
+    path = str(tmp_path / "log.dat")
+    write_dat(path, tim_vals[:5000], adc_vals[:5000])
+    textlog.build_index(path, block_size=4096)
+    assert textlog.load_index(path) is not None
+    write_dat(path, tim_vals, adc_vals)
+    assert textlog.load_index(path) is None
+    times, _, _ = textlog.read_range(path, tim_vals[8000])
+    np.testing.assert_array_equal(times, tim_vals[8000:])
+
+
+def test_bad_line(tmp_path):
+    path = str(tmp_path / "bad.dat")
+    with open(path, "w") as log_file:
+        log_file.write("# Time(ms)\tADC Count\tTorque (N.cm)\n0\t1\t2.5\n20\t2\n")
+    with pytest.raises(ValueError):
+        read_chunks(path)
+
+
+def test_empty_log(tmp_path):
+    path = str(tmp_path / "empty.dat")
+    with open(path, "w") as log_file:
+        log_file.write("# Time(ms)\tADC Count\tTorque (N.cm)\n\n")
+    assert list(textlog.iter_text_log(path)) == []
+    times, adc, torque = textlog.read_range(path, 0)
+    assert len(times) == len(adc) == len(torque) == 0
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import timing
+
+
+@pytest.fixture
+def times():
+    """
+    Whole ms times of a clock with a 20.012 ms period, with two gaps and two
+    duplicates.
+    """
+    rng = np.random.default_rng(0)
+    slots = np.delete(np.arange(20000), np.r_[5000:5003, 12000])
+    tim_vals = np.round(slots * 20.012 + rng.normal(0, 0.3, len(slots)))
+    return np.insert(tim_vals, [100, 15000], tim_vals[[99, 14999]])
+
+
+def test_report(times):
+    report = timing.analyze_timing(times)
+    assert report.n_samples == len(times)
+    assert report.nominal_period == 20
+    assert report.period == pytest.approx(20.012, abs=1E-4)
+    assert report.duplicates == 2
+    assert report.missing == 4
+    np.testing.assert_array_equal(report.gap_lengths, [3, 1])
+
+
+@pytest.mark.parametrize("chunk_size", [2, 1000, 4999])
+def test_chunks_match_whole(times, chunk_size):
+    whole = timing.analyze_timing(times, chunk_size=len(times))
+    chunked = timing.analyze_timing(times, chunk_size=chunk_size)
+    assert chunked.period == pytest.approx(whole.period, rel=1E-12)
+    assert chunked.start == pytest.approx(whole.start, abs=1E-9)
+    assert chunked.jitter == pytest.approx(whole.jitter, rel=1E-9)
+    assert chunked.duplicates == whole.duplicates
+    np.testing.assert_array_equal(chunked.gap_indices, whole.gap_indices)
+    np.testing.assert_array_equal(chunked.gap_lengths, whole.gap_lengths)
+
+
+@pytest.mark.parametrize("method", ["linear", "cubic"])
+@pytest.mark.parametrize("chunk_size", [3, 1000, 4999])
+def test_resample_chunks_match_whole(times, method, chunk_size):
+    values = np.sin(times / 500)
+    grid, resampled = timing.resample(times, values, 20.0, method=method, max_gap=50,
+                                      chunk_size=len(times))
+    chunk_grid, chunk_resampled = timing.resample(times, values, 20.0, method=method,
+                                                  max_gap=50, chunk_size=chunk_size)
+    np.testing.assert_array_equal(chunk_grid, grid)
+    np.testing.assert_allclose(chunk_resampled, resampled, rtol=1E-12, equal_nan=True)
+    # NaN across the gaps only
+    assert 0 < np.isnan(resampled).sum() < 10
+
+
+def test_resample_linear():
+    grid, values = timing.resample([0, 10, 20], [0.0, 1.0, 3.0], period=5)
+    np.testing.assert_array_equal(grid, [0, 5, 10, 15, 20])
+    np.testing.assert_allclose(values, [0.0, 0.5, 1.0, 2.0, 3.0])
@@ -0,0 +1,289 @@
+"""
+Chunked and time-range reading of the text logs, without loading the whole file.
+Two layouts exist, told apart by the "#" header line:
+    .dat files: index, time (ms) and ADC columns, written by np.savetxt with its
+    default scientific notation and no header.
+    save_data and StreamWriter text files: a "# Time(ms)\tADC Count\tTorque (N.cm)"
+    header, then the time, ADC and torque columns separated by tabs.
+iter_text_log reads the file block by block, parses each block with np.loadtxt
+and yields chunks of a fixed number of samples, so the memory used depends on the
+block and chunk sizes instead of the length of the log. It is not faster than one
+np.loadtxt call: whole logs that fit in memory are read by binlog.read_text_log.
+
+A sidecar index (filename + INDEX_SUFFIX) holds the offset and the first time of
+every block, so read_range only parses the blocks that hold the time range. It is
+written by build_index, or at the first read of a time range, and rebuilt when
+the log changes. The time ranges assume the times don't decrease.
+"""
+import io
+import os
+
+import numpy as np
+
+INDEX_MAGIC = b"OFTKTIDX"
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+INDEX_HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u2"),
+    ("header_size", "<u2"),
+    ("block_size", "<u4"),
+    ("source_size", "<u8"),
+    ("source_mtime_ns", "<u8"),
+    ("n_entries", "<u8"),
+])
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),  # Offset of the first line of the block in the log
+    ("sample", "<u8"),  # Index of the first sample of the block
+    ("first_time", "<f8"),
+])
+
+CHUNK_SIZE = 1 << 16
+# Bytes read and parsed at a time, cut after the last complete line
+BLOCK_SIZE = 1 << 20
+
+
+class TextLayout:
+    """
+    Columns of a text log: name ("dat" or "save_data"), number of columns, column of
+    the time, the ADC and the torque (None for the .dat files), and the offset of
+    the first data line, after the header.
+    """
+    def __init__(self, name, n_columns, time_column, adc_column, torque_column,
+                 data_offset):
+        self.name = name
+        self.n_columns = n_columns
+        self.time_column = time_column
+        self.adc_column = adc_column
+        self.torque_column = torque_column
+        self.data_offset = data_offset
+
+    def __repr__(self):
+        return f"TextLayout({self.name!r}, data_offset={self.data_offset})"
+
+
+def detect_layout(filename):
+    """
+    Returns the TextLayout of a text log.
+    Raises ValueError if the first data line doesn't have the columns of the layout.
+    """
+    data_offset = 0
+    has_header = False
+    first_line = b""
+    with open(filename, "rb") as log_file:
+        for line in log_file:
+            if line.startswith(b"#"):
+                has_header = True
+            elif line.strip():
+                first_line = line
+                break
+            data_offset += len(line)
+    if has_header:
+        layout = TextLayout("save_data", 3, 0, 1, 2, data_offset)
+    else:
+        layout = TextLayout("dat", 3, 1, 2, None, data_offset)
+    n_fields = len(first_line.split())
+    if first_line and n_fields != layout.n_columns:
+        raise ValueError(
+            f"{filename}: {n_fields} columns found, {layout.n_columns} expected "
+            f"({layout.name} layout)."
+        )
+    return layout
+
+
+def parse_block(data, n_columns, columns=None):
+    """
+    Converts a block of complete lines (bytes ending with a newline) of n_columns
+    numbers to a 2D array of the columns given (all by default). Blank lines are
+    skipped.
+    Raises ValueError on a line that isn't n_columns numbers.
+    """
+    columns = list(range(n_columns)) if columns is None else list(columns)
+    if not data.strip():
+        return np.empty((0, len(columns)))
+    values = np.loadtxt(io.BytesIO(data), ndmin=2, comments=None)
+    if values.shape[1] != n_columns:
+        raise ValueError(f"Lines without {n_columns} numbers.")
+    return values[:, columns]
+
+
+def _iter_blocks(filename, offset, block_size=BLOCK_SIZE):
+    """
+    Yields (offset, block) of complete lines from offset to the end of the file.
+    A last line without newline gets one.
+    """
+    with open(filename, "rb") as log_file:
+        log_file.seek(offset)
+        rest = b""
+        while True:
+            data = log_file.read(block_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b"\n") + 1
+            if end:
+                yield offset, data[:end]
+                offset += end
+            rest = data[end:]
+        if rest.strip():
+            yield offset, rest + b"\n"
+
+
+def _iter_values(filename, layout, offset, block_size=BLOCK_SIZE):
+    """
+    Yields (offset, time, ADC, torque) of each block, torque is None if the
+    layout has none.
+    """
+    for block_offset, data in _iter_blocks(filename, offset, block_size):
+        try:
+            values = parse_block(data, layout.n_columns)
+        except ValueError as error:
+            raise ValueError(f"{filename}, block at byte {block_offset}: {error}") from None
+        if not len(values):
+            continue
+        # The other columns (the index of the .dat files) are checked but not returned
+        torque = values[:, layout.torque_column] if layout.torque_column is not None else None
+        yield (block_offset, values[:, layout.time_column],
+               values[:, layout.adc_column].astype(np.int64), torque)
+
+
+def index_path(filename):
+    return filename + INDEX_SUFFIX
+
+
+def build_index(filename, block_size=BLOCK_SIZE):
+    """
+    Reads the whole log and writes its sidecar index.
+    Returns the entries (INDEX_DTYPE array).
+    """
+    stat = os.stat(filename)
+    layout = detect_layout(filename)
+    entries = []
+    n_samples = 0
+    for offset, tim_vals, _, _ in _iter_values(filename, layout, layout.data_offset, block_size):
+        entries.append((offset, n_samples, tim_vals[0]))
+        n_samples += len(tim_vals)
+    entries = np.array(entries, dtype=INDEX_DTYPE)
+    header = np.zeros((), dtype=INDEX_HEADER_DTYPE)
+    header["magic"] = INDEX_MAGIC
+    header["version"] = INDEX_VERSION
+    header["header_size"] = INDEX_HEADER_DTYPE.itemsize
+    header["block_size"] = block_size
+    header["source_size"] = stat.st_size
+    header["source_mtime_ns"] = stat.st_mtime_ns
+    header["n_entries"] = len(entries)
+    try:
+        with open(index_path(filename), "wb") as index_file:
+            index_file.write(header.tobytes())
+            index_file.write(entries.tobytes())
+    except OSError:
+        # The folder may be read-only, the index is only lost for the next read
+        pass
+    return entries
+
+
+def load_index(filename):
+    """
+    Returns the entries of the sidecar index, or None if there is none or the log
+    changed since it was written.
+    """
+    path = index_path(filename)
+    if not os.path.exists(path):
+        return None
+    header = np.fromfile(path, dtype=INDEX_HEADER_DTYPE, count=1)
+    stat = os.stat(filename)
+    if (len(header) != 1 or header["magic"][0] != INDEX_MAGIC
+            or header["version"][0] > INDEX_VERSION
+            or header["source_size"][0] != stat.st_size
+            or header["source_mtime_ns"][0] != stat.st_mtime_ns):
+        return None
+    entries = np.fromfile(
+        path, dtype=INDEX_DTYPE, count=int(header["n_entries"][0]),
+        offset=int(header["header_size"][0])
+    )
+    return entries if len(entries) == header["n_entries"][0] else None
+
+
+def _iter_range(filename, start_time=None, stop_time=None, block_size=BLOCK_SIZE):
+    """
+    Yields the (time, ADC, torque) arrays of each block, keeping the samples with
+    start_time <= time < stop_time. The sidecar index is used to skip to the first
+    block holding start_time.
+    """
+    layout = detect_layout(filename)
+    offset = layout.data_offset
+    if start_time is not None:
+        entries = load_index(filename)
+        if entries is None:
+            entries = build_index(filename, block_size)
+        block = np.searchsorted(entries["first_time"], start_time, side="left") - 1
+        if block > 0:
+            offset = int(entries["offset"][block])
+
+    for _, tim_vals, adc_vals, tq_vals in _iter_values(filename, layout, offset, block_size):
+        done = stop_time is not None and tim_vals[-1] >= stop_time
+        if start_time is not None or stop_time is not None:
+            keep = np.ones(len(tim_vals), dtype=bool)
+            if start_time is not None:
+                keep &= tim_vals >= start_time
+            if stop_time is not None:
+                keep &= tim_vals < stop_time
+            tim_vals, adc_vals = tim_vals[keep], adc_vals[keep]
+            tq_vals = tq_vals[keep] if tq_vals is not None else None
+        yield tim_vals, adc_vals, tq_vals
+        if done:
+            break
+
+
+def iter_text_log(filename, chunk_size=CHUNK_SIZE, start_time=None, stop_time=None,
+                  block_size=BLOCK_SIZE):
+    """
+    Yields the samples of a text log in chunks of chunk_size samples (the last one
+    shorter), as (time, ADC, torque) arrays: float64 times (ms), int64 ADC counts
+    and float64 torques, None for the .dat files.
+    start_time, stop_time: Only the samples with start_time <= time < stop_time
+                           are read, the sidecar index is used to skip to the
+                           first block holding start_time.
+    """
+    pending = []
+    n_pending = 0
+    for block in _iter_range(filename, start_time, stop_time, block_size):
+        pending.append(block)
+        n_pending += len(block[0])
+        if n_pending >= chunk_size:
+            columns = _concatenate(pending)
+            n_full = n_pending - n_pending % chunk_size
+            for start in range(0, n_full, chunk_size):
+                yield tuple(
+                    column[start:start + chunk_size] if column is not None else None
+                    for column in columns
+                )
+            pending = [tuple(
+                column[n_full:] if column is not None else None for column in columns
+            )]
+            n_pending -= n_full
+    if n_pending:
+        yield _concatenate(pending)
+
+
+def _concatenate(chunks):
+    tim_vals, adc_vals, tq_vals = zip(*chunks)
+    return (
+        np.concatenate(tim_vals), np.concatenate(adc_vals),
+        None if tq_vals[0] is None else np.concatenate(tq_vals),
+    )
+
+
+def read_range(filename, start_time, stop_time=None):
+    """
+    Reads the samples with start_time <= time < stop_time (to the end of the log if
+    stop_time is None), skipping to the first block holding start_time with the
+    sidecar index.
+    Returns the time, ADC and torque arrays, torque is None for the .dat files.
+    """
+    blocks = list(_iter_range(filename, start_time, stop_time))
+    if not blocks:
+        torque = None if detect_layout(filename).torque_column is None else np.empty(0)
+        return np.empty(0), np.empty(0, dtype=np.int64), torque
+    return _concatenate(blocks)
@@ -0,0 +1,298 @@
+"""
+Repair of the time column of the logs.
+The IHH500 timestamps its samples in whole milliseconds with a clock that drifts
+from the nominal period: the sample log steps by 20 ms but sometimes by 21 ms, its
+true period being about 20.012 ms. TimingAnalyzer estimates the sampling period by
+a least-squares fit of the times against the sample slots, and finds the gaps
+(samples missing) and the duplicates (samples whose time does not advance). The
+Resampler interpolates the values onto a uniform grid, linearly or with cubic
+Hermite splines, so logs can be compared and filtered.
+Both work on consecutive chunks and keep only a few samples between them, so a
+10^8 sample log is processed chunk by chunk (iter_chunks, e.g. on the memory-mapped
+columns of a binary log) with constant memory, and gives the same result as
+processing it at once.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# Samples per chunk used by the functions working on whole arrays
+CHUNK_SIZE = 1 << 18
+
+
+@dataclass
+class TimingReport:
+    """
+    Timing of a log, times in ms.
+    """
+    n_samples: int
+    period: float  # Fitted sampling period
+    start: float  # Fitted time of the first sample
+    jitter: float  # Standard deviation of the times around the fit
+    nominal_period: float  # Period used to count the slots between two samples
+    duplicates: int  # Samples whose time does not advance, ignored
+    gap_indices: np.ndarray  # Index of the first sample after each gap
+    gap_lengths: np.ndarray  # Number of samples missing in each gap
+
+    @property
+    def missing(self):
+        return int(self.gap_lengths.sum())
+
+
+def iter_chunks(*columns, chunk_size=CHUNK_SIZE):
+    """
+    Yields consecutive chunks of the columns (arrays or memory maps) as tuples.
+    """
+    for start in range(0, len(columns[0]), chunk_size):
+        yield tuple(column[start:start + chunk_size] for column in columns)
+
+
+def nominal_period(tim_vals):
+    """
+    Median interval between the samples whose time advances.
+    """
+    deltas = np.diff(np.asarray(tim_vals, dtype=np.float64))
+    deltas = deltas[deltas > 0]
+    if not len(deltas):
+        raise ValueError("The times never advance, the period can't be estimated.")
+    return float(np.median(deltas))
+
+
+class TimingAnalyzer:
+    """
+    Estimates the timing of a log from consecutive chunks of its times.
+    Each interval is counted as a whole number of nominal periods (slots): 0 is a
+    duplicate, 2 or more a gap. The fit of the times against the slots gives the
+    true period, its statistics are merged chunk by chunk (Chan et al.).
+    """
+    def __init__(self, nominal=None):
+        """
+        nominal: Nominal sampling period (ms), the median interval of the first
+                 chunk if None.
+        """
+        self.nominal = nominal
+        self.n_samples = 0
+        self.duplicates = 0
+        self._gap_indices = []
+        self._gap_lengths = []
+        # Latest time and slot of the samples that advanced
+        self._last_time = None
+        self._last_slot = -1
+        # The fit is made on the difference between the times and the nominal
+        # times from the first one, whose sums of squares stay small enough to
+        # compute the jitter without cancellation over 10^8 samples
+        self._origin = None
+        # Fit statistics: count, means and centered sums of products
+        self._n = 0
+        self._mean_s = self._mean_t = 0.0
+        self._ss = self._st = self._tt = 0.0
+
+    def update(self, tim_vals):
+        tim_vals = np.asarray(tim_vals, dtype=np.float64)
+        if not len(tim_vals):
+            return
+        if self.nominal is None:
+            self.nominal = nominal_period(tim_vals)
+        if self._last_time is None:
+            previous = np.concatenate(([tim_vals[0] - self.nominal], tim_vals[:-1]))
+        else:
+            previous = np.concatenate(([self._last_time], tim_vals[:-1]))
+        # Intervals from the latest sample that advanced, so a time going back
+        # makes one duplicate instead of a gap at the next sample
+        previous = np.maximum.accumulate(previous)
+        steps = np.rint((tim_vals - previous) / self.nominal).astype(np.int64)
+        np.maximum(steps, 0, out=steps)
+        slots = self._last_slot + np.cumsum(steps)
+        advanced = steps > 0
+        self.duplicates += len(steps) - int(np.count_nonzero(advanced))
+        gaps = np.flatnonzero(steps > 1)
+        self._gap_indices.append(self.n_samples + gaps)
+        self._gap_lengths.append(steps[gaps] - 1)
+        if self._origin is None:
+            self._origin = tim_vals[0]
+        fitted = slots[advanced].astype(np.float64)
+        self._merge(fitted, tim_vals[advanced] - self._origin - self.nominal * fitted)
+        self.n_samples += len(tim_vals)
+        self._last_time = max(previous[-1], tim_vals[-1])
+        self._last_slot = int(slots[-1])
+
+    def _merge(self, slots, deviations):
+        n_chunk = len(slots)
+        if not n_chunk:
+            return
+        mean_s, mean_t = slots.mean(), deviations.mean()
+        d_s, d_t = slots - mean_s, deviations - mean_t
+        n = self._n + n_chunk
+        delta_s, delta_t = mean_s - self._mean_s, mean_t - self._mean_t
+        weight = self._n * n_chunk / n
+        self._ss += float(d_s @ d_s) + delta_s * delta_s * weight
+        self._st += float(d_s @ d_t) + delta_s * delta_t * weight
+        self._tt += float(d_t @ d_t) + delta_t * delta_t * weight
+        self._mean_s += delta_s * n_chunk / n
+        self._mean_t += delta_t * n_chunk / n
+        self._n = n
+
+    def result(self):
+        """
+        Returns the TimingReport of the times seen so far.
+        """
+        if self._n < 2 or self._ss == 0:
+            raise ValueError("At least two samples with different times are needed.")
+        drift = self._st / self._ss
+        residual = max(self._tt - self._st * drift, 0.0)
+        return TimingReport(
+            n_samples=self.n_samples,
+            period=float(self.nominal + drift),
+            start=float(self._origin + self._mean_t - drift * self._mean_s),
+            jitter=float(np.sqrt(residual / self._n)),
+            nominal_period=self.nominal,
+            duplicates=self.duplicates,
+            gap_indices=np.concatenate(self._gap_indices),
+            gap_lengths=np.concatenate(self._gap_lengths),
+        )
+
+
+def analyze_timing(tim_vals, nominal=None, chunk_size=CHUNK_SIZE):
+    """
+    TimingReport of a whole time column, e.g. the time of read_binlog.
+    """
+    analyzer = TimingAnalyzer(nominal)
+    for chunk, in iter_chunks(tim_vals, chunk_size=chunk_size):
+        analyzer.update(chunk)
+    return analyzer.result()
+
+
+class Resampler:
+    """
+    Interpolates values sampled at irregular times onto the uniform grid
+    start + k * period, from consecutive chunks. The samples whose time does not
+    advance are ignored.
+    """
+    METHODS = ("linear", "cubic")
+
+    def __init__(self, period, start=None, method="linear", max_gap=None):
+        """
+        period: Period of the grid (ms), e.g. the fitted period of a TimingReport.
+        start: Time of the first grid point, the time of the first sample if None.
+        method: "linear", or "cubic" for a cubic Hermite spline whose slopes are
+                the central differences (Catmull-Rom).
+        max_gap: Grid points between two samples further apart than max_gap (ms)
+                 are NaN instead of interpolated across the gap.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method {method!r}, expected one of {self.METHODS}.")
+        self.period = period
+        self.start = start
+        self.method = method
+        self.max_gap = max_gap
+        # Last three samples, needed by the cubic interpolation of the next chunk
+        self._times = np.empty(0)
+        self._values = np.empty(0)
+        # Index of the next grid point
+        self._next = 0
+
+    def process(self, tim_vals, values):
+        """
+        Adds a chunk of samples. Returns the grid times and the values of the grid
+        points that no later sample can change.
+        """
+        tim_vals = np.asarray(tim_vals, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        latest = self._times[-1] if len(self._times) else -np.inf
+        previous = np.maximum.accumulate(np.concatenate(([latest], tim_vals[:-1])))
+        advanced = tim_vals > previous
+        times = np.concatenate((self._times, tim_vals[advanced]))
+        values = np.concatenate((self._values, values[advanced]))
+        if not len(times):
+            return np.empty(0), np.empty(0)
+        if self.start is None:
+            self.start = times[0]
+        # The interval before the last one is complete: its cubic interpolation
+        # needs the last sample
+        result = self._emit(times, values, times[-2] if len(times) > 1 else -np.inf, False)
+        self._times, self._values = times[-3:], values[-3:]
+        return result
+
+    def flush(self):
+        """
+        Returns the grid points up to the last sample, after the last chunk.
+        """
+        if not len(self._times):
+            return np.empty(0), np.empty(0)
+        return self._emit(self._times, self._values, self._times[-1], True)
+
+    def _emit(self, times, values, limit, inclusive):
+        """
+        Interpolates the grid points from the next one up to limit.
+        """
+        end = (limit - self.start) / self.period
+        if not np.isfinite(end):
+            return np.empty(0), np.empty(0)
+        n_end = int(np.floor(end)) + 1 if inclusive else int(np.ceil(end))
+        grid = self.start + np.arange(self._next, max(n_end, self._next)) * self.period
+        self._next = max(n_end, self._next)
+        if len(times) < 2:
+            return grid, np.where(grid == times[0], values[0], np.nan)
+        interval = np.clip(np.searchsorted(times, grid, side="right") - 1, 0, len(times) - 2)
+        t0, t1 = times[interval], times[interval + 1]
+        v0, v1 = values[interval], values[interval + 1]
+        width = t1 - t0
+        u = (grid - t0) / width
+        if self.method == "linear":
+            result = v0 + u * (v1 - v0)
+        else:
+            slopes = _slopes(times, values)
+            m0, m1 = slopes[interval] * width, slopes[interval + 1] * width
+            u2 = u * u
+            u3 = u2 * u
+            result = ((2 * u3 - 3 * u2 + 1) * v0 + (u3 - 2 * u2 + u) * m0
+                      + (-2 * u3 + 3 * u2) * v1 + (u3 - u2) * m1)
+        # No extrapolation before the first sample
+        result[grid < times[0]] = np.nan
+        if self.max_gap is not None:
+            result[width > self.max_gap] = np.nan
+        return grid, result
+
+
+def _slopes(times, values):
+    """
+    Central differences, one-sided at both ends.
+    """
+    slopes = np.empty(len(times))
+    slopes[1:-1] = (values[2:] - values[:-2]) / (times[2:] - times[:-2])
+    slopes[0] = (values[1] - values[0]) / (times[1] - times[0])
+    slopes[-1] = (values[-1] - values[-2]) / (times[-1] - times[-2])
+    return slopes
+
+
+def iter_resampled(chunks, period, start=None, method="linear", max_gap=None):
+    """
+    Resamples an iterable of (times, values) chunks, yielding (grid times, values)
+    chunks. Only one chunk is in memory at a time.
+    """
+    resampler = Resampler(period, start, method, max_gap)
+    for tim_vals, values in chunks:
+        grid, resampled = resampler.process(tim_vals, values)
+        if len(grid):
+            yield grid, resampled
+    grid, resampled = resampler.flush()
+    if len(grid):
+        yield grid, resampled
+
+
+def resample(tim_vals, values, period=None, start=None, method="linear", max_gap=None,
+             chunk_size=CHUNK_SIZE):
+    """
+    Resamples whole arrays onto a uniform grid.
+    period: Period of the grid (ms), the fitted period of the times if None.
+    Returns the grid times and the values.
+    """
+    if period is None:
+        period = analyze_timing(tim_vals, chunk_size=chunk_size).period
+    chunks = list(iter_resampled(
+        iter_chunks(tim_vals, values, chunk_size=chunk_size), period, start, method, max_gap
+    ))
+    if not chunks:
+        return np.empty(0), np.empty(0)
+    grids, resampled = zip(*chunks)
+    return np.concatenate(grids), np.concatenate(resampled)
@@ -0,0 +1,77 @@
+"""
+Precompiled Qt Designer forms.
+uic.loadUi parses the .ui XML and runs the uic compiler at every start. Instead,
+load_form_class compiles the form once into a Python module (the pyuic5 output),
+saved next to the .ui file, and imports it. The module is compiled again only
+when the XML changes, which is detected by the hash stored in its first line.
+"""
+import hashlib
+import importlib.util
+import os
+
+# First line of the compiled modules, followed by the SHA-1 of the .ui file
+HASH_PREFIX = "# ui-sha1: "
+# Used when the folder of the .ui file is read-only
+FALLBACK_FOLDER = os.path.join(os.path.expanduser("~"), ".openfutek", "ui")
+
+
+def compiled_path(ui_path, folder=None):
+    """
+    Path of the module compiled from ui_path, in folder or next to the .ui file.
+    """
+    name = os.path.splitext(os.path.basename(ui_path))[0] + "_ui.py"
+    return os.path.join(folder or os.path.dirname(ui_path), name)
+
+
+def load_form_class(ui_path):
+    """
+    Returns the form class (Ui_<object name>) of the .ui file, whose setupUi
+    creates the widgets, compiling the form first if needed.
+    """
+    with open(ui_path, "rb") as ui_file:
+        digest = hashlib.sha1(ui_file.read()).hexdigest()
+    py_path = compiled_path(ui_path)
+    if _compiled_digest(py_path) != digest:
+        try:
+            _compile(ui_path, py_path, digest)
+        except OSError:
+            py_path = compiled_path(ui_path, FALLBACK_FOLDER)
+            if _compiled_digest(py_path) != digest:
+                _compile(ui_path, py_path, digest)
+    module_name = os.path.splitext(os.path.basename(py_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, py_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return next(
+        value for name, value in vars(module).items() if name.startswith("Ui_")
+    )
+
+
+def _compiled_digest(py_path):
+    """
+    Returns the hash of the .ui file a compiled module was made from, None if
+    there is no compiled module.
+    """
+    try:
+        with open(py_path) as py_file:
+            first_line = py_file.readline()
+    except OSError:
+        return None
+    if not first_line.startswith(HASH_PREFIX):
+        return None
+    return first_line[len(HASH_PREFIX):].strip()
+
+
+def _compile(ui_path, py_path, digest):
+    """
+    Compiles the .ui file into py_path, replacing it atomically.
+    """
+    # The uic compiler is only imported when a form has to be compiled
+    from PyQt5 import uic
+
+    os.makedirs(os.path.dirname(py_path), exist_ok=True)
+    temp_path = f"{py_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as py_file:
+        py_file.write(f"{HASH_PREFIX}{digest}\n")
+        uic.compileUi(ui_path, py_file)
+    os.replace(temp_path, py_path)
@@ -1,21 +1,32 @@
 """
 This file is used to test the functionality of OpenFutek without the need for a GUI
 """
+import asyncio
 import numpy as np
 import time
-
-import clr  # From the pythonnet module
-
-# Loading the DLL from the same folder as the python script
-clr.AddReference("FUTEK_USB_DLL")
-from FUTEK_USB_DLL import USB_DLL
+from concurrent.futures import ThreadPoolExecutor
+
+from asyncdevice import AsyncDevice
+from calibration import CalibrationCache
+from datalog import DataLogError
+# get_usb_dll returns FUTEK's DLL loaded through pythonnet, or the simulator if
+# OPENFUTEK_BACKEND=sim. It is only loaded at the first call, so the functions that
+# don't use a device don't wait for the .NET runtime.
+from device import get_usb_dll
+from instrument import instrument, save_profile
+from logstore import LogStore, sync_data_log
+from multidevice import DeviceManager
+from rotation import RotationAcquisition, RotationChannels
+from scheduler import AdaptiveAcquisition
+from streaming import StreamConsumer, StreamingAcquisition
+from streamlog import StreamWriter
 
 
 def ConnectDisconnect():
     """
     Basic connect and disconnect function
     """
-    usb = USB_DLL()
+    usb = get_usb_dll()()
 
     # Serial number of the IHH500  Elite
     serial = "479586"
@@ -43,7 +54,8 @@ def Connect(serial):
     """
     Connect and return the USB connection instance.
     """
-    dev = USB_DLL()
+    # Every call is recorded if OPENFUTEK_PROFILE is set, see instrument.py
+    dev = instrument(get_usb_dll()())
     # Open the connection to the device using its serial number
     dev.Open_Device_Connection(serial)
     return dev
@@ -55,6 +67,32 @@ def Disconnect(dev):
     """
     handle = dev.DeviceHandle
     dev.Close_Device_Connection(handle)
+    save_profile(dev)
+
+
+def ConnectOnThread(serial):
+    """
+    Connect from a new device thread, which then makes every DLL call of the
+    device, like asyncdevice and multidevice do.
+    Returns the thread (a single-thread executor), the USB connection instance,
+    its handle and its calibration.
+    """
+    device_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"IHH-{serial}")
+
+    def open_device():
+        dev = Connect(serial)
+        handle = dev.DeviceHandle
+        return dev, handle, CalibrationCache().get(dev, handle, serial)
+    dev, handle, calibration = device_thread.submit(open_device).result()
+    return device_thread, dev, handle, calibration
+
+
+def DisconnectOnThread(device_thread, dev):
+    """
+    Disconnects a device opened by ConnectOnThread and stops its thread.
+    """
+    device_thread.submit(Disconnect, dev).result()
+    device_thread.shutdown()
 
 
 def GetSingleData():
@@ -66,10 +104,13 @@ def GetSingleData():
     dev = Connect(serial)
     handle = dev.DeviceHandle
     channel = 2
-    fullscale = dev.Get_Fullscale_Value(handle, channel)
+    # Get_Fullscale_Value and Get_Offset_Value return the same registers as the
+    # calibration, which is only read from the device if it is not cached
+    calibration = CalibrationCache().get(dev, handle, serial, channel)
+    fullscale = calibration.fullscale_d
     print(f"Maximum ADC value (Fullscale): {fullscale}")
     # The offset is not affected by the Tare obtained by pressing the button on the IHH
-    offset = dev.Get_Offset_Value(handle, channel)
+    offset = calibration.offset_d
     print(f"ADC offset value: {offset}")
     for i in range(0, 10):
         # Normal_Data_Request returns the latest ADC value from the USB. It's maximum value is given
@@ -82,6 +123,104 @@ def GetSingleData():
     Disconnect(dev)
 
 
+def GetSingleDataAsync():
+    """
+    GetSingleData from asyncio: the DLL calls run on the device thread of
+    AsyncDevice, so the event loop keeps running other coroutines meanwhile.
+    """
+    async def Run():
+        # Serial number of the IHH500  Elite
+        async with AsyncDevice("479586") as device:
+            offset = device.calibration.offset_d
+            for i in range(0, 10):
+                timestamp, measurement = await device.read_sample()
+                print(f"Normal_Data_Request: {measurement}")
+                print(f"Compensated value: {measurement - offset}")
+                await asyncio.sleep(0.1)
+    asyncio.run(Run())
+
+
+def StreamData(seconds=5, filename=None, adaptive=False):
+    """
+    Connect to a device, poll the live value as fast as possible on its device
+    thread and print the acquisition statistics.
+    filename: Records the samples to this file as they arrive, tab-separated like
+              GetDataLog or binary if it ends with streamlog.EXTENSION.
+    adaptive: Polls at the highest rate the device sustains without failures
+              (AdaptiveAcquisition) instead of back to back.
+    """
+    # Serial number of the IHH500  Elite
+    serial = "479586"
+    device_thread, dev, handle, calibration = ConnectOnThread(serial)
+    writer = None
+    if filename is not None:
+        writer = StreamWriter(filename, calibration)
+    if adaptive:
+        acquisition = AdaptiveAcquisition(dev, handle, channel=2)
+    else:
+        acquisition = StreamingAcquisition(dev, handle, channel=2)
+    consumer = StreamConsumer(acquisition.buffer)
+    acquisition.start(executor=device_thread)
+    try:
+        for _ in range(seconds):
+            time.sleep(1)
+            if adaptive:
+                stats = acquisition.stats()
+                print(f"Polling at {stats['polling_rate']:.0f} Hz, interval "
+                      f"{stats['interval']:.2f} ms, latency {stats['latency_average']:.2f} ms")
+            timestamps, values = consumer.read()
+            if writer is not None:
+                writer.write(timestamps, values)
+            if len(values):
+                print(f"{len(values)} new samples, last ADC value: {values[-1]}")
+    finally:
+        # The device thread only returns from the polling loop once stopped
+        acquisition.stop()
+    if writer is not None:
+        writer.write(*consumer.read())
+        writer.close()
+        print(f"{writer.n_samples} samples saved to {filename}")
+    stats = acquisition.stats()
+    print(f"Samples: {stats['samples']}, rate: {stats['rate']:.1f} Hz, "
+          f"dropped: {stats['dropped']}")
+    if stats["samples"]:
+        print(f"Latency (ms): p50 {stats['latency_p50']:.3f}, "
+              f"p90 {stats['latency_p90']:.3f}, p99 {stats['latency_p99']:.3f}, "
+              f"max {stats['latency_max']:.3f}")
+    DisconnectOnThread(device_thread, dev)
+
+
+def StreamRotationData(seconds=5, rotation_every=4):
+    """
+    Connect to a device, sample the torque and the rotation values together and
+    print the speed, the angle turned and the mechanical power every second.
+    rotation_every: Torque readings per Get_Rotation_Values.
+    """
+    # Serial number of the IHH500  Elite
+    serial = "479586"
+    device_thread, dev, handle, calibration = ConnectOnThread(serial)
+    channels = RotationChannels(calibration)
+    acquisition = RotationAcquisition(dev, handle, channel=2, rotation_every=rotation_every)
+    consumer = StreamConsumer(acquisition.buffer)
+    acquisition.start(executor=device_thread)
+    try:
+        for _ in range(seconds):
+            time.sleep(1)
+            samples = channels.process(*consumer.read())
+            if len(samples):
+                last = samples[-1]
+                print(f"{len(samples)} new samples, torque: {last['torque']:.2f} N.cm, "
+                      f"speed: {last['rpm']:.1f} rpm, angle: {last['angle']:.1f} deg, "
+                      f"power: {last['power'] / 1000:.4f} kW")
+    finally:
+        acquisition.stop()
+    stats = acquisition.stats()
+    print(f"Samples: {stats['samples']}, rate: {stats['rate']:.1f} Hz, "
+          f"Get_Rotation_Values calls: {stats['rotation_reads']}, "
+          f"angle extrapolated over {stats['extrapolated']:.2f} ms on average")
+    DisconnectOnThread(device_thread, dev)
+
+
 def GetDeviceInfo():
     """
     Function written as a verifier just to check the information provided from various public
@@ -200,114 +339,28 @@ def GetDataLog():
     # data_logging_rate = 50  # Hz - This is the full logging data rate
     # samples = seconds * data_logging_rate
 
-    cnt_vals = []
-    adc_vals = []
-    tim_vals = []
-
-    # These values may be obtained directly from these functions or from the
-    # Get_Internal_Register function
-    # offset_d = dev.Get_Offset_Value(handle, channel)
-    # print(f'{offset_d = }')
-    offset_d = int(dev.Get_Internal_Register(handle, 0x02))
-    print(f"{offset_d = }")
-
-    # fullscale_d = dev.Get_Fullscale_Value(handle, channel)
-    # print(f'{fullscale_d = }')
-    fullscale_d = int(dev.Get_Internal_Register(handle, 0x03))
-    print(f"{fullscale_d = }")
+    # The calibration registers are only read if this sensor is not in the cache
+    # or was calibrated again since
+    calibration = CalibrationCache().get(dev, handle, serial, channel)
+    print(f"{calibration = }")
 
-    # There is no function to get the fullscale offset value directly
-    reverse_fullscale_d = int(dev.Get_Internal_Register(handle, 0x04))
-    print(f"{reverse_fullscale_d = }")
+    # Gets the data logging value stored in memory in blocks. The end of the log is
+    # detected from the time interval between samples. Only the samples recorded
+    # since the previous download of this device are read.
+    def print_progress(sample_count, total, rate):
+        print(f"Sample {sample_count}: {rate:.0f} samples/s", end="\r")
 
-    # This value comes without the decimal point
-    fullscale_load_a = float(dev.Get_Internal_Register(handle, 0x05)) * 1E-3
-    print(f"{fullscale_load_a = }")
-
-
-    # Gets the data logging value stored in memory and assigns a value to the 
-    # DataLogging_Counter, DataLogging_Value1 and DataLogging_Value2.
-    # There is no way to know the length of the data_logging. An auxiliary variable
-    # verifies whether the time interval between two samples is consistent
     try:
-        # Gets the first and second samples to calculate the time delay
-        dev.Get_Data_Logging(handle, 0)
-        time_sample_1 = dev.DataLogging_Value2
-
-        dev.Get_Data_Logging(handle, 1)
-        time_sample_2 = dev.DataLogging_Value2
-
-        t_delta_base = time_sample_2 - time_sample_1
-    except:
-        print("Couldn't obtain data.")
+        tim_vals, adc_vals = sync_data_log(
+            dev, handle, serial, LogStore(), progress=print_progress
+        )
+    except DataLogError as error:
+        print(error)
         return
-
-    # Check if the first time interval is good
-    if t_delta_base > 0:
-        valid_delta_t = True
-        print(f"t_delta_base: {t_delta_base} ms")
-    else:
-        valid_delta_t = False
-        print(f"The first data logging time interval was invalid: {t_delta_base} ms")
-        return
-
-    # Get all samples
-    sample_count = 0
-    while valid_delta_t:
-        dev.Get_Data_Logging(handle, sample_count)
-        torq_sample = dev.DataLogging_Value1
-        time_sample = dev.DataLogging_Value2
-        if sample_count < 2:
-            tim_vals.append(time_sample)
-            adc_vals.append(torq_sample)
-            sample_count +=1
-            continue
-
-        delta_t = time_sample - tim_vals[-1]
-        if (delta_t <= t_delta_base + 1) and (delta_t >= t_delta_base - 1):
-            # print(f"Valid time interval: {delta_t} ms")
-            tim_vals.append(time_sample)
-            adc_vals.append(torq_sample)
-            sample_count += 1
-        else:
-            # print(f"Invalid time interval: {delta_t}")
-            valid_delta_t = False
-        
-
-
-
-
-    # ret_data_log = dev.Get_Data_Logging(handle, samples)
-    # if ret_data_log != 0:
-    #     print("There was a problem with the data logging request")
-    #     print(f"Get_Data_Logging request response: {ret_data_log}")
-    #     return
-    # valid_delta_t = True
-
-    # This while loop must check whether the time interval between two samples is valid
-    # while valid_delta_t:
-    # for counter in range(0, samples + 1):
-    #     dev.Get_Data_Logging(handle, counter)
-    #     # Gets a value indicating the count associated with the sample number recorded 
-    #     # during data logging.
-    #     counter = dev.DataLogging_Counter
-    #     cnt_vals.append(counter)
-    #     # print(f"counter: {counter}")
-    #     # Gets a value indicating the analog-to-digital converter (ADC) value associated
-    #     # with the sample number recorded during data logging.
-    #     dl_v1 = dev.DataLogging_Value1
-    #     adc_vals.append(dl_v1)
-    #     # print(f"DataLogging_Value1: {dl_v1}")
-    #     # Gets a value indicating the elapsed time in milliseconds associated with the 
-    #     # sample number recorded during data logging.
-    #     dl_v2 = dev.DataLogging_Value2
-    #     # print(f"DataLogging_Value2: {dl_v2}")
-    #     tim_vals.append(dl_v2)
+    print(f"\nDownloaded {len(tim_vals)} samples")
 
     # Get converted values:
-    tq_vals = DA_convert(
-        adc_vals, offset_d, fullscale_d, reverse_fullscale_d, fullscale_load_a
-    )
+    tq_vals = calibration.convert(adc_vals)
     filename = "Test.dat"
     cols = np.column_stack((tim_vals, adc_vals, tq_vals))
     format = ["%i", "%i", "%f"]
@@ -316,45 +369,42 @@ def GetDataLog():
     np.savetxt(filename, cols, fmt=format, header=header, delimiter=delimiter)
 
 
-def DA_convert(
-    track_d_val, offset_d, fullscale_d, reverse_fullscale_d, fullscale_load_a
-):
+def GetAllDataLogs():
     """
-    Converts a digital value (or array) to a float value.
-    variables with _d are digital, integer in the ADC range (16-bit usually)
-    variables with _a are analog, float.
-    Inputs:
-    track_d_val: Measurement, named "Tracking ADC Value" by FUTEK's software.
-                 Corresponds to the measured ADC value, integer.
-    offset_d: Offset of the ADC circuit, corresponds to the zero of analog range.
-    fullscale_d: ADC value corresponding to fullscale_load_a
-    reverse_fullscale_d: ADC value corresponding to a negative fullscale_load_a
-    fullscale_load_a: Calibrated limit of the measurement scale.
-
-    Output: Converted analog value in the same units as fullscale_load_a.
-
-    The conversion formula is:
-    output = fullscale_load_a * (track_d_val-offset_d) / (fs-offset_d)
-    where:
-        fs = fullscale_d if track_d_val-offset > 0
-        fs = reverse_fullscale_d if track_d_val-offset < 0
-
+    Downloads the data logs of every connected device concurrently and saves one
+    file per serial number.
     """
-    output = np.zeros(len(track_d_val), dtype=np.float64)
-    track_d = fullscale_load_a * (np.asarray(track_d_val, dtype=np.float64) - offset_d)
-    for i, val in enumerate(track_d):
-        if val > 0:
-            output[i] = val / (fullscale_d - offset_d)
-        else:
-            output[i] = val / (offset_d - reverse_fullscale_d)
-    return output
+    manager = DeviceManager(get_usb_dll())
+    serials = manager.open()
+    print(f"Devices: {serials}")
+    cache = CalibrationCache()
+    calibrations = {
+        serial: worker.submit(cache.get, serial).result()
+        for serial, worker in manager.workers.items()
+    }
+    logs = manager.download_logs()
+    stats = manager.stats()
+    for serial, (tim_vals, adc_vals) in logs.items():
+        rate = stats["devices"][serial]["download_rate"]
+        print(f"{serial}: {len(tim_vals)} samples at {rate:.0f} samples/s")
+        tq_vals = calibrations[serial].convert(adc_vals)
+        cols = np.column_stack((tim_vals, adc_vals, tq_vals))
+        format = ["%i", "%i", "%f"]
+        header = f"Time(ms)\tADC Count\tTorque (N.cm)"
+        np.savetxt(f"Test_{serial}.dat", cols, fmt=format, header=header, delimiter="\t")
+    print(f"Aggregate download rate: {stats['download_rate']:.0f} samples/s")
+    manager.close()
 
 
 if __name__ == "__main__":
     # ConnectDisconnect()
     # GetSingleData()
+    # GetSingleDataAsync()
+    # StreamData()
+    # StreamRotationData()
     # GetDeviceInfo()
     GetDataLog()
+    # GetAllDataLogs()
     # Testing
 
 """